@@ -0,0 +1,90 @@
+# animation.py
+# Shared animation clock. Flipbooks are frame lists of one Atlas; a frame
+# change only moves the UV window (no texture swap). Sprites that play the
+# same flipbook in the same phase form a group: per frame the driver checks
+# each group once, and touches its nodes only when the frame changes.
+
+class Flipbook:
+    def __init__(self, atlas, frames, frame_time=0.12):
+        self.atlas = atlas
+        self.frames = list(frames)      # atlas frame indices
+        self.frame_time = frame_time
+
+    def __len__(self): return len(self.frames)
+
+class AnimTrack:
+    """One sprite (NodePath textured with the flipbook's atlas)."""
+    __slots__ = ("driver", "nodepath", "flipbook", "group")
+    def __init__(self, driver, nodepath, flipbook):
+        self.driver, self.nodepath, self.flipbook = driver, nodepath, flipbook
+        self.group = None               # key in driver.groups while playing
+
+    @property
+    def playing(self): return self.group is not None
+
+    def play(self): self.driver._play(self)
+    def stop(self): self.driver._stop(self)
+
+class AnimationDriver:
+    def __init__(self):
+        self.time = 0.0
+        self.groups = {}      # (id(flipbook), phase) -> {"flipbook", "phase", "idx", "tracks"}
+        self.batches = []     # fn(time): batched sprites (e.g. the crowd) animate themselves
+
+    def add(self, nodepath, flipbook, playing=False):
+        track = AnimTrack(self, nodepath, flipbook)
+        flipbook.atlas.apply(nodepath, flipbook.frames[0])
+        if playing:
+            track.play()
+        return track
+
+    def remove(self, track):
+        self._stop(track, rest=False)
+
+    def add_batch(self, fn):
+        self.batches.append(fn)
+        fn(self.time)
+
+    def remove_batch(self, fn):
+        if fn in self.batches:
+            self.batches.remove(fn)
+
+    def _play(self, track):
+        if track.group is not None:
+            return
+        fb = track.flipbook
+        # Phase so this sprite shows frame 0 right now on the shared clock
+        phase = -int(self.time / fb.frame_time) % len(fb)
+        key = (id(fb), phase)
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = {"flipbook": fb, "phase": phase, "idx": 0, "tracks": set()}
+        g["tracks"].add(track)
+        track.group = key
+        fb.atlas.apply(track.nodepath, fb.frames[g["idx"]])
+
+    def _stop(self, track, rest=True):
+        if track.group is None:
+            return
+        g = self.groups[track.group]
+        g["tracks"].discard(track)
+        if not g["tracks"]:
+            del self.groups[track.group]
+        track.group = None
+        if rest:
+            fb = track.flipbook
+            fb.atlas.apply(track.nodepath, fb.frames[0])
+
+    def advance(self, dt):
+        self.time += dt
+        t = self.time
+        for g in self.groups.values():
+            fb = g["flipbook"]
+            i = (int(t / fb.frame_time) + g["phase"]) % len(fb)
+            if i != g["idx"]:
+                g["idx"] = i
+                frame, apply = fb.frames[i], fb.atlas.apply
+                for track in g["tracks"]:
+                    apply(track.nodepath, frame)
+        for fn in self.batches:
+            fn(t)
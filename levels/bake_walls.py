@@ -0,0 +1,175 @@
+# bake_walls.py
+# Bakes the map collision into a level artifact: an occupancy bitmap over
+# MAP_BOUNDS (spatial.OccupancyGrid, COLLISION_MODE = "grid") plus the same
+# cells merged into non-overlapping rectangles (the walls the game draws,
+# edits with F8 and feeds to the nav grid).
+#
+#   python levels/bake_walls.py                          # from level_map.WALLS
+#   python levels/bake_walls.py --mask assets/backgrounds/bg2_mask.png
+#   -> level_map.WALLS_BAKED (assets/backgrounds/bg2.walls.json), WALLS_BAKED_CELL
+#
+# Mask: same framing as the background (render2d -1..1 on both axes); wall
+# where brightness * alpha >= --threshold (--invert for dark walls).
+import os, json, zlib, base64, hashlib
+from spatial import OccupancyGrid
+
+BAKE_FORMAT = 1
+IMAGE_BOUNDS = (-1.0, 1.0, -1.0, 1.0)   # background quad in render2d (OnscreenImage, scale 1)
+
+def walls_key(walls, bounds, cell):
+    """Source key of a bake from rects (stale once WALLS is edited)."""
+    return hashlib.sha1(json.dumps([list(walls), list(bounds), cell]).encode()).hexdigest()[:20]
+
+def mask_key(path, bounds, cell, threshold, invert):
+    from model_cache import file_digest
+    return hashlib.sha1(json.dumps([file_digest(path), list(bounds), cell, threshold, invert]).encode()).hexdigest()[:20]
+
+# ----- Sources -----
+def from_rects(rects, bounds, cell):
+    grid = OccupancyGrid(bounds, cell)
+    for (x, z, w, h) in rects:
+        grid.paint(x, z, w, h)
+    return grid
+
+def from_mask(path, bounds, cell, threshold=0.5, invert=False, image_bounds=IMAGE_BOUNDS):
+    """Cells sampled from the mask box-filtered down to about one pixel per cell."""
+    from panda3d.core import PNMImage, Filename
+    img = PNMImage()
+    if not img.read(Filename.fromOsSpecific(path)):
+        raise OSError(f"could not read mask: {path}")
+    ix0, ix1, iz0, iz1 = image_bounds
+    sw = max(1, int(round((ix1 - ix0) / cell)))
+    sh = max(1, int(round((iz1 - iz0) / cell)))
+    small = PNMImage(sw, sh, img.getNumChannels(), img.getMaxval())
+    small.boxFilterFrom(0.5, img)
+    alpha = small.hasAlpha()
+    grid = OccupancyGrid(bounds, cell)
+    x0, _, z0, _ = bounds
+    for j in range(grid.nz):
+        cz = z0 + (j + 0.5) * cell
+        if not iz0 <= cz < iz1:
+            continue
+        py = min(sh - 1, int((iz1 - cz) / (iz1 - iz0) * sh))   # image rows go top-down
+        row = j * grid.nx
+        for i in range(grid.nx):
+            cx = x0 + (i + 0.5) * cell
+            if not ix0 <= cx < ix1:
+                continue
+            px = min(sw - 1, int((cx - ix0) / (ix1 - ix0) * sw))
+            v = small.getBright(px, py) * (small.getAlpha(px, py) if alpha else 1.0)
+            if (v >= threshold) != invert:
+                grid.bits[row + i] = 1
+    grid.dirty = True
+    return grid
+
+# ----- Merge -----
+def merge_rects(grid):
+    """
+    Greedy rectangle cover of the wall cells: each run along x grows up (+z)
+    while the whole run is wall. Rects don't overlap and cover exactly the
+    wall cells. Returns [(x, z, w, h)] (centre + size, like WALLS).
+    """
+    nx, nz, bits, c = grid.nx, grid.nz, grid.bits, grid.cell
+    x0, _, z0, _ = grid.bounds
+    used = bytearray(nx * nz)
+    rects = []
+    for j in range(nz):
+        i = 0
+        while i < nx:
+            k = j * nx + i
+            if not bits[k] or used[k]:
+                i += 1
+                continue
+            i1 = i
+            while i1 + 1 < nx and bits[k + i1 + 1 - i] and not used[k + i1 + 1 - i]:
+                i1 += 1
+            j1 = j
+            while j1 + 1 < nz and all(bits[(j1 + 1) * nx + a] and not used[(j1 + 1) * nx + a]
+                                      for a in range(i, i1 + 1)):
+                j1 += 1
+            for b in range(j, j1 + 1):
+                used[b * nx + i:b * nx + i1 + 1] = b"\x01" * (i1 - i + 1)
+            w, h = (i1 - i + 1) * c, (j1 - j + 1) * c
+            rects.append((round(x0 + i * c + w * 0.5, 6), round(z0 + j * c + h * 0.5, 6),
+                          round(w, 6), round(h, 6)))
+            i = i1 + 1
+    return rects
+
+# ----- Artifact -----
+def _pack(bits):
+    out = bytearray((len(bits) + 7) // 8)
+    for k, b in enumerate(bits):
+        if b:
+            out[k >> 3] |= 1 << (k & 7)
+    return base64.b64encode(zlib.compress(bytes(out), 9)).decode("ascii")
+
+_BYTE_BITS = [bytes((v >> k) & 1 for k in range(8)) for v in range(256)]   # packed byte -> 8 cells
+
+def _unpack(text, n):
+    packed = zlib.decompress(base64.b64decode(text))
+    return bytearray(b"".join(_BYTE_BITS[v] for v in packed)[:n])
+
+def save(path, grid, rects, source, key):
+    data = {"format": BAKE_FORMAT, "source": source, "key": key,
+            "bounds": list(grid.bounds), "cell": grid.cell, "size": [grid.nx, grid.nz],
+            "bits": _pack(grid.bits), "rects": [list(r) for r in rects]}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+def load(path):
+    """(OccupancyGrid, rects, meta) from a bake, or None if missing/unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != BAKE_FORMAT:
+            return None
+        nx, nz = data["size"]
+        grid = OccupancyGrid(data["bounds"], data["cell"], _unpack(data["bits"], nx * nz))
+    except (OSError, ValueError, KeyError, zlib.error) as e:
+        print(f"[WARN] Could not read wall bake {path}: {e}")
+        return None
+    return grid, [tuple(r) for r in data["rects"]], {"source": data.get("source"), "key": data.get("key")}
+
+def load_level(path, walls, bounds, cell):
+    """
+    Baked (grid, rects) for the game. A bake from WALLS that no longer matches
+    `walls` (edited since) is ignored with a warning: None, rasterize at runtime.
+    """
+    res = load(path) if os.path.exists(path) else None
+    if res is None:
+        return None
+    grid, rects, meta = res
+    if tuple(grid.bounds) != tuple(bounds) or grid.cell != cell:
+        print(f"[WARN] {path}: baked for other bounds/cell, re-run python levels/bake_walls.py")
+        return None
+    if meta["source"] == "WALLS" and meta["key"] != walls_key(walls, bounds, cell):
+        print(f"[WARN] {path}: WALLS changed since the bake, re-run python levels/bake_walls.py")
+        return None
+    return grid, rects
+
+if __name__ == "__main__":
+    import sys, time, argparse
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from level_map import WALLS, WALLS_BAKED, WALLS_BAKED_CELL
+    from sim import MAP_BOUNDS
+    p = argparse.ArgumentParser(description="Bake the map collision (occupancy bitmap + merged rects)")
+    p.add_argument("--mask", default="", help="mask image instead of level_map.WALLS")
+    p.add_argument("--threshold", type=float, default=0.5, help="wall if brightness*alpha >= this (0..1)")
+    p.add_argument("--invert", action="store_true", help="dark pixels are walls")
+    p.add_argument("--cell", type=float, default=WALLS_BAKED_CELL)
+    p.add_argument("--out", default=WALLS_BAKED)
+    args = p.parse_args()
+    t0 = time.perf_counter()
+    if args.mask:
+        grid = from_mask(args.mask, MAP_BOUNDS, args.cell, args.threshold, args.invert)
+        source, key = os.path.basename(args.mask), mask_key(args.mask, MAP_BOUNDS, args.cell, args.threshold, args.invert)
+    else:
+        grid = from_rects(WALLS, MAP_BOUNDS, args.cell)
+        source, key = "WALLS", walls_key(WALLS, MAP_BOUNDS, args.cell)
+    rects = merge_rects(grid)
+    save(args.out, grid, rects, source, key)
+    print(f"[BAKE] {source}: {grid.nx}x{grid.nz} cells ({sum(grid.bits)} wall), "
+          f"{len(WALLS) if not args.mask else '-'} -> {len(rects)} rects in {time.perf_counter() - t0:.2f}s -> {args.out}")
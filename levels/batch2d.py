@@ -0,0 +1,77 @@
+# batch2d.py
+# Batched 2D rectangles: every quad of a layer lives in ONE GeomVertexData
+# (one draw call). Editing a rect rewrites its 4 vertices in place.
+from panda3d.core import (
+    Geom, GeomNode, GeomTriangles, GeomVertexData, GeomVertexFormat,
+    GeomVertexWriter, OmniBoundingVolume, TransparencyAttrib
+)
+
+class QuadBatch:
+    """Axis-aligned rects in the x/z plane (render2d). Slots are stable ids."""
+    def __init__(self, parent, name="quads"):
+        vdata = GeomVertexData(name, GeomVertexFormat.getV3c4(), Geom.UHDynamic)
+        geom = Geom(vdata)
+        geom.addPrimitive(GeomTriangles(Geom.UHStatic))
+        node = GeomNode(name)
+        node.addGeom(geom)
+        # Vertices move every edit: skip bounds recomputation, never cull
+        node.setBounds(OmniBoundingVolume()); node.setFinal(True)
+        self.np = parent.attachNewNode(node)
+        self.np.setTransparency(TransparencyAttrib.M_alpha)
+        self.geom = node.modifyGeom(0)
+        self.vdata = self.geom.modifyVertexData()
+        self.slots = []     # slot -> [x, z, w, h, color, visible] or None (free)
+        self.free = []
+
+    def __len__(self): return len(self.slots) - len(self.free)
+
+    def add(self, x, z, w, h, color=(1, 1, 1, 1), visible=True):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.slots)
+            self.slots.append(None)
+            self.vdata.setNumRows(len(self.slots) * 4)
+            v = slot * 4
+            self.geom.modifyPrimitive(0).addVertices(v, v + 1, v + 2)
+            self.geom.modifyPrimitive(0).addVertices(v, v + 2, v + 3)
+        self.slots[slot] = [x, z, w, h, tuple(color), visible]
+        self._write(slot)
+        return slot
+
+    def remove(self, slot):
+        self.slots[slot] = None
+        self._write(slot)
+        self.free.append(slot)
+
+    def set_rect(self, slot, x, z, w, h):
+        r = self.slots[slot]
+        r[0], r[1], r[2], r[3] = x, z, w, h
+        self._write(slot, color=False)
+
+    def set_color(self, slot, color):
+        self.slots[slot][4] = tuple(color)
+        self._write(slot, pos=False)
+
+    def set_visible(self, slot, visible):
+        if self.slots[slot][5] != visible:
+            self.slots[slot][5] = visible
+            self._write(slot, color=False)
+
+    def _write(self, slot, pos=True, color=True):
+        r = self.slots[slot]
+        row = slot * 4
+        if pos:
+            vw = GeomVertexWriter(self.vdata, "vertex")
+            vw.setRow(row)
+            if r is None or not r[5]:
+                # Free/hidden slot: degenerate quad (zero area, nothing drawn)
+                for _ in range(4): vw.setData3(0, 0, 0)
+            else:
+                x, z, hw, hh = r[0], r[1], r[2] * 0.5, r[3] * 0.5
+                vw.setData3(x - hw, 0, z - hh); vw.setData3(x + hw, 0, z - hh)
+                vw.setData3(x + hw, 0, z + hh); vw.setData3(x - hw, 0, z + hh)
+        if color and r is not None:
+            cw = GeomVertexWriter(self.vdata, "color")
+            cw.setRow(row)
+            for _ in range(4): cw.setData4(*r[4])
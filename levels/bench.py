@@ -0,0 +1,258 @@
+# bench.py
+# Offscreen benchmark: runs Game without a GPU (software renderer) through
+# scripted scenarios and reports frame-time percentiles, Python time per
+# subsystem (profiling.py scopes) and peak memory.
+#
+#   python levels/bench.py                        # all scenarios, stock map
+#   python levels/bench.py --walls 500 --markers 200 --crowd 300 --json bench.json
+#   python levels/bench.py --scenario walk --scenario cupola --frames 300
+#   python levels/bench.py --scenario walls --walls 500 --collision grid
+import os, sys, time, json, random, argparse, tracemalloc
+try:
+    import resource   # maxrss (Unix only)
+except ImportError:
+    resource = None
+
+LEVELS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(LEVELS_DIR)
+SCENARIOS = ("walk", "walls", "sleep", "cupola")
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, int(round(p / 100.0 * len(s) + 0.5)) - 1))
+    return s[k]
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.results = []
+
+        from panda3d.core import loadPrcFileData, ClockObject
+        prc = ["window-type offscreen", "audio-library-name null", "sync-video 0",
+               "notify-level-device fatal", "notify-level-display fatal", "notify-level-x11display fatal"]
+        if not args.gpu:
+            prc.append("load-display p3tinydisplay")
+        prc.append(f"win-size {args.size[0]} {args.size[1]}")
+        loadPrcFileData("bench", "\n".join(prc))
+
+        import main
+        loadPrcFileData("bench-late", "show-frame-rate-meter 0")   # main.py turns it on
+        self.main = main
+        if args.model:
+            main.MODEL_PATH_BAM, main.MODEL_PATH_GLB = "", args.model
+        main.MARKERS_INFO = list(main.MARKERS_INFO) + self._synthetic_markers(args.markers)
+        main.CROWD_SIZE = args.crowd
+        if args.collision:
+            main.COLLISION_MODE = args.collision
+
+        # Fixed dt: every run simulates the same ticks, only the wall time varies
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(args.fps)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        self.game = main.Game()
+        self.startup_s = time.perf_counter() - t0
+        self._add_synthetic_walls(args.walls)
+
+        # Same scopes as the in-game overlay (F6) / PStats "Game:*"
+        from profiling import profiler
+        self.profiler = profiler
+        profiler.configure(enabled=True)
+
+    # ----- Synthetic content -----
+    def _add_synthetic_walls(self, n):
+        # Small walls scattered over the map, away from the spawn point
+        from sim import MAP_BOUNDS
+        x0, x1, z0, z1 = MAP_BOUNDS
+        sx, sz = self.game.sim.x, self.game.sim.z
+        added = 0
+        while added < n:
+            x, z = self.rng.uniform(x0, x1), self.rng.uniform(z0, z1)
+            if abs(x - sx) < 0.2 and abs(z - sz) < 0.2:
+                continue
+            self.game._add_wall(x, z, self.rng.uniform(0.02, 0.08), self.rng.uniform(0.02, 0.08))
+            added += 1
+        if n and not self.game.show_walls:
+            for w in self.game.walls:
+                self.game.wall_batch.set_visible(w["slot"], False)
+
+    def _synthetic_markers(self, m):
+        return [((self.rng.uniform(-2, 2), self.rng.uniform(-2, 2), self.rng.uniform(-2, 2)),
+                 self.rng.uniform(0.05, 0.3), f"Synthetic marker {i}") for i in range(m)]
+
+    # ----- Driving -----
+    def _frame(self, times):
+        t0 = time.perf_counter()
+        self.game.taskMgr.step()
+        times.append(time.perf_counter() - t0)
+
+    def _dismiss_dialog(self):
+        g = self.game
+        if g.dialog:
+            g.close_dialog()
+            g.ui_blocked = False
+            g._clear_movement()
+
+    def _press(self, *keys):
+        g = self.game
+        for k in g.pressed:
+            g.pressed[k] = k in keys
+
+    def _wait_real(self, cond, timeout):
+        """Async loads finish on real time: step until cond() without recording."""
+        end = time.perf_counter() + timeout
+        while not cond() and time.perf_counter() < end:
+            self.game.taskMgr.step()
+            time.sleep(0.002)
+        return cond()
+
+    def run_scenario(self, name):
+        g, frames, times = self.game, self.args.frames, []
+        tot0 = self.profiler.totals()
+        tracemalloc.reset_peak()
+        extra = {}
+
+        if name == "walk":
+            # Square walk with jumps; trigger prompts are answered "No"
+            pattern = [("d",), ("w",), ("a",), ("s",), ("d", "space"), ("w", "a")]
+            for i in range(frames):
+                self._press(*pattern[(i // 45) % len(pattern)])
+                self._frame(times)
+                self._dismiss_dialog()
+            self._press()
+            extra["energy_left"] = g.sim.energy_level
+
+        elif name == "walls":
+            # Wall editor: select, move and resize every frame
+            g._toggle_wall_editor()
+            moves = [(g._nudge_wall, (0.02, 0)), (g._nudge_wall, (0, 0.02)),
+                     (g._resize_wall, (0.02, 0)), (g._nudge_wall, (-0.02, 0)),
+                     (g._nudge_wall, (0, -0.02)), (g._resize_wall, (-0.02, 0))]
+            for i in range(frames):
+                if i % len(moves) == 0:
+                    g._cycle_wall(1)
+                fn, a = moves[i % len(moves)]
+                fn(*a)
+                self._frame(times)
+            g._toggle_wall_editor()
+            extra["walls"] = len(g.walls)
+
+        elif name == "sleep":
+            self._press()
+            g._start_sleep_sequence()
+            n = 0
+            while g.loading_overlay is not None and n < frames * 10:
+                self._frame(times); n += 1
+            extra["completed"] = g.loading_overlay is None
+
+        elif name == "cupola":
+            # Cold enter (async load is not timed per frame), orbit + pick, warm re-enter
+            t0 = time.perf_counter()
+            g._clear_movement(); g.enter_cupola()
+            ok = self._wait_real(lambda: g.state == "cupola3d", self.args.load_timeout)
+            extra["cold_enter_s"] = round(time.perf_counter() - t0, 3)
+            if not ok:
+                print(f"[WARN] Cupola did not load within {self.args.load_timeout}s")
+            else:
+                for i in range(frames):
+                    orbit = g.camera_orbit
+                    orbit.yaw += 2.0
+                    orbit.pitch = 20.0 + 15.0 * ((i % 60) / 30.0 - 1.0)
+                    if g.picker is not None:
+                        # Hover sweep across the viewport (offscreen has no mouse)
+                        with self.profiler.scope("picking"):
+                            g.picker.pick(-0.9 + 1.8 * ((i * 7) % 97) / 96.0, -0.9 + 1.8 * ((i * 13) % 89) / 88.0)
+                    self._frame(times)
+                g.exit_cupola(); self._frame([])
+                t0 = time.perf_counter()
+                g.enter_cupola(); self._frame([])
+                extra["warm_enter_s"] = round(time.perf_counter() - t0, 4)
+                extra["markers"] = len(g.picker.spheres) if g.picker else 0
+                g.exit_cupola(); self._frame([])
+
+        tot1 = self.profiler.totals()
+        n = max(1, len(times))
+        subs = {}
+        for k, (secs, calls) in tot1.items():
+            secs0, calls0 = tot0.get(k, (0.0, 0))
+            if calls != calls0:
+                subs[k] = {"ms_per_frame": 1000.0 * (secs - secs0) / n, "calls": calls - calls0}
+        _, peak = tracemalloc.get_traced_memory()
+        res = {"scenario": name, "frames": len(times), "extra": extra,
+               "frame_ms": self._stats(times), "subsystems": subs,
+               "py_peak_mb": peak / 1e6}
+        self.results.append(res)
+        return res
+
+    @staticmethod
+    def _stats(times):
+        if not times:
+            return {}
+        ms = [t * 1000.0 for t in times]
+        return {"mean": sum(ms) / len(ms), "p50": percentile(ms, 50), "p95": percentile(ms, 95),
+                "p99": percentile(ms, 99), "max": max(ms)}
+
+    def report(self):
+        a = self.args
+        print(f"\n[BENCH] walls={len(self.game.walls)} (+{a.walls} synthetic)  markers={a.markers}  crowd={a.crowd}  "
+              f"collision={self.main.COLLISION_MODE}  fps={a.fps:g}  renderer={'gpu' if a.gpu else 'p3tinydisplay'}  startup={self.startup_s:.2f}s  "
+              f"first frame={self.game.startup_times.get('first_frame', 0.0):.2f}s")
+        for r in self.results:
+            f = r["frame_ms"]
+            print(f"\n== {r['scenario']} ({r['frames']} frames) {r['extra']}")
+            if f:
+                print(f"   frame ms  p50 {f['p50']:7.3f}  p95 {f['p95']:7.3f}  p99 {f['p99']:7.3f}  "
+                      f"max {f['max']:7.3f}  mean {f['mean']:7.3f}")
+            for k, s in sorted(r["subsystems"].items(), key=lambda kv: -kv[1]["ms_per_frame"]):
+                print(f"   {k:<22} {s['ms_per_frame']:8.4f} ms/frame  ({s['calls']} calls)")
+            print(f"   python peak {r['py_peak_mb']:.2f} MB")
+        mem = {"py_peak_mb": max((r["py_peak_mb"] for r in self.results), default=0.0)}
+        if resource is not None:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            mem["max_rss_mb"] = rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+            print(f"\nmax RSS {mem['max_rss_mb']:.1f} MB")
+        return {"config": {"walls": a.walls, "markers": a.markers, "crowd": a.crowd, "frames": a.frames, "fps": a.fps,
+                           "collision": self.main.COLLISION_MODE,
+                           "seed": a.seed, "gpu": a.gpu, "startup_s": self.startup_s,
+                           "startup_times": self.game.startup_times},
+                "memory": mem, "scenarios": self.results}
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offscreen benchmark for the ISS Cupola demo")
+    p.add_argument("--scenario", action="append", choices=SCENARIOS,
+                   help="scenario to run (repeatable; default: all)")
+    p.add_argument("--frames", type=int, default=600, help="recorded frames per scenario")
+    p.add_argument("--walls", type=int, default=0, help="extra synthetic walls")
+    p.add_argument("--markers", type=int, default=0, help="extra synthetic Cupola markers")
+    p.add_argument("--crowd", type=int, default=0, help="NPC crew size (CROWD_SIZE)")
+    p.add_argument("--collision", choices=("swept", "discrete", "grid"), help="COLLISION_MODE override")
+    p.add_argument("--fps", type=float, default=60.0, help="simulated frame rate (fixed dt)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--size", type=int, nargs=2, default=(800, 600), metavar=("W", "H"))
+    p.add_argument("--model", default="", help="Cupola model to load instead of MODEL_PATH_*")
+    p.add_argument("--load-timeout", type=float, default=30.0, help="seconds to wait for the Cupola")
+    p.add_argument("--gpu", action="store_true", help="use the default (hardware) display module")
+    p.add_argument("--json", default="", help="write the report here")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.chdir(PROJECT_DIR)              # asset paths are relative to the repo root
+    if LEVELS_DIR not in sys.path:
+        sys.path.insert(0, LEVELS_DIR)
+    bench = Bench(args)
+    for name in (args.scenario or SCENARIOS):
+        bench.run_scenario(name)
+    report = bench.report()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"[BENCH] report -> {args.json}")
+    return report
+
+if __name__ == "__main__":
+    main()
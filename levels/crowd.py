@@ -0,0 +1,333 @@
+# crowd.py
+# NPC crew walking around the map. Agents live in NumPy arrays: steering,
+# wall collision and bounds run as one batched step for the whole crowd,
+# and the sprites are ONE Geom whose vertex array is rewritten once per frame.
+import math
+try:
+    import numpy
+except ImportError:   # optional: Game skips the crowd without it
+    numpy = None
+from panda3d.core import (
+    Geom, GeomNode, GeomTriangles, GeomVertexArrayFormat, GeomVertexData,
+    GeomVertexFormat, InternalName, OmniBoundingVolume, TransparencyAttrib
+)
+
+class CrowdSim:
+    """
+    Headless crowd: pos/prev/vel/goal are (N, 2) arrays in render2d units.
+    Agents seek a random free point, slide along walls (separable axis: a
+    blocked axis keeps its old coordinate, so nobody ends up inside a wall)
+    and pick a new goal on arrival or when stuck. route(flow) makes them
+    follow a shared nav.FlowField instead (one table lookup per agent).
+    Walls are bucketed on a coarse grid (like spatial.SpatialHash), so a
+    collision test only looks at the walls in the agent's own cell; an edit
+    only re-buckets the walls that changed.
+    """
+    WALL_CELL = 0.25
+    def __init__(self, n, bounds, size=0.10, speed=0.6, steer=6.0, seed=0):
+        if numpy is None:
+            raise RuntimeError("the crowd needs NumPy")
+        self.n, self.bounds = int(n), bounds
+        self.half = size * 0.5
+        self.speed, self.steer = speed, steer
+        self.rng = numpy.random.default_rng(seed)
+        self.walls_version = None
+        # Wall buckets: slot 0 of _rows is a wall that hits nothing (table padding)
+        x0, x1, z0, z1 = bounds
+        self._cols = max(1, int(math.ceil((x1 - x0) / self.WALL_CELL)))
+        self._nrows = max(1, int(math.ceil((z1 - z0) / self.WALL_CELL)))
+        self._rows = numpy.array([[numpy.inf, numpy.inf, 0.0, 0.0]] * 16)   # slot -> x, z, w, h
+        self._free_slots = list(range(15, 0, -1))
+        self._walls = {}                          # key -> (box, slot, cell span)
+        self._cells = [[] for _ in range(self._cols * self._nrows)]   # cell -> slots
+        self._table = numpy.zeros((self._cols * self._nrows, 1), dtype=numpy.intp)
+        self.pos = numpy.zeros((self.n, 2))
+        self.vel = numpy.zeros((self.n, 2))
+        self.goal = numpy.zeros((self.n, 2))
+        self.stuck = numpy.zeros(self.n)
+        self.facing = numpy.ones(self.n)
+        self.prev = self.pos.copy()
+        self.spawned = False
+        self.flow = None                          # nav.FlowField being followed
+        self.on_flow = numpy.zeros(self.n, dtype=bool)
+        self._next, self._flow_version = None, None
+
+    # ----- Walls -----
+    def set_walls(self, walls, version=None):
+        """
+        walls: dicts {"x","z","w","h"} (keyed by "id" when they have one, as
+        MapSim's do) or (x, z, w, h) tuples (keyed by position). Only walls
+        added, moved, resized or removed since the last call are re-bucketed.
+        """
+        self.walls_version = version
+        boxes = {}
+        for k, w in enumerate(walls):
+            if isinstance(w, dict):
+                boxes[w.get("id", -1 - k)] = (w["x"], w["z"], w["w"], w["h"])
+            else:
+                boxes[-1 - k] = tuple(w)
+        touched = set()
+        for key in [key for key, (box, _, _) in self._walls.items() if boxes.get(key) != box]:
+            self._unbucket(key, touched)
+        added = [key for key in boxes if key not in self._walls]
+        for key in added:
+            self._bucket(key, boxes[key], touched)
+        self._update_table(touched)
+        if self.spawned and added:
+            # A wall was dropped on top of someone (editor): move them out
+            bad = numpy.flatnonzero(self._blocked(self.pos[:, 0], self.pos[:, 1]))
+            if len(bad):
+                pts = self.free_points(len(bad))
+                bad = bad[:len(pts)]               # no room left: the rest stay put
+                self.pos[bad] = pts
+                self.prev[bad] = pts
+
+    def _span(self, box):
+        # Cells touched by the wall grown by the agent's half size: an agent's
+        # centre cell then lists every wall it can overlap
+        x, z, w, h = box
+        x0, _, z0, _ = self.bounds
+        c = self.WALL_CELL
+        ex, ez = w * 0.5 + self.half, h * 0.5 + self.half
+        return (max(0, int((x - ex - x0) // c)), min(self._cols - 1, int((x + ex - x0) // c)),
+                max(0, int((z - ez - z0) // c)), min(self._nrows - 1, int((z + ez - z0) // c)))
+
+    def _bucket(self, key, box, touched):
+        if not self._free_slots:
+            n = len(self._rows)
+            self._rows = numpy.vstack([self._rows, numpy.tile(self._rows[:1], (n, 1))])
+            self._free_slots = list(range(2 * n - 1, n - 1, -1))
+        slot = self._free_slots.pop()
+        self._rows[slot] = box
+        span = self._span(box)
+        i0, i1, j0, j1 = span
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                self._cells[j * self._cols + i].append(slot)
+                touched.add(j * self._cols + i)
+        self._walls[key] = (box, slot, span)
+
+    def _unbucket(self, key, touched):
+        _, slot, (i0, i1, j0, j1) = self._walls.pop(key)
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                self._cells[j * self._cols + i].remove(slot)
+                touched.add(j * self._cols + i)
+        self._rows[slot] = self._rows[0]
+        self._free_slots.append(slot)
+
+    def _update_table(self, touched):
+        # (cells, K) slots padded with slot 0; K only grows
+        cells, table = self._cells, self._table
+        k = max((len(cells[n]) for n in touched), default=0)
+        if k > table.shape[1]:
+            table = self._table = numpy.zeros((len(cells), k), dtype=numpy.intp)
+            touched = range(len(cells))
+        for n in touched:
+            slots = cells[n]
+            table[n, :len(slots)] = slots
+            table[n, len(slots):] = 0
+
+    def _blocked(self, x, z):
+        """(N,) True where an agent box at (x, z) overlaps any wall."""
+        if not self._walls:
+            return numpy.zeros(len(x), dtype=bool)
+        x0, _, z0, _ = self.bounds
+        cols = self._cols
+        i = numpy.clip(((x - x0) // self.WALL_CELL).astype(numpy.intp), 0, cols - 1)
+        j = numpy.clip(((z - z0) // self.WALL_CELL).astype(numpy.intp), 0, self._nrows - 1)
+        w = self._rows[self._table[j * cols + i]]                # (N, K, 4) candidates
+        hit = ((numpy.abs(x[:, None] - w[:, :, 0]) < w[:, :, 2] * 0.5 + self.half)
+               & (numpy.abs(z[:, None] - w[:, :, 1]) < w[:, :, 3] * 0.5 + self.half))
+        return hit.any(axis=1)
+
+    def free_points(self, k):
+        """
+        Up to k random points where an agent fits (rejection sampling, batched);
+        fewer if the map is too packed to find them.
+        """
+        x0, x1, z0, z1 = self.bounds
+        out = numpy.empty((0, 2))
+        for _ in range(64):
+            c = self.rng.uniform((x0 + self.half, z0 + self.half), (x1 - self.half, z1 - self.half),
+                                 size=(max(2 * (k - len(out)), 16), 2))
+            out = numpy.vstack([out, c[~self._blocked(c[:, 0], c[:, 1])]])
+            if len(out) >= k:
+                break
+        return out[:k]
+
+    def spawn(self):
+        """Places the agents (as many as fit: n shrinks on a packed map)."""
+        pts = self.free_points(self.n)
+        if len(pts) < self.n:
+            print(f"[WARN] Crowd: room for {len(pts)} of {self.n} agents")
+            self._resize(len(pts))
+        self.pos[:] = pts
+        self.prev[:] = self.pos
+        goals = self.free_points(self.n)
+        self.goal[:] = self.pos
+        self.goal[:len(goals)] = goals
+        self.vel[:] = 0.0
+        self.stuck[:] = 0.0
+        self.spawned = True
+
+    def _resize(self, n):
+        self.n = n
+        for name in ("pos", "vel", "goal", "stuck", "facing", "prev", "on_flow"):
+            setattr(self, name, getattr(self, name)[:n].copy())
+
+    # ----- Flow field -----
+    def route(self, flow):
+        """Everyone walks toward flow's goal (None: back to wandering)."""
+        self.flow, self._flow_version = flow, None
+        self.on_flow[:] = False
+
+    def _routed(self):
+        """
+        (N,) True for agents following the field. On a reachable cell the goal
+        becomes its next waypoint; an agent that cut a corner into a cell the
+        field doesn't cover (agents are smaller than the player) keeps its last one.
+        """
+        f = self.flow
+        if f.version != self._flow_version:
+            # Per-cell next waypoint, rebuilt only when the field was (re)built or repaired
+            self._next = numpy.column_stack(f.next_points())
+            self._flow_version = f.version
+        g = f.grid
+        c = numpy.clip(numpy.rint((self.pos[:, 0] - g.bounds[0]) / g.cell), 0, g.cols - 1).astype(int)
+        r = numpy.clip(numpy.rint((self.pos[:, 1] - g.bounds[2]) / g.cell), 0, g.rows - 1).astype(int)
+        nxt = self._next[r * g.cols + c]
+        ok = ~numpy.isnan(nxt[:, 0])
+        self.goal[ok] = nxt[ok]
+        self.on_flow |= ok
+        return self.on_flow.copy()
+
+    def interpolated(self, alpha):
+        """Positions between the last two ticks (render), as x, z arrays."""
+        p = self.prev + (self.pos - self.prev) * alpha
+        return p[:, 0], p[:, 1]
+
+    # ----- Tick -----
+    def step(self, dt):
+        if not self.n or dt <= 0:
+            return
+        self.prev[:] = self.pos
+        routed = self._routed() if self.flow is not None else numpy.zeros(self.n, dtype=bool)
+        # Seek the goal (velocity eases toward it: turns look smooth)
+        to_goal = self.goal - self.pos
+        dist = numpy.hypot(to_goal[:, 0], to_goal[:, 1])
+        desired = to_goal * (self.speed / numpy.maximum(dist, 1e-6))[:, None]
+        arrived = numpy.zeros(self.n, dtype=bool)
+        if self.flow is not None:
+            # Arrived at the flow goal: wait there
+            gx, gz = self.flow.goal
+            arrived = routed & (numpy.hypot(self.pos[:, 0] - gx, self.pos[:, 1] - gz) < 0.05)
+            desired[arrived] = 0.0
+        self.vel += (desired - self.vel) * min(1.0, self.steer * dt)
+
+        x0, x1, z0, z1 = self.bounds
+        ox, oz = self.pos[:, 0], self.pos[:, 1]
+        px = numpy.clip(ox + self.vel[:, 0] * dt, x0 + self.half, x1 - self.half)
+        px = numpy.where(self._blocked(px, oz), ox, px)
+        pz = numpy.clip(oz + self.vel[:, 1] * dt, z0 + self.half, z1 - self.half)
+        pz = numpy.where(self._blocked(px, pz), oz, pz)
+
+        moved = numpy.hypot(px - ox, pz - oz)
+        self.pos[:, 0], self.pos[:, 1] = px, pz
+        moving = numpy.abs(self.vel[:, 0]) > 1e-3
+        self.facing[moving] = numpy.sign(self.vel[moving, 0])
+
+        # New goal on arrival, or after ~1s pushing against a wall (a stuck
+        # follower gives up the field and wanders)
+        self.stuck = numpy.where((moved < 0.25 * self.speed * dt) & ~arrived, self.stuck + dt, 0.0)
+        self.on_flow[routed & (self.stuck > 1.0)] = False
+        renew = ((dist < 0.05) | (self.stuck > 1.0)) & ~routed
+        k = int(renew.sum())
+        if k:
+            renew = numpy.flatnonzero(renew)
+            pts = self.free_points(k)
+            renew = renew[:len(pts)]              # packed map: the rest retry next tick
+            self.goal[renew] = pts
+            self.stuck[renew] = 0.0
+
+class CrowdLayer:
+    """All agents as textured quads in one Geom (one draw call, one write per frame)."""
+    def __init__(self, parent, n, size, texture=None, name="crowd", tint=None, seed=0):
+        if numpy is None:
+            raise RuntimeError("the crowd needs NumPy")
+        af = GeomVertexArrayFormat()
+        af.addColumn(InternalName.getVertex(), 3, Geom.NT_float32, Geom.C_point)
+        af.addColumn(InternalName.getColor(), 4, Geom.NT_float32, Geom.C_color)
+        af.addColumn(InternalName.getTexcoord(), 2, Geom.NT_float32, Geom.C_texcoord)
+        fmt = GeomVertexFormat.registerFormat(af)   # 9 float32 per vertex
+
+        self.n, self.half = n, size * 0.5
+        self.vdata = GeomVertexData(name, fmt, Geom.UHDynamic)
+        self.vdata.setNumRows(4 * n)
+        tris = GeomTriangles(Geom.UHStatic)
+        for i in range(n):
+            v = 4 * i
+            tris.addVertices(v, v + 1, v + 2); tris.addVertices(v, v + 2, v + 3)
+        geom = Geom(self.vdata)
+        geom.addPrimitive(tris)
+        node = GeomNode(name)
+        node.addGeom(geom)
+        node.setBounds(OmniBoundingVolume()); node.setFinal(True)
+        self.np = parent.attachNewNode(node)
+        self.np.setTransparency(TransparencyAttrib.M_alpha)
+        if texture is not None:
+            self.np.setTexture(texture, 1)
+        self.geom = node.modifyGeom(0)
+        self.vdata = self.geom.modifyVertexData()
+
+        # Static columns: per-agent tint and quad UVs
+        rng = numpy.random.default_rng(seed)
+        a = self._view()
+        color = numpy.ones((n, 4))
+        if tint is None:
+            color[:, :3] = rng.uniform(0.7, 1.0, size=(n, 3))
+        else:
+            color[:] = tint
+        a[:, 3:7] = numpy.repeat(color, 4, axis=0)
+        a[:, 7:9] = numpy.tile([[0, 0], [1, 0], [1, 1], [0, 1]], (n, 1))
+        self._cu = numpy.tile([0.0, 1.0, 1.0, 0.0], n)   # quad corners in UV units
+        self._cv = numpy.tile([0.0, 0.0, 1.0, 1.0], n)
+        self.flipbook = None
+        self._step = None
+
+    def set_flipbook(self, flipbook, seed=0):
+        """Animate every agent from one atlas flipbook (random phase each). Driven by AnimationDriver.add_batch(self.animate)."""
+        self.flipbook = flipbook
+        self.rects = numpy.asarray([flipbook.atlas.rects[f] for f in flipbook.frames], dtype=numpy.float64)
+        self.phase = numpy.random.default_rng(seed).integers(0, len(flipbook), self.n)
+        self._step = None
+
+    def animate(self, t):
+        # Whole crowd in one vectorized UV write, only when the clock crosses a frame
+        if self.flipbook is None:
+            return
+        k = int(t / self.flipbook.frame_time)
+        if k == self._step:
+            return
+        self._step = k
+        r = numpy.repeat(self.rects[(k + self.phase) % len(self.rects)], 4, axis=0)   # u0, v0, su, sv
+        a = self._view()
+        a[:, 7] = r[:, 0] + self._cu * r[:, 2]
+        a[:, 8] = r[:, 1] + self._cv * r[:, 3]
+
+    def _view(self):
+        # modifyArray() also flags the array for re-upload
+        return numpy.frombuffer(memoryview(self.vdata.modifyArray(0)), dtype=numpy.float32).reshape(-1, 9)
+
+    def write(self, x, z, facing):
+        """x, z, facing: (N,) arrays. facing < 0 mirrors the sprite (like the player)."""
+        hw = self.half * facing
+        h = self.half
+        a = self._view()
+        a[0::4, 0] = x - hw; a[0::4, 2] = z - h
+        a[1::4, 0] = x + hw; a[1::4, 2] = z - h
+        a[2::4, 0] = x + hw; a[2::4, 2] = z + h
+        a[3::4, 0] = x - hw; a[3::4, 2] = z + h
+
+    def remove(self):
+        self.np.removeNode()
@@ -0,0 +1,40 @@
+# level_map.py
+# Map layout for the 2D station (render2d units). Plain data, no Panda3D,
+# so both Game and the headless MapSim can import it.
+
+PLAYER_START = (0.20, -0.5)     # (x,z) spawn
+
+# Cupola trigger (INVISIBLE)
+TRIGGER_CENTER = (0.20, 0.12)   # (x,z) in render2d
+TRIGGER_SIZE   = (0.22, 0.16)   # (width, height)
+
+# === [BED_TRIGGER_*] ===
+# Sleep trigger (small, PNG bed)
+SLEEP_TRIGGER_CENTER = (0.300, -0.320)
+SLEEP_TRIGGER_SIZE   = (0.160, 0.120)   # <-- EDIT: bed trigger size (w, h)
+
+# Baked collision (python levels/bake_walls.py): occupancy bitmap of WALLS (or
+# of a mask image) + the same cells as non-overlapping rects; COLLISION_MODE = "grid"
+WALLS_BAKED      = "assets/backgrounds/bg2.walls.json"
+WALLS_BAKED_CELL = 0.01
+
+# ======= WALLS (AABB in render2d) =======
+# (x, z, w, h)
+WALLS = [
+    (-0.323, -0.120, 0.300, 0.560),
+    (0.197, 0.620, 0.300, 0.300),
+    (0.497, 0.300, 0.300, 0.300),
+    (0.617, -0.260, 0.300, 0.300),
+    (0.257, -0.080, 0.380, 0.260),
+    (0.017, -0.840, 1.020, 0.280),
+    (-0.643, -0.540, 0.300, 0.300),
+    (0.144, -0.266, 0.160, 0.260),
+    (0.084, 0.094, 0.060, 0.120),
+    (-0.096, 0.671, 0.300, 0.300),
+    (-0.316, 0.611, 0.300, 0.300),
+    (0.700, 0.440, 0.720, 1.240),
+    (0.780, -0.620, 0.500, 0.700),
+    (-0.760, -0.120, 0.540, 2.300),
+    (-0.020, 0.860, 1.060, 0.300),
+    (0.820, -0.220, 0.420, 0.160)
+]
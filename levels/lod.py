@@ -0,0 +1,222 @@
+# lod.py
+# Level-of-detail chain for loaded models. Each level is a copy of the model
+# whose Geoms are decimated by vertex clustering: every vertex in the same
+# grid cell collapses to the cell's mean position and triangles that
+# degenerate disappear. Node names, hierarchy and render states survive in
+# every level (picking and OBJ_SUBPARTS_INFO keep working); the levels sit
+# under one LODNode switched by camera distance.
+#
+#   <asset>.lod.bam / <asset>.lod.json   cache next to the source asset
+#   python levels/lod.py assets/cupola.glb   (offline; same settings as main.py)
+import os, json, hashlib
+try:
+    import numpy
+except ImportError:   # optional: Game keeps the full model without it
+    numpy = None
+from panda3d.core import (
+    Filename, Geom, GeomPrimitive, GeomTriangles, GeomVertexData,
+    InternalName, LODNode, NodePath, PandaSystem
+)
+from model_cache import file_digest
+
+LOD_FORMAT = 1
+FAR = 1e9
+
+def count_triangles(np):
+    n = 0
+    for gnp in np.findAllMatches("**/+GeomNode"):
+        gn = gnp.node()
+        for i in range(gn.getNumGeoms()):
+            for p in gn.getGeom(i).getPrimitives():
+                if p.getPrimitiveType() == GeomPrimitive.PT_polygons:
+                    n += p.decompose().getNumPrimitives()
+    return n
+
+def _rows(array, n):
+    # (n, stride) byte view of a vertex array
+    return numpy.frombuffer(memoryview(array).cast("B"), dtype=numpy.uint8).reshape(n, -1)
+
+def _triangles(geom):
+    """(k, 3) vertex indices of all polygon primitives, or None if the Geom has lines/points."""
+    out = []
+    for p in geom.getPrimitives():
+        if p.getPrimitiveType() != GeomPrimitive.PT_polygons:
+            return None
+        t = p.decompose()
+        if t.isIndexed():
+            dtype = numpy.uint32 if t.getIndexType() == Geom.NT_uint32 else numpy.uint16
+            idx = numpy.frombuffer(memoryview(t.getVertices()).cast("B"), dtype=dtype)
+        else:
+            idx = numpy.arange(t.getFirstVertex(), t.getFirstVertex() + t.getNumVertices())
+        out.append(idx.astype(numpy.int64).reshape(-1, 3))
+    return numpy.concatenate(out) if out else numpy.zeros((0, 3), dtype=numpy.int64)
+
+def decimate_geom(geom, cell):
+    """Vertex-clustered copy of geom (cell in its own units); None to keep it as is; False if nothing is left."""
+    vdata = geom.getVertexData()
+    fmt = vdata.getFormat()
+    col = fmt.getColumn(InternalName.getVertex())
+    if col is None or col.getNumericType() != Geom.NT_float32 or col.getNumComponents() < 3:
+        return None
+    tris = _triangles(geom)
+    n = vdata.getNumRows()
+    if tris is None or not n:
+        return None
+    ai, start = fmt.getArrayWith(InternalName.getVertex()), col.getStart()
+    arrays = [_rows(vdata.getArray(i), n) for i in range(vdata.getNumArrays())]
+    pos = arrays[ai][:, start:start + 12].copy().view(numpy.float32).reshape(n, 3).astype(numpy.float64)
+
+    # Cluster: one id per occupied grid cell
+    k = numpy.floor((pos - pos.min(axis=0)) / cell).astype(numpy.int64)
+    dims = k.max(axis=0) + 1
+    keys = (k[:, 0] * dims[1] + k[:, 1]) * dims[2] + k[:, 2]
+    _, rep, inv = numpy.unique(keys, return_index=True, return_inverse=True)
+    inv = inv.reshape(-1)
+    m = len(rep)
+    cnt = numpy.bincount(inv, minlength=m)
+    mean = numpy.stack([numpy.bincount(inv, pos[:, a], minlength=m) for a in range(3)], axis=1) / cnt[:, None]
+
+    # Remap; drop degenerate and duplicated triangles (winding of the first kept)
+    t = inv[tris]
+    t = t[(t[:, 0] != t[:, 1]) & (t[:, 1] != t[:, 2]) & (t[:, 0] != t[:, 2])]
+    if not len(t):
+        return False
+    _, first = numpy.unique(numpy.sort(t, axis=1), axis=0, return_index=True)
+    t = t[numpy.sort(first)]
+
+    # Only the clusters still referenced become vertices (other columns: the first member's)
+    used = numpy.unique(t)
+    remap = numpy.full(m, -1, dtype=numpy.int64)
+    remap[used] = numpy.arange(len(used))
+    out = GeomVertexData(vdata.getName(), fmt, Geom.UHStatic)
+    out.setNumRows(len(used))
+    for i, rows in enumerate(arrays):
+        rows = rows[rep[used]].copy()
+        if i == ai:
+            rows[:, start:start + 12] = mean[used].astype(numpy.float32).view(numpy.uint8).reshape(len(used), 12)
+        memoryview(out.modifyArray(i)).cast("B")[:] = rows.tobytes()
+    prim = GeomTriangles(Geom.UHStatic)
+    wide = len(used) > 0xFFFF
+    prim.setIndexType(Geom.NT_uint32 if wide else Geom.NT_uint16)
+    flat = remap[t].reshape(-1).astype(numpy.uint32 if wide else numpy.uint16)
+    verts = prim.modifyVertices()
+    verts.setNumRows(len(flat))
+    memoryview(verts).cast("B")[:] = flat.tobytes()
+    g = Geom(out)
+    g.addPrimitive(prim)
+    return g
+
+def decimate(model, cell):
+    """Copy of model with every Geom clustered at `cell` (model units)."""
+    copy = model.copyTo(NodePath())
+    done = {}   # shared Geoms are decimated once
+    for gnp in copy.findAllMatches("**/+GeomNode"):
+        s = gnp.getScale(copy)
+        local = cell / max((abs(s[0]) + abs(s[1]) + abs(s[2])) / 3.0, 1e-9)
+        gn = gnp.node()
+        for i in reversed(range(gn.getNumGeoms())):
+            geom = gn.getGeom(i)
+            key = (id(geom), local)
+            if key not in done:
+                done[key] = decimate_geom(geom, local)
+            g = done[key]
+            if g is False:
+                gn.removeGeom(i)
+            elif g is not None:
+                gn.setGeom(i, g)
+    return copy
+
+def build_lod(model, radii, error, scale=1.0):
+    """
+    Moves model's children under an LODNode: level 0 (as loaded) up to
+    radii[0], level i from radii[i-1] to radii[i] (the last one to infinity)
+    with cells of error * radii[i-1] world units, i.e. about the same
+    on-screen error at every switch. radii are camera distances to the model
+    origin (OrbitCamera.radius; LODNode measures them in camera space, so
+    they don't scale with the model); scale turns the cells into model units.
+    Returns [triangles per level].
+    """
+    if numpy is None:
+        raise RuntimeError("LOD generation needs NumPy")
+    lod = NodePath(LODNode("lod"))
+    level0 = lod.attachNewNode("lod0")
+    children = list(model.getChildren())
+    for child in children:
+        child.reparentTo(level0)
+    try:
+        tris = [count_triangles(level0)]
+        edges = [0.0] + list(radii) + [FAR]
+        lod.node().addSwitch(edges[1], edges[0])
+        for i in range(1, len(edges) - 1):
+            level = decimate(level0, error * edges[i] / scale)
+            level.node().setName(f"lod{i}")
+            level.reparentTo(lod)
+            lod.node().addSwitch(edges[i + 1], edges[i])
+            tris.append(count_triangles(level))
+    except BaseException:
+        for child in children:
+            child.reparentTo(model)     # leave the model as it was
+        raise
+    lod.reparentTo(model)
+    return tris
+
+def lod_levels(model):
+    """The level NodePaths of a model built by build_lod (empty if it has none)."""
+    lod = model.find("**/+LODNode")
+    return [] if lod.isEmpty() else list(lod.getChildren())
+
+# ----- Cache next to the asset -----
+def _paths(src):
+    base = os.path.splitext(src)[0]
+    return base + ".lod.bam", base + ".lod.json"
+
+_digests = {}   # (path, mtime, size) -> sha1 (hash once per process)
+
+def _key(src, settings):
+    st = os.stat(src)
+    memo = (os.path.abspath(src), st.st_mtime_ns, st.st_size)
+    if memo not in _digests:
+        _digests[memo] = file_digest(src)
+    h = hashlib.sha1(_digests[memo].encode())
+    h.update(json.dumps(dict(settings, format=LOD_FORMAT, panda3d=PandaSystem.getVersionString()),
+                        sort_keys=True).encode())
+    return h.hexdigest()[:20]
+
+def cached_path(src, settings):
+    """<asset>.lod.bam if it was built from this exact source with these settings, else None."""
+    bam, meta = _paths(src)
+    try:
+        with open(meta, "r", encoding="utf-8") as f:
+            ok = json.load(f).get("key") == _key(src, settings)
+    except (OSError, ValueError, AttributeError):
+        return None
+    return bam if ok and os.path.exists(bam) else None
+
+def store(src, model, settings, tris):
+    bam, meta = _paths(src)
+    tmp = bam + ".tmp"
+    if not model.writeBamFile(Filename.fromOsSpecific(tmp)):
+        print(f"[WARN] Could not write LOD cache: {bam}")
+        return None
+    os.replace(tmp, bam)
+    with open(meta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.basename(src), "key": _key(src, settings),
+                   "settings": settings, "triangles": tris}, f, indent=1)
+    os.replace(meta + ".tmp", meta)
+    return bam
+
+if __name__ == "__main__":
+    # Offline: python levels/lod.py [model] (default: main.py's MODEL_PATH_GLB)
+    import sys, time
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    from direct.showbase.Loader import Loader
+    src = sys.argv[1] if len(sys.argv) > 1 else main.MODEL_PATH_GLB
+    settings = main.lod_settings()
+    t0 = time.perf_counter()
+    model = Loader(None).loadModel(Filename.fromOsSpecific(os.path.abspath(src)))
+    t1 = time.perf_counter()
+    tris = build_lod(model, settings["radii"], settings["error"], settings["scale"])
+    t2 = time.perf_counter()
+    print(f"[LOD] {src}: load {t1 - t0:.2f}s, build {t2 - t1:.2f}s, triangles per level {tris}")
+    print(f"[LOD] -> {store(src, model, settings, tris)}")
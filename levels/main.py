@@ -1,13 +1,27 @@
 # main.py
-import os, sys, math
+import os, sys, math, time, json
+T_IMPORT = time.perf_counter()   # time-to-first-frame origin
+# 3D-only (picking/NumPy, DirectGui buttons) and crowd modules are imported where used
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
 from direct.gui.OnscreenImage import OnscreenImage
-from direct.gui.DirectGui import DirectFrame, DirectButton, DirectLabel
 from panda3d.core import (
     CardMaker, TransparencyAttrib, ClockObject, Filename, Vec3, TextNode,
-    CollisionTraverser, CollisionNode, CollisionRay, CollisionHandlerQueue,
-    CollisionSphere, BitMask32, getModelPath, loadPrcFileData
+    getModelPath, loadPrcFileData, Thread
+)
+from sim import MapSim, EV_ENERGY, MAP_BOUNDS, PLAYER_SCALE, PLAYER_SCALE_JUMP
+from textures import load_texture, load_texture_scaled, build_atlas
+from animation import AnimationDriver, Flipbook
+from scenes import SceneCache
+from model_cache import ModelCache
+from batch2d import QuadBatch
+from profiling import profiler
+from ui_pool import WidgetPool, ConfirmDialog, SleepOverlay, ProgressOverlay, make_hint
+from timers import TimerWheel
+from replay import InputRecorder, InputReplay, KEY_ORDER, ACTIONS, R_KEYS, R_ACTION, R_POSE, R_CLICK
+from level_map import (
+    PLAYER_START, TRIGGER_CENTER, TRIGGER_SIZE,
+    SLEEP_TRIGGER_CENTER, SLEEP_TRIGGER_SIZE, WALLS, WALLS_BAKED, WALLS_BAKED_CELL
 )
 
 # ========= PRC / base =========
@@ -24,14 +38,10 @@ PLAYER_FRAMES = [
 ]
 BACKGROUND_IMG = "assets/backgrounds/bg2.png"   # or "" to disable
 
-# Cupola trigger (INVISIBLE)
-TRIGGER_CENTER = (0.20, 0.12)   # (x,z) in render2d
-TRIGGER_SIZE   = (0.22, 0.16)   # (width, height)
+# Map layout (WALLS, triggers, player start) lives in level_map.py
+# so the headless simulation can load it without Panda3D.
 
 # === [BED_TRIGGER_*] ===
-# Sleep trigger (small, PNG bed)
-SLEEP_TRIGGER_CENTER = (0.300, -0.320)
-SLEEP_TRIGGER_SIZE   = (0.160, 0.120)   # <-- EDIT: bed trigger size (w, h)
 SHOW_SLEEP_HITBOX    = False            # <-- EDIT: show bed hitbox on start
 
 BED_IMAGE            = "assets/models/astroBed.png"  # icon shown on map
@@ -43,32 +53,41 @@ MODEL_PATH_GLB = "assets/cupola.glb"
 MODEL_POS    = (0, 0, 0)
 MODEL_HPR    = (0, 0, 0)
 MODEL_SCALE  = 1.0
+CUPOLA_PREFETCH_DISTANCE = 0.45   # start loading the model this close to the trigger (0 = off)
+SCENE_CACHE_MAX_MB = 512          # warm 3D scenes kept detached after exit (LRU)
+MODEL_CACHE_DIR = "assets/.model_cache"   # compiled GLB->BAM + baked pick bounds ("" = off)
+# Level of detail (lod.py, needs NumPy): decimated copies under an LODNode,
+# cached next to the asset as <name>.lod.bam (offline: python levels/lod.py)
+MODEL_LOD = True
+MODEL_LOD_RADII = (8.0, 20.0, 50.0)   # orbit radius where each coarser level takes over
+MODEL_LOD_ERROR = 0.004               # cluster cell = error * switch radius (same on-screen error)
+MODEL_LOD_MIN_TRIS = 20000            # smaller models are drawn as loaded
+SCENE_OPT = True   # flatten static models on load (scene_opt.py), keeping OBJ_SUBPARTS_INFO names; cached with the model
 
 # Optional clickable parts / markers
 OBJ_SUBPARTS_INFO = {}
 MARKERS_INFO = []
+HOVER_PICKING = True              # highlight + info_label under the mouse every frame
+HOVER_TINT    = (1.35, 1.35, 1.1, 1.0)
 
-# ======= WALLS (AABB in render2d) =======
-# (x, z, w, h)
-WALLS = [
-    (-0.323, -0.120, 0.300, 0.560),
-    (0.197, 0.620, 0.300, 0.300),
-    (0.497, 0.300, 0.300, 0.300),
-    (0.617, -0.260, 0.300, 0.300),
-    (0.257, -0.080, 0.380, 0.260),
-    (0.017, -0.840, 1.020, 0.280),
-    (-0.643, -0.540, 0.300, 0.300),
-    (0.144, -0.266, 0.160, 0.260),
-    (0.084, 0.094, 0.060, 0.120),
-    (-0.096, 0.671, 0.300, 0.300),
-    (-0.316, 0.611, 0.300, 0.300),
-    (0.700, 0.440, 0.720, 1.240),
-    (0.780, -0.620, 0.500, 0.700),
-    (-0.760, -0.120, 0.540, 2.300),
-    (-0.020, 0.860, 1.060, 0.300),
-    (0.820, -0.220, 0.420, 0.160)
-]
+# ======= WALLS (see level_map.py) =======
 SHOW_WALLS = False  # toggle with F7
+WALL_GRID_CELL = 0.25  # broadphase cell size (render2d units)
+COLLISION_MODE = "discrete"  # "discrete": overlap snap (the original behaviour) | "swept": no tunnelling at any dt/speed
+                          # | "grid": swept over the baked occupancy bitmap (WALLS_BAKED, python levels/bake_walls.py)
+NAV_CELL = 0.025          # pathfinding grid step (click-to-move, flow fields)
+
+# ======= CREW (NPC crowd, needs NumPy) =======
+CROWD_SIZE  = 0        # NPC astronauts walking between modules (0 = off)
+CROWD_SCALE = 0.12
+CROWD_SPEED = 0.6
+CROWD_SEED  = 7
+CROWD_GOAL  = ""       # "" = wander | "cupola" / "sleep" = everyone follows that trigger's flow field
+
+# ======= MULTIPLAYER (see net.py) =======
+# "host:port" = walk the station with other visitors on that server
+# (python levels/net.py --serve); "" = single player
+NET_SERVER = ""
 
 # ======= ENERGY HUD (100..0) =======
 # 11 PNGs: index 0 = 100 (full), index 10 = 0 (empty)
@@ -119,9 +138,47 @@ SLEEP_BAR_HALF_W  = 1.20
 SLEEP_BAR_HALF_H  = 0.018
 SLEEP_BAR_MARGIN  = 0.02
 
-# ============ 2D utils ============
-def aabb_overlap(ax, az, aw, ah, bx, bz, bw, bh):
-    return (abs(ax - bx) * 2 < (aw + bw)) and (abs(az - bz) * 2 < (ah + bh))
+# ======= SIMULATION LOOP =======
+# Logic runs at a fixed rate; the player sprite is interpolated between ticks.
+FIXED_TICK_RATE   = 60.0   # Hz (0 = legacy: one step per frame with raw dt)
+MAX_CATCHUP_STEPS = 5      # max logic ticks per frame after a hitch
+
+# ======= IDLE RENDERING (opt-in) =======
+# Stop drawing while nothing changes (input, animation, HUD, sleep overlay, camera).
+IDLE_RENDERING = False
+IDLE_FPS       = 0.0       # frames drawn per second while idle (0 = none)
+IDLE_POLL_HZ   = 30.0      # main loop rate while idle (input is still polled)
+
+# ======= UI POOL =======
+# Dialogs/overlays/editor hints are built once and reused (show/hide).
+UI_PREBUILD = True         # build them all at startup (False = on first use)
+SLEEP_MESSAGE = ("Astronauts experience 16 sunsets every day, which affects their circadian rhythm or sleep cycle.\n"
+                 "It is important for them to rest so that they can have a good performance.")
+
+# ======= STARTUP =======
+# Fast startup: the first frame only waits for the background and the player.
+# HUD/sleep textures load on a worker thread, the bed icon and pooled UI right
+# after the first frame. Time-to-first-frame is printed at startup.
+FAST_STARTUP        = True
+BACKGROUND_MAX_SIZE = 2048   # downscale the background (0 = full size); it and the sprite atlases are cached as .txo in MODEL_CACHE_DIR
+STARTUP_LOG_PATH    = ""     # append one JSON line per launch (startup times), e.g. "startup.jsonl"
+
+# ======= PROFILING =======
+# Timing scopes (also PStats collectors "Game:*"). F6 toggles the overlay.
+PROFILING               = False   # scopes on from the start (the overlay turns them on too)
+PROFILE_WINDOW_FRAMES   = 120     # overlay/export average over this many frames
+PROFILE_EXPORT_PATH     = ""      # e.g. "profile.csv" or "profile.jsonl" ("" = off)
+PROFILE_EXPORT_EVERY    = 60      # frames between exported rows
+PROFILE_EXPORT_MAX_ROWS = 100000  # then rotate to <path>.1
+PROFILE_PSTATS          = False   # connect to a running pstats server
+
+# ======= INPUT RECORDING / REPLAY =======
+# Sessions are logged per logic tick; a replay runs them at fixed dt as fast
+# as the CPU allows and checks positions, energy and trigger events.
+RECORD_INPUT_PATH  = ""    # e.g. "session.issr" (or: main.py --record FILE)
+REPLAY_INPUT_PATH  = ""    # (or: main.py --replay FILE)
+REPLAY_CHECK_EVERY = 60    # ticks between recorded state checkpoints
+REPLAY_EXIT_AT_END = True
 
 # ============ 2D entities ============
 class Entity:
@@ -132,7 +189,7 @@ class Entity:
         self.node = parent.attachNewNode(cm.generate())
         self.node.setTransparency(TransparencyAttrib.M_alpha)
         if image_path:
-            tex = self.base.loader.loadTexture(image_path)
+            tex = load_texture(self.base.loader, image_path)
             self.node.setTexture(tex, 1)
         self.node.setPos(pos[0], 0, pos[1])  # (x, y=0, z)
         self.node.setScale(scale)
@@ -149,63 +206,42 @@ class Entity:
     def show(self): self.node.show()
 
 class AnimatedEntity(Entity):
+    """Frames packed in one atlas; the shared AnimationDriver (base_app.anim) flips the UVs."""
     def __init__(self, base_app: ShowBase, frames_paths, parent, pos=(0, 0), scale=0.15, frame_time=0.12):
-        super().__init__(base_app, frames_paths[0], parent, pos=pos, scale=scale)
-        self.frames = [self.base.loader.loadTexture(p) for p in frames_paths]
-        self.frame_time = frame_time
-        self.accum = 0.0
-        self.idx = 0
-        self.playing = False
+        super().__init__(base_app, None, parent, pos=pos, scale=scale)
+        atlas = build_atlas(frames_paths, name="sprite", cache_dir=MODEL_CACHE_DIR)
+        self.set_texture(atlas.texture)
+        self.flipbook = Flipbook(atlas, atlas.frames_for(frames_paths), frame_time)
+        self.track = base_app.anim.add(self.node, self.flipbook)
+    @property
+    def playing(self): return self.track.playing
     def set_playing(self, playing: bool):
-        if self.playing and not playing:
-            self.idx = 0
-            self.set_texture(self.frames[0])
-        self.playing = playing
-    def update_anim(self, dt: float):
-        if not self.playing: return
-        self.accum += dt
-        if self.accum >= self.frame_time:
-            self.accum -= self.frame_time
-            self.idx = (self.idx + 1) % len(self.frames)
-            self.set_texture(self.frames[self.idx])
+        if playing: self.track.play()
+        else: self.track.stop()
 
 class TriggerZone:
-    """Rectángulo AABB en render2d. Si visible=True dibuja un quad (hitbox)."""
-    def __init__(self, base_app: ShowBase, parent, center=(0,0), size=(0.3,0.3), visible=False, color=(1,1,0,0.25)):
+    """Rectángulo AABB en render2d. Si visible=True dibuja un quad (hitbox) en un QuadBatch."""
+    def __init__(self, base_app: ShowBase, parent, center=(0,0), size=(0.3,0.3), visible=False, color=(1,1,0,0.25), batch=None):
         self.base = base_app
         self.parent = parent
         self.color = color
         self.visible = visible
         self.x, self.z = center
         self.w, self.h = size
-        self.node = None
-        self._rebuild_node()
-
-    def _rebuild_node(self):
-        if self.node:
-            self.node.removeNode()
-            self.node = None
-        if not self.visible:
-            return
-        cm = CardMaker("trigger")
-        cm.setFrame(-self.w/2, self.w/2, -self.h/2, self.h/2)
-        self.node = self.parent.attachNewNode(cm.generate())
-        self.node.setTransparency(TransparencyAttrib.M_alpha)
-        self.node.setColor(*self.color)
-        self.node.setPos(self.x, 0, self.z)
+        self.batch = batch or QuadBatch(parent, "trigger")
+        self.slot = self.batch.add(self.x, self.z, self.w, self.h, color, visible)
 
     def set_center(self, x, z):
         self.x, self.z = x, z
-        if self.node:
-            self.node.setPos(self.x, 0, self.z)
+        self.batch.set_rect(self.slot, self.x, self.z, self.w, self.h)
 
     def set_size(self, w, h):
         self.w, self.h = max(0.02, w), max(0.02, h)
-        self._rebuild_node()
+        self.batch.set_rect(self.slot, self.x, self.z, self.w, self.h)
 
     def set_visible(self, v):
         self.visible = v
-        self._rebuild_node()
+        self.batch.set_visible(self.slot, v)
 
 # ======== Orbit camera 3D ========
 class OrbitCamera:
@@ -219,6 +255,7 @@ class OrbitCamera:
         self.rotate_active = self.pan_active = False
         self.last_mouse = None
         self.pan_speed, self.rot_speed, self.zoom_step = 0.008, 0.25, 0.9
+        self._pose = None   # last (radius, yaw, pitch, target) written to the camera
         base.accept("mouse3", self._sr); base.accept("mouse3-up", self._er)
         base.accept("mouse2", self._sp); base.accept("mouse2-up", self._ep)
         base.accept("wheel_up", self._zi); base.accept("wheel_down", self._zo)
@@ -230,10 +267,11 @@ class OrbitCamera:
     def _zi(self): self.radius = max(self.min_radius, self.radius * self.zoom_step)
     def _zo(self): self.radius = min(self.max_radius, self.radius / self.zoom_step)
     def update(self, dt):
+        """Returns True if the camera moved this frame."""
         mw = self.base.mouseWatcherNode
         if not mw or not mw.hasMouse():
             self.last_mouse = None
-            return
+            return self._apply_pose()
         m = mw.getMouse()
         if self.rotate_active or self.pan_active:
             if self.last_mouse is not None:
@@ -248,12 +286,26 @@ class OrbitCamera:
                     move  = (right * (-dx * self.pan_speed * self.radius)) + (up * (-dy * self.pan_speed * self.radius))
                     self.target.setPos(self.target.getPos() + move)
             self.last_mouse = m
+        return self._apply_pose()
+    def invalidate(self): self._pose = None
+    def _apply_pose(self):
+        # Idle camera: skip setPos/lookAt when nothing changed
+        pose = (self.radius, self.yaw, self.pitch, tuple(self.target.getPos()))
+        if pose == self._pose:
+            return False
+        self._pose = pose
         yaw, pit = math.radians(self.yaw), math.radians(self.pitch)
         cx = self.radius * math.cos(pit) * math.sin(yaw)
         cy = -self.radius * math.cos(pit) * math.cos(yaw)
         cz = self.radius * math.sin(pit)
         self.camera.setPos(self.target, Vec3(cx, cy, cz))
         self.camera.lookAt(self.target)
+        return True
+
+def lod_settings():
+    """LOD build settings (part of the <asset>.lod.json cache key)."""
+    return {"radii": list(MODEL_LOD_RADII), "error": MODEL_LOD_ERROR, "scale": MODEL_SCALE,
+            "scene_opt": SCENE_OPT}
 
 # ====== glTF plugin registration (optional) ======
 def _try_register_gltf_plugin():
@@ -286,6 +338,7 @@ def _try_register_gltf_plugin():
 # ==================== Game ====================
 class Game(ShowBase):
     def __init__(self):
+        t_init = time.perf_counter()
         super().__init__()
         self.disableMouse()  # 2D control
         self.state, self.ui_blocked = "map2d", False
@@ -304,81 +357,185 @@ class Game(ShowBase):
         # Background
         if BACKGROUND_IMG:
             try:
-                self.bg = OnscreenImage(image=BACKGROUND_IMG, parent=self.layer_bg)
+                tex = load_texture_scaled(self.loader, BACKGROUND_IMG, BACKGROUND_MAX_SIZE, MODEL_CACHE_DIR)
+                self.bg = OnscreenImage(image=tex, parent=self.layer_bg)
                 self.bg.setScale(1); self.bg.setTransparency(TransparencyAttrib.M_alpha)
             except Exception:
                 self.bg = None
 
+        # Shared animation clock (flipbooks from atlases, UV-only frame changes)
+        self.anim = AnimationDriver()
+        # Game timers (logic clock): callbacks fire when due, nothing polls per frame
+        self.timers = TimerWheel()
+
+        # Simulation (headless rules: movement, energy, walls, triggers)
+        self.sim = MapSim(pos=PLAYER_START, cell=WALL_GRID_CELL, collision=COLLISION_MODE, nav_cell=NAV_CELL)
+
         # Player
-        self.player = AnimatedEntity(self, PLAYER_FRAMES, self.layer_game, pos=(0.20, -0.5), scale=0.15, frame_time=0.12)
-        self.speed, self.facing = 1.5, 1
+        self.player = AnimatedEntity(self, PLAYER_FRAMES, self.layer_game, pos=PLAYER_START, scale=0.15, frame_time=0.12)
         self.pressed = {k: False for k in ("w", "a", "s", "d", "space", "escape")}
         self._bind_inputs()
 
-        # Triggers
-        self.cupola_trigger = TriggerZone(self, self.layer_game, center=TRIGGER_CENTER, size=TRIGGER_SIZE, visible=False)
+        # Triggers (hitboxes share one batched geom)
+        self.trigger_batch  = QuadBatch(self.layer_game, "triggers")
+        self.cupola_trigger = TriggerZone(self, self.layer_game, center=TRIGGER_CENTER, size=TRIGGER_SIZE, visible=False,
+                                          batch=self.trigger_batch)
 
         self.sleep_trigger  = TriggerZone(
             self, self.layer_game,
             center=SLEEP_TRIGGER_CENTER, size=SLEEP_TRIGGER_SIZE,
-            visible=SHOW_SLEEP_HITBOX, color=(0, 1, 1, 0.35)  # cian translúcido
+            visible=SHOW_SLEEP_HITBOX, color=(0, 1, 1, 0.35),  # cian translúcido
+            batch=self.trigger_batch
         )
-        # Bed icon (visual hint)
-        try:
-            self.bed_icon = Entity(self, BED_IMAGE, self.layer_game, pos=SLEEP_TRIGGER_CENTER, scale=BED_SCALE)
-        except Exception:
-            self.bed_icon = None
+        # Bed icon (visual hint; after the first frame with FAST_STARTUP)
+        self.bed_icon = None
+        if not FAST_STARTUP:
+            self._load_bed_icon()
 
-        self.was_in_cupola = False
-        self.was_in_sleep  = False
+        self.sim.add_trigger("cupola", self.cupola_trigger, on_enter=self._on_cupola_trigger)
+        self.sim.add_trigger("sleep", self.sleep_trigger, on_enter=self._on_sleep_trigger)
 
         # Walls
-        self.walls = []  # {"x","z","w","h","node"}
+        self.walls = self.sim.walls  # {"x","z","w","h","slot","id"} (shared with sim)
+        self.wall_batch = QuadBatch(self.layer_game, "walls")  # one draw call for all walls
         self.show_walls = SHOW_WALLS
         self.wall_edit = False
         self.wall_sel = -1
         self.wall_hint = None
         self._build_walls_from_config()
 
+        # NPC crew (arrays + one batched geom, see crowd.py)
+        self.crowd = self.crowd_layer = None
+        if CROWD_SIZE > 0:
+            self._build_crowd(CROWD_SIZE)
+
+        # Multiplayer: the local player is predicted, other visitors are sprites
+        self.net = None
+        self.remote_sprites = {}   # player id -> Entity
+        if NET_SERVER:
+            self._join_server(NET_SERVER)
+
         # Bed editor
         self.bed_edit = False
         self.bed_hint = None
 
-        # Energy HUD (100 -> 0)
-        self.energy_level = 10        # 10..0 (interno)
-        self.walk_accum   = 0.0       # segundos caminados acumulados
-        self.energy_textures = []
-        self.energy_icons_loaded = self._load_energy_icons()
+        # HUD atlas: energy icons + sleep bar share one texture (frames by UV)
+        self.hud_atlas = None
+
+        # Energy HUD (100 -> 0); level lives in self.sim.energy_level (10..0)
+        self.energy_frames = []         # atlas frame per level index
+        self.energy_icons_loaded = False
         self.energy_img = None
         self.energy_lbl = None
-        self._build_energy_hud()
 
         # Sleep loading (images)
-        self.sleep_textures = []
-        self.sleep_images_loaded = self._load_sleep_bar_images()
+        self.sleep_frames = []          # atlas frame per 10% step
+        self.sleep_idx = -1
+        self.sleep_images_loaded = False
         self.loading_overlay = None
-        self.loading_time = 0.0
         self.loading_duration = SLEEP_DURATION_SECONDS
+        self.sleep_timers = []          # pending sleep bar/finish timers
+        self.sleep_started = 0.0
         self.sleep_img = None           # OnscreenImage for bar
         self.loading_back = None        # fallback bar bg
         self.loading_bar  = None        # fallback bar fg
 
+        # Pooled UI (see ui_pool.py): built once, then shown/hidden
+        self.ui = WidgetPool(self.layer_ui)
+        self.ui.register("ask_cupola", lambda p: ConfirmDialog(p, "Enter the Cupola?"))
+        self.ui.register("ask_sleep", lambda p: ConfirmDialog(p, "Go to sleep?"))
+        self.ui.register("sleep", lambda p: SleepOverlay(
+            p, "Sleeping...", SLEEP_MESSAGE, SLEEP_OVERLAY_LIGHT,
+            bar_texture=self.hud_atlas.texture if self.sleep_images_loaded else None,
+            bar_scale=(SLEEP_BAR_SCALE_X, SLEEP_BAR_SCALE_Z),
+            bar_half=(SLEEP_BAR_HALF_W, SLEEP_BAR_HALF_H), bar_margin=SLEEP_BAR_MARGIN))
+        self.ui.register("cupola_loading", lambda p: ProgressOverlay(p, "Loading Cupola..."))
+        self.ui.register("wall_hint", lambda p: make_hint(p, (0,0,0.9)))
+        self.ui.register("bed_hint", lambda p: make_hint(p, (0,0,0.8)))
+
+        # HUD textures (worker thread after the first frame with FAST_STARTUP)
+        if not FAST_STARTUP:
+            self._load_hud()
+            if UI_PREBUILD:
+                self.ui.prebuild()
+
+        # Fixed-step loop
+        self.tick_dt = (1.0 / FIXED_TICK_RATE) if FIXED_TICK_RATE > 0 else 0.0
+        self.tick_accum = 0.0
+
+        # Input recording / replay (logic ticks are the timestamps)
+        self.logic_ticks = 0
+        self.input_recorder = self.input_replay = None
+        if REPLAY_INPUT_PATH:
+            self._start_replay(REPLAY_INPUT_PATH)
+        elif RECORD_INPUT_PATH:
+            if self.tick_dt <= 0:
+                print("[WARN] Input recording needs FIXED_TICK_RATE > 0")
+            else:
+                self.input_recorder = InputRecorder(RECORD_INPUT_PATH, FIXED_TICK_RATE,
+                                              (self.sim.x, self.sim.z), self.sim.energy_level)
+
+        # Idle rendering
+        self.render_dirty = True
+        self.frames_drawn = self.frames_skipped = 0
+        self.idle_since_draw = 0.0
+        self.last_mouse_pos = None
+        if IDLE_RENDERING:
+            for bt in (self.buttonThrowers or []):
+                bt.node().setButtonDownEvent("any-button")
+                bt.node().setButtonUpEvent("any-button-up")
+            self.accept("any-button", self.mark_dirty)
+            self.accept("any-button-up", self.mark_dirty)
+            self.accept("window-event", self._on_window_event)
+        self.exitFunc = self._on_exit
+
+        # Profiling
+        profiler.configure(enabled=PROFILING or bool(PROFILE_EXPORT_PATH), window=PROFILE_WINDOW_FRAMES,
+                           export_path=PROFILE_EXPORT_PATH, export_every=PROFILE_EXPORT_EVERY,
+                           export_max_rows=PROFILE_EXPORT_MAX_ROWS, pstats=PROFILE_PSTATS)
+        self.profile_overlay = None
+        self.profile_overlay_t = 0.0
+
         # Tasks
         self.taskMgr.add(self.update, "update")
+        self.taskMgr.add(self._on_first_frame, "first-frame", sort=55)   # right after igLoop (50)
+        # Background asset work (HUD atlas, model optimize/LOD/cache); without
+        # threads it runs inline through _run_on_assets()
+        self.assets_thread = Thread.isThreadingSupported()
+        if self.assets_thread:
+            self.taskMgr.setupTaskChain("assets", numThreads=1)
+        self.startup_times = {"init": time.perf_counter() - t_init}
+        self.first_frame_s = None
 
         # 3D vars
         self.cupola_root = None
-        self.click_mask = BitMask32.bit(1)
-        self.picker_trav = self.picker_ray = self.picker_np = self.picker_queue = None
+        self.picker = None
+        self.hover_np = None            # subpart/marker under the mouse
+        self.clicked_info = ""          # info_label text pinned by the last click
         self.back_btn = None
         self.camera_orbit = None
 
+        # Async cupola load (prefetch near the trigger)
+        self.cupola_pending  = False    # load request in flight
+        self.cupola_ready    = None     # (model, used_glb, baked_meta) once loaded
+        self.cupola_waiting  = False    # player said "Yes" before it finished
+        self.cupola_loading_ui = None
+        self.cupola_loading_t  = 0.0
+
+        # Compile cache (content-hashed)
+        self.model_cache = ModelCache(MODEL_CACHE_DIR, {"loader": "p3gltf", "scene_opt": SCENE_OPT}) if MODEL_CACHE_DIR else None
+
+        # Warm 3D scenes (detached on exit, re-attached on enter)
+        self.scene_cache = SceneCache(SCENE_CACHE_MAX_MB * 1024 * 1024, on_evict=self._on_scene_evicted)
+
     # ----- Input binding -----
     def _bind_inputs(self):
         for key in ("w", "a", "s", "d", "space", "escape"):
             self.accept(key, self._key_down, [key])
             self.accept(f"{key}-up", self._key_up, [key])
         self.accept("p", self._print_player_pos)
+        self.accept("f6", self._toggle_profile_overlay)
+        self.accept("mouse1", self._on_click)   # map2d: walk there | cupola3d: pick
 
         # Walls editor
         self.accept("f8", self._toggle_wall_editor)
@@ -422,6 +579,7 @@ class Game(ShowBase):
     def _clear_movement(self):
         for k in ("w","a","s","d","space"):
             self.pressed[k] = False
+        self.sim.stop()
 
     def _print_player_pos(self):
         x, z = self.player.get_pos()
@@ -429,10 +587,15 @@ class Game(ShowBase):
 
     # ----- Input -----
     def _key_down(self, key):
+        if self.input_replay is not None:
+            return
         if not self.ui_blocked and not self.wall_edit and not self.bed_edit:
             self.pressed[key] = True
 
     def _key_up(self, key):
+        if self.input_replay is not None:
+            if key == "escape": self.userExit()
+            return
         if key in self.pressed:
             self.pressed[key] = False
         if self.ui_blocked and key != "escape":
@@ -446,103 +609,287 @@ class Game(ShowBase):
     # ----- Main loop -----
     def update(self, task: Task):
         dt = ClockObject.getGlobalClock().getDt()
-        if self.state == "map2d":
-            self.update_map2d(dt)
-        elif self.state == "cupola3d" and self.camera_orbit:
-            self.camera_orbit.update(dt)
-        # Sleep overlay
-        if self.loading_overlay is not None:
-            self._update_loading(dt)
+        alpha = 1.0
+        if self.net is not None:
+            with profiler.scope("net"):
+                self.net.poll()      # snapshots in (reconciles the local player)
+        if self.input_replay is not None and self.cupola_waiting:
+            pass   # replay: wait for the async Cupola load without consuming ticks
+        elif self.tick_dt > 0:
+            # Fixed-step accumulator: constant logic cost at any frame rate
+            self.tick_accum += dt
+            steps = 0
+            while self.tick_accum >= self.tick_dt and steps < MAX_CATCHUP_STEPS:
+                self.tick_accum -= self.tick_dt
+                self.update_logic(self.tick_dt)
+                steps += 1
+            if self.tick_accum >= self.tick_dt:
+                self.tick_accum %= self.tick_dt  # hitch: drop the backlog
+            alpha = self.tick_accum / self.tick_dt
+        else:
+            self.update_logic(dt)
+        self.update_render(dt, alpha)
+        profiler.end_frame()
+        if self.profile_overlay is not None:
+            self._update_profile_overlay(dt)
+        if IDLE_RENDERING:
+            self._idle_gate(dt)
         return Task.cont
 
-    def update_map2d(self, dt: float):
-        if self.ui_blocked or self.wall_edit or self.bed_edit:
+    def _on_exit(self):
+        if IDLE_RENDERING:
+            self._report_idle_stats()
+        if self.net is not None:
+            self.net.close()
+        if self.input_recorder is not None:
+            s = self.sim
+            self.input_recorder.close(self.logic_ticks, s.x, s.z, s.energy_level)
+            print(f"[REC] {self.logic_ticks} ticks -> {self.input_recorder.path}")
+        profiler.close()
+
+    # ----- Input recording / replay -----
+    def _start_replay(self, path):
+        try:
+            self.input_replay = InputReplay(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not load replay: {e}")
             return
+        r, s = self.input_replay, self.sim
+        if r.start_pos != (s.x, s.z) or r.start_energy != s.energy_level:
+            print("[WARN] Replay was recorded with another start state; using the recorded one")
+        s.x, s.z = r.start_pos
+        s.prev_x, s.prev_z = r.start_pos
+        s.energy_level = r.start_energy
+        self._update_energy_hud()
+        # One tick per frame, no waiting for real time
+        self.tick_dt = 1.0 / r.tick_rate
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(r.tick_rate)
+        print(f"[REPLAY] {path}: {r.end_tick} ticks at {r.tick_rate:g} Hz")
+
+    def _record_action(self, name):
+        if self.input_recorder is not None:
+            self.input_recorder.action(self.logic_ticks, name)
+
+    def _input_tick(self):
+        """Before each logic tick: feed (replay) or capture (record) its inputs."""
+        tick = self.logic_ticks
+        if self.input_replay is not None:
+            for kind, vals in self.input_replay.inputs_at(tick):
+                if kind == R_KEYS:
+                    for i, k in enumerate(KEY_ORDER):
+                        self.pressed[k] = bool(vals[0] >> i & 1)
+                elif kind == R_ACTION:
+                    name = ACTIONS[vals[0]]
+                    if name.startswith("_on_") and not self.dialog:
+                        self.input_replay.mismatches.append((tick, "action", name, "no dialog"))
+                    else:
+                        getattr(self, name)()
+                elif kind == R_POSE and self.camera_orbit:
+                    o = self.camera_orbit
+                    o.radius, o.yaw, o.pitch = vals[:3]
+                    o.target.setPos(*vals[3:])
+                elif kind == R_CLICK:
+                    self._click_at(*vals)
+        elif self.input_recorder is not None:
+            self.input_recorder.keys(tick, self.pressed)
+            if self.state == "cupola3d" and self.camera_orbit:
+                o = self.camera_orbit
+                self.input_recorder.camera(tick, (o.radius, o.yaw, o.pitch) + tuple(o.target.getPos()))
+
+    def _end_tick(self):
+        tick, s = self.logic_ticks, self.sim
+        if tick % REPLAY_CHECK_EVERY == 0 and (self.input_recorder or self.input_replay):
+            if self.input_recorder is not None:
+                self.input_recorder.check(tick, s.x, s.z, s.energy_level)
+            elif self.input_replay is not None:
+                self.input_replay.verify_check(tick, s.x, s.z, s.energy_level)
+        self.logic_ticks += 1
+        if self.input_replay is not None and self.input_replay.done(self.logic_ticks):
+            self._finish_replay()
+
+    def _finish_replay(self):
+        s = self.sim
+        self.input_replay.verify_check(self.logic_ticks, s.x, s.z, s.energy_level)
+        print(self.input_replay.summary())
+        self.input_replay = None   # keyboard is live again
+        if REPLAY_EXIT_AT_END:
+            self.userExit()
+
+    # ----- Profiling overlay (F6) -----
+    def _toggle_profile_overlay(self):
+        if self.profile_overlay is None:
+            from direct.gui.DirectGui import DirectLabel
+            profiler.configure(enabled=True)
+            self.profile_overlay = DirectLabel(parent=self.layer_ui, text="", scale=0.04,
+                                               frameColor=(0,0,0,0.6), text_fg=(1,1,1,1),
+                                               text_align=TextNode.ALeft, pos=(0.55,0,0.85))
+            self.profile_overlay_t = 1.0   # refresh on the next frame
+        else:
+            self.profile_overlay.destroy(); self.profile_overlay = None
+            profiler.configure(enabled=PROFILING or bool(PROFILE_EXPORT_PATH))
+        self.mark_dirty()
 
-        x, z = self.player.get_pos()
-        moving, vx, vz = False, 0.0, 0.0
-        if self.pressed["w"]: vz += self.speed; moving = True
-        if self.pressed["s"]: vz -= self.speed; moving = True
-        if self.pressed["a"]: vx -= self.speed; moving = True; self.facing = -1
-        if self.pressed["d"]: vx += self.speed; moving = True; self.facing = 1
-
-        # ENERGY: drop 1 level every 3s of ACCUMULATED walking (even if you stop)
-        if moving and self.energy_level > 0:
-            self.walk_accum += dt
-            while self.walk_accum >= 3.0 and self.energy_level > 0:
-                self.walk_accum -= 3.0
-                self.energy_level = max(0, self.energy_level - 1)
-                self._update_energy_hud()
+    def _update_profile_overlay(self, dt):
+        self.profile_overlay_t += dt
+        if self.profile_overlay_t < 0.25:
+            return
+        self.profile_overlay_t = 0.0
+        self.profile_overlay["text"] = profiler.overlay_text()
+        self.mark_dirty()
+
+    # ----- Idle rendering -----
+    def mark_dirty(self, *args):
+        self.render_dirty = True
+
+    def _on_window_event(self, win):
+        self.windowEvent(win)
+        self.mark_dirty()
+
+    def _scene_busy(self):
+        s = self.sim
+        mw = self.mouseWatcherNode
+        mouse = (mw.getMouseX(), mw.getMouseY()) if mw and mw.hasMouse() else None
+        moved_mouse, self.last_mouse_pos = mouse != self.last_mouse_pos, mouse
+        return (self.player.playing or s.x != s.prev_x or s.z != s.prev_z or self.crowd is not None
+                or self.net is not None
+                or self.cupola_loading_ui is not None
+                or moved_mouse)
+
+    def _idle_gate(self, dt):
+        """Draw only dirty frames (plus IDLE_FPS keep-alive); throttle the loop while idle."""
+        self.idle_since_draw += dt
+        draw = self.render_dirty or self._scene_busy()
+        if not draw and IDLE_FPS > 0 and self.idle_since_draw >= 1.0 / IDLE_FPS:
+            draw = True
+        self.render_dirty = False
+        if self.win:
+            self.win.setActive(draw)
+        clock = ClockObject.getGlobalClock()
+        if draw:
+            self.frames_drawn += 1
+            self.idle_since_draw = 0.0
+            if clock.getMode() == ClockObject.MLimited:
+                clock.setMode(ClockObject.MNormal)
+        else:
+            self.frames_skipped += 1
+            if clock.getMode() == ClockObject.MNormal:
+                clock.setMode(ClockObject.MLimited)
+                clock.setFrameRate(IDLE_POLL_HZ)
+
+    def _report_idle_stats(self):
+        total = max(1, self.frames_drawn + self.frames_skipped)
+        print(f"[IDLE] frames drawn={self.frames_drawn} skipped={self.frames_skipped} "
+              f"({100.0 * self.frames_skipped / total:.1f}% skipped)")
+
+    def update_logic(self, dt: float):
+        with profiler.scope("logic"):
+            if self.input_recorder is not None or self.input_replay is not None:
+                self._input_tick()
+            if self.state == "map2d":
+                self.update_map2d(dt)
+                self._maybe_prefetch_cupola()
+                if self.crowd is not None:
+                    with profiler.scope("crowd"):
+                        if self.crowd.walls_version != self.sim.walls_version:
+                            self.crowd.set_walls(self.walls, self.sim.walls_version)
+                        self.crowd.step(dt)
+                self.anim.advance(dt)
+            with profiler.scope("timers"):
+                self.timers.advance(dt)
+            self._end_tick()
+
+    def update_render(self, dt: float, alpha: float):
+        with profiler.scope("render"):
+            if self.state == "map2d":
+                # Draw the player between the last two ticks
+                s = self.sim
+                self.player.set_pos(s.prev_x + (s.x - s.prev_x) * alpha,
+                                    s.prev_z + (s.z - s.prev_z) * alpha)
+                if self.crowd is not None:
+                    with profiler.scope("crowd:writeback"):
+                        x, z = self.crowd.interpolated(alpha)
+                        self.crowd_layer.write(x, z, self.crowd.facing)
+                if self.net is not None:
+                    self._draw_remote_players()
+            elif self.state == "cupola3d" and self.camera_orbit:
+                with profiler.scope("orbit_camera"):
+                    moved = self.camera_orbit.update(dt)
+                if moved:
+                    self.mark_dirty()
+                if HOVER_PICKING:
+                    self._update_hover()
+            if self.cupola_loading_ui is not None:
+                self._update_cupola_loading(dt)
 
-        # Collisions vs walls (separable axis)
-        pw, ph = self.player.get_aabb_size()
-        hx, hz = pw * 0.5, ph * 0.5
+    def update_map2d(self, dt: float):
+        if self.ui_blocked or self.wall_edit or self.bed_edit:
+            self.sim.settle()
+            self.player.set_playing(False)
+            return
 
-        # X
-        target_x = max(-1.2, min(1.2, x + vx * dt))
-        for w in self.walls:
-            if abs(target_x - w["x"]) < (hx + w["w"] * 0.5) and abs(z - w["z"]) < (hz + w["h"] * 0.5):
-                target_x = w["x"] + hx + w["w"] * 0.5 if target_x > w["x"] else w["x"] - (hx + w["w"] * 0.5)
-        # Z
-        target_z = max(-1.0, min(1.0, z + vz * dt))
-        for w in self.walls:
-            if abs(target_x - w["x"]) < (hx + w["w"] * 0.5) and abs(target_z - w["z"]) < (hz + w["h"] * 0.5):
-                target_z = w["z"] + hz + w["h"] * 0.5 if target_z > w["z"] else w["z"] - (hz + w["h"] * 0.5)
+        with profiler.scope("map2d"):
+            events = self.net.step(self.pressed) if self.net is not None else self.sim.step(self.pressed, dt)
+            if self.input_recorder is not None:
+                self.input_recorder.events(self.logic_ticks, events)
+            elif self.input_replay is not None:
+                self.input_replay.verify_events(self.logic_ticks, events)
 
-        self.player.set_pos(target_x, target_z)
+            # Mirror sim -> scene graph (position is set in update_render)
+            self.player.set_playing(self.sim.moving)
+            self.player.set_scale_xy(self.sim.scale * self.sim.facing, self.sim.scale)
 
-        # Anim / flip
-        self.player.set_playing(moving); self.player.update_anim(dt)
-        base_scale = 0.18 if self.pressed["space"] else 0.15
-        self.player.set_scale_xy(base_scale * self.facing, base_scale)
+        # Trigger edges already went to their handlers inside sim.step()
+        for kind, arg in events:
+            if kind == EV_ENERGY:
+                self._update_energy_hud()
 
-        # Triggers
-        tz = self.cupola_trigger
-        overlap_c = aabb_overlap(target_x, target_z, pw, ph, tz.x, tz.z, tz.w, tz.h)
-        if overlap_c and not self.was_in_cupola and not self.dialog:
+    # ----- Trigger handlers -----
+    def _on_cupola_trigger(self, name, zone):
+        if not self.dialog:
             self.ask_enter_cupola()
-        self.was_in_cupola = overlap_c
 
-        sz = self.sleep_trigger
-        overlap_s = aabb_overlap(target_x, target_z, pw, ph, sz.x, sz.z, sz.w, sz.h)
-        if overlap_s and not self.was_in_sleep and not self.dialog:
+    def _on_sleep_trigger(self, name, zone):
+        if not self.dialog:
             self.ask_sleep()
-        self.was_in_sleep = overlap_s
 
     # ----- Dialogs -----
     def ask_enter_cupola(self):
         self._clear_movement()
         self.ui_blocked = True
-        self.dialog = DirectFrame(parent=self.layer_ui, frameColor=(0,0,0,0.75),
-                                  frameSize=(-0.7, 0.7, -0.25, 0.25), pos=(0,0,0))
-        DirectLabel(parent=self.dialog, text="Enter the Cupola?", scale=0.07, pos=(0,0,0.1))
-        DirectButton(parent=self.dialog, text="Yes", scale=0.06, pos=(-0.2,0,-0.1), command=self._on_cupola_yes)
-        DirectButton(parent=self.dialog, text="No",  scale=0.06, pos=( 0.2,0,-0.1), command=self._on_cupola_no)
+        self.dialog = self.ui.get("ask_cupola").show(self._on_cupola_yes, self._on_cupola_no)
+        self.mark_dirty()
 
     def _on_cupola_yes(self):
-        self.dialog.destroy(); self.dialog = None
+        self._record_action("_on_cupola_yes")
+        self.close_dialog()
         self.enter_cupola()
 
     def _on_cupola_no(self):
-        self.dialog.destroy(); self.dialog = None
+        self._record_action("_on_cupola_no")
+        self.close_dialog()
         self.ui_blocked = False
         self._clear_movement()
 
     def ask_sleep(self):
         self._clear_movement()
         self.ui_blocked = True
-        self.dialog = DirectFrame(parent=self.layer_ui, frameColor=(0,0,0,0.75),
-                                  frameSize=(-0.7, 0.7, -0.25, 0.25), pos=(0,0,0))
-        DirectLabel(parent=self.dialog, text="Go to sleep?", scale=0.07, pos=(0,0,0.1))
-        DirectButton(parent=self.dialog, text="Yes", scale=0.06, pos=(-0.2,0,-0.1), command=self._on_sleep_yes)
-        DirectButton(parent=self.dialog, text="No",  scale=0.06, pos=( 0.2,0,-0.1), command=self._on_sleep_no)
+        self.dialog = self.ui.get("ask_sleep").show(self._on_sleep_yes, self._on_sleep_no)
+        self.mark_dirty()
+
+    def close_dialog(self):
+        if self.dialog:
+            self.dialog.hide(); self.dialog = None
 
     def _on_sleep_yes(self):
-        self.dialog.destroy(); self.dialog = None
+        self._record_action("_on_sleep_yes")
+        self.close_dialog()
         self._start_sleep_sequence()
 
     def _on_sleep_no(self):
-        self.dialog.destroy(); self.dialog = None
+        self._record_action("_on_sleep_no")
+        self.close_dialog()
         self.ui_blocked = False
         self._clear_movement()
 
@@ -551,21 +898,18 @@ class Game(ShowBase):
         self._clear_movement()
         self.ui_blocked = True
 
-        # Overlay style
-        if SLEEP_OVERLAY_LIGHT:
-            bg = (0.98, 0.96, 0.92, 0.96)  # beige
-            txt = (0, 0, 0, 1)             # black text
-        else:
-            bg = (0, 0, 0, 0.92)           # dark
-            txt = (1, 1, 1, 1)             # white text
-
-        # Fullscreen overlay
-        self.loading_overlay = DirectFrame(parent=self.layer_ui,
-                                           frameColor=bg,
-                                           frameSize=(-1.5, 1.5, -1.1, 1.1),
-                                           pos=(0,0,0))
-        # Fuerza a estar arriba por si no ocultas algo
-        self.loading_overlay.setBin("fixed", 100)
+        # Fullscreen overlay (pooled; image bar or fallback bar if images not available)
+        ov = self.ui.get("sleep")
+        if ov.img is None and self.sleep_images_loaded:   # built before the HUD atlas came in
+            self.ui.discard("sleep")
+            ov = self.ui.get("sleep")
+        self.loading_overlay = ov
+        self.sleep_img, self.loading_back, self.loading_bar = ov.img, ov.back, ov.bar
+        if ov.img is not None:
+            self.sleep_idx = 0
+            self.hud_atlas.apply(ov.img, self.sleep_frames[0])
+        ov.set_fill(0.0)
+        ov.show()
 
         # --- OCULTAR HUD DE ENERGÍA MIENTRAS DURE EL SUEÑO ---
         if hasattr(self, "hud_anchor") and self.hud_anchor:
@@ -575,109 +919,223 @@ class Game(ShowBase):
         if getattr(self, "energy_lbl", None):
             self.energy_lbl.hide()
 
-        # Title + info
-        DirectLabel(parent=self.loading_overlay, text="Sleeping...", scale=0.065, pos=(0,0,0.45),
-                    frameColor=(0,0,0,0), text_fg=txt, text_align=TextNode.ACenter)
-        msg = ("Astronauts experience 16 sunsets every day, which affects their circadian rhythm or sleep cycle.\n"
-               "It is important for them to rest so that they can have a good performance.")
-        DirectLabel(parent=self.loading_overlay, text=msg, scale=0.05, pos=(0,0,0.2),
-                    frameColor=(0,0,0,0), text_fg=txt, text_align=TextNode.ACenter)
-
-        # Sleep bar by images (fallback to simple bar if images not available)
+        # Timers: image k shows from the (k-0.5)*10% mark (rounded progress),
+        # the fallback bar grows in 1% steps; the overlay closes at the end
+        d = self.loading_duration = SLEEP_DURATION_SECONDS
+        t = self.timers
+        self.sleep_started = t.now
+        if self.sleep_img is not None:
+            self.sleep_timers = [t.after((k - 0.5) / 10.0 * d, self._set_sleep_frame, k) for k in range(1, 11)]
+        elif self.loading_bar is not None:
+            self.sleep_timers = [t.every(d / 100.0, self._fill_sleep_bar)]
+        self.sleep_timers.append(t.after(d, self._finish_sleep))
+
+    def _set_sleep_frame(self, idx):
+        self.sleep_idx = idx
+        self.hud_atlas.apply(self.sleep_img, self.sleep_frames[idx])
+        self.mark_dirty()
+
+    def _fill_sleep_bar(self):
+        self.loading_overlay.set_fill(min(1.0, (self.timers.now - self.sleep_started) / self.loading_duration))
+        self.mark_dirty()
+
+    def _finish_sleep(self):
+        for timer in self.sleep_timers:
+            timer.cancel()
+        self.sleep_timers = []
+        # restore energy to 100%
+        self.sim.restore_energy()
+        if self.net is not None:
+            self.net.restore_energy()
+        self._update_energy_hud()
+        # close overlay
+        if self.loading_overlay:
+            self.loading_overlay.hide()
+            self.loading_overlay = None
         self.sleep_img = None
         self.loading_back = None
-        self.loading_bar  = None
-
-        if self.sleep_images_loaded:
-            self.sleep_img = OnscreenImage(parent=self.loading_overlay, image=self.sleep_textures[0])
-            self.sleep_img.setTransparency(TransparencyAttrib.M_alpha)
-            self.sleep_img.setScale(SLEEP_BAR_SCALE_X, 1, SLEEP_BAR_SCALE_Z)
-            self.sleep_img.setPos(0, 0, -0.25)
-        else:
-            self.loading_back = DirectFrame(
-                parent=self.loading_overlay,
-                frameColor=(0,0,0,0.15 if SLEEP_OVERLAY_LIGHT else 0.25),
-                frameSize=(-SLEEP_BAR_HALF_W, SLEEP_BAR_HALF_W, -SLEEP_BAR_HALF_H, SLEEP_BAR_HALF_H),
-                pos=(0,0,-0.25)
-            )
-            self.loading_bar = DirectFrame(
-                parent=self.loading_overlay,
-                frameColor=(0.2,0.5,1,0.9),
-                frameSize=(
-                    -SLEEP_BAR_HALF_W + SLEEP_BAR_MARGIN,  # left
-                    -SLEEP_BAR_HALF_W + SLEEP_BAR_MARGIN,  # right (starts empty)
-                    -SLEEP_BAR_HALF_H * 0.75,
-                     SLEEP_BAR_HALF_H * 0.75
-                ),
-                pos=(0,0,-0.25)
-            )
-
-        self.loading_time = 0.0
-        self.loading_duration = SLEEP_DURATION_SECONDS
-
-    def _update_loading(self, dt: float):
-        self.loading_time += dt
-        t = min(1.0, self.loading_time / self.loading_duration)
+        self.loading_bar = None
+        self.ui_blocked = False
 
-        if self.sleep_img is not None:
-            idx = min(10, int(round(t * 10)))  # 0..10
-            self.sleep_img.setImage(self.sleep_textures[idx])
-        elif self.loading_bar is not None:
-            left  = -SLEEP_BAR_HALF_W + SLEEP_BAR_MARGIN
-            width = (SLEEP_BAR_HALF_W * 2) - (SLEEP_BAR_MARGIN * 2)
-            right = left + (width * t)
-            self.loading_bar["frameSize"] = (
-                left, right,
-                -SLEEP_BAR_HALF_H * 0.75,
-                 SLEEP_BAR_HALF_H * 0.75
-            )
-
-        if self.loading_time >= self.loading_duration:
-            # restore energy to 100%
-            self.energy_level = 10
-            self.walk_accum = 0.0
-            self._update_energy_hud()
-            # close overlay
-            if self.loading_overlay:
-                self.loading_overlay.destroy()
-                self.loading_overlay = None
-            self.sleep_img = None
-            self.loading_back = None
-            self.loading_bar = None
-            self.ui_blocked = False
-
-            # --- MOSTRAR DE NUEVO EL HUD DE ENERGÍA ---
-            if hasattr(self, "hud_anchor") and self.hud_anchor:
-                self.hud_anchor.show()
-            if getattr(self, "energy_img", None):
-                self.energy_img.show()
-            if getattr(self, "energy_lbl", None):
-                self.energy_lbl.show()
-            self._clear_movement()
+        # --- MOSTRAR DE NUEVO EL HUD DE ENERGÍA ---
+        if hasattr(self, "hud_anchor") and self.hud_anchor:
+            self.hud_anchor.show()
+        if getattr(self, "energy_img", None):
+            self.energy_img.show()
+        if getattr(self, "energy_lbl", None):
+            self.energy_lbl.show()
+        self._clear_movement()
+        self.mark_dirty()
 
     # ----- 3D: enter/exit -----
-    def _load_model_any(self):
-        if os.path.exists(MODEL_PATH_BAM):
+    def _load_model_any(self, done):
+        """
+        BAM -> cached BAM of the GLB -> GLB -> models/box, on Panda3D's async loader
+        (each source preferring its cached LOD chain; with SCENE_OPT the BAM is
+        cached flattened too). Calls done(model, used_glb, baked_meta); baked_meta
+        is None if not cached. Source hashing and cache writes run on the "assets"
+        thread.
+        """
+        cache = self.model_cache
+        chain = []   # (path, is_glb, source for the cache, compiled from cache, has LOD)
+
+        def resolve(task):
+            # Cache lookups hash the sources: off the main thread
+            lod_cached = None
+            if MODEL_LOD:
+                import lod
+                lod_cached = lambda src: lod.cached_path(src, lod_settings())
+            if os.path.exists(MODEL_PATH_BAM):
+                lp = lod_cached(MODEL_PATH_BAM) if lod_cached else None
+                if lp: chain.append((lp, False, MODEL_PATH_BAM, True, True))
+                compiled = cache.compiled_path(MODEL_PATH_BAM) if cache and SCENE_OPT else None
+                if compiled: chain.append((compiled, False, MODEL_PATH_BAM, True, False))
+                chain.append((MODEL_PATH_BAM, False, MODEL_PATH_BAM, False, False))
+            if os.path.exists(MODEL_PATH_GLB):
+                lp = lod_cached(MODEL_PATH_GLB) if lod_cached else None
+                if lp: chain.append((lp, True, MODEL_PATH_GLB, True, True))
+                compiled = cache.compiled_path(MODEL_PATH_GLB) if cache else None
+                if compiled: chain.append((compiled, True, MODEL_PATH_GLB, True, False))
+                chain.append((MODEL_PATH_GLB, True, MODEL_PATH_GLB, False, False))
+            chain.append(("models/box", False, None, False, False))
+            self.taskMgr.add(lambda t: attempt(0) or Task.done, "model-cache-resolved")
+            return Task.done
+
+        def attempt(i):
+            path, is_glb, src, compiled, has_lod = chain[i]
+            if is_glb and not compiled:
+                _try_register_gltf_plugin()
+            def loaded(model):
+                if model is None and i + 1 < len(chain):
+                    if is_glb and not compiled: print("[ERROR] Could not load GLB:", path)
+                    attempt(i + 1)
+                    return
+                if model is not None and src and SCENE_OPT and not compiled:
+                    self._optimize_model(model, src, prepared)
+                    return
+                prepared(model)
+            def prepared(model):
+                if model is None or not cache or not src:
+                    cached(model, None)
+                    return
+                def bake(task):
+                    meta = cache.load_meta(src)
+                    if meta is None:
+                        # First load of this content: compile + bake once
+                        try:
+                            meta = cache.store(src, model, list(OBJ_SUBPARTS_INFO),
+                                               compile_bam=(is_glb or SCENE_OPT) and not has_lod)
+                        except OSError as e:
+                            print(f"[WARN] Could not write model cache: {e}")
+                    self.taskMgr.add(lambda t: cached(model, meta) or Task.done, "model-cache-ready")
+                    return Task.done
+                self._run_on_assets(bake, "model-cache")
+            def cached(model, meta):
+                if model is not None and src and MODEL_LOD and not has_lod:
+                    self._build_model_lod(model, src, lambda m: done(m, is_glb, meta))
+                    return
+                done(model, is_glb, meta)
+            self.loader.loadModel(Filename.fromOsSpecific(os.path.abspath(path)) if compiled else path, callback=loaded)
+        self._run_on_assets(resolve, "model-cache-resolve")
+
+    def _optimize_model(self, model, src, then):
+        """scene_opt pass on the "assets" thread (uncached sources only), then then(model)."""
+        import scene_opt
+        def run(task):
+            t0 = time.perf_counter()
             try:
-                return self.loader.loadModel(MODEL_PATH_BAM), False
-            except Exception:
-                pass
-        if os.path.exists(MODEL_PATH_GLB):
-            _try_register_gltf_plugin()
+                res = scene_opt.optimize(model, list(OBJ_SUBPARTS_INFO))
+                if res is None:
+                    print(f"[OPT] {src}: animated, left as loaded")
+                else:
+                    print(f"[OPT] {src}: {scene_opt.format_stats(*res)} ({time.perf_counter() - t0:.2f}s)")
+            except Exception as e:
+                print(f"[WARN] Scene optimization skipped: {e}")
+            self.taskMgr.add(lambda t: then(model) or Task.done, "model-opt-ready")
+            return Task.done
+        self._run_on_assets(run, "model-opt")
+
+    def _build_model_lod(self, model, src, then):
+        """Decimated levels on the "assets" thread (first load of this source only), then then(model)."""
+        import lod
+        if lod.numpy is None or lod.count_triangles(model) < MODEL_LOD_MIN_TRIS:
+            then(model)
+            return
+        def build(task):
+            t0 = time.perf_counter()
             try:
-                return self.loader.loadModel(MODEL_PATH_GLB), True
+                tris = lod.build_lod(model, MODEL_LOD_RADII, MODEL_LOD_ERROR, MODEL_SCALE)
+                lod.store(src, model, lod_settings(), tris)
+                print(f"[LOD] {src}: triangles per level {tris} ({time.perf_counter() - t0:.2f}s)")
             except Exception as e:
-                print("[ERROR] Could not load GLB:", e)
-        return self.loader.loadModel("models/box"), False
+                print(f"[WARN] LOD skipped: {e}")
+            self.taskMgr.add(lambda t: then(model) or Task.done, "model-lod-ready")
+            return Task.done
+        self._run_on_assets(build, "model-lod")
+
+    def _run_on_assets(self, fn, name):
+        """fn(task) on the "assets" thread, or right here if there is none."""
+        if self.assets_thread:
+            self.taskMgr.add(fn, name, taskChain="assets")
+        else:
+            fn(None)
+
+    def _request_cupola_model(self):
+        if self.cupola_pending or self.cupola_ready is not None:
+            return
+        self.cupola_pending = True
+        self._load_model_any(self._on_cupola_model_loaded)
+
+    def _on_cupola_model_loaded(self, model, used_glb, meta):
+        self.cupola_pending = False
+        self.cupola_ready = (model, used_glb, meta)
+        if self.cupola_waiting:
+            self.cupola_waiting = False
+            self._hide_cupola_loading()
+            self._build_cupola_scene()
+
+    def _maybe_prefetch_cupola(self):
+        if CUPOLA_PREFETCH_DISTANCE <= 0 or self.cupola_pending or self.cupola_ready is not None:
+            return
+        if "cupola" in self.scene_cache:
+            return
+        tz = self.cupola_trigger
+        if math.hypot(self.sim.x - tz.x, self.sim.z - tz.z) <= CUPOLA_PREFETCH_DISTANCE:
+            self._request_cupola_model()
+
+    def _show_cupola_loading(self):
+        self.cupola_loading_t = 0.0
+        self.cupola_loading_ui = self.ui.get("cupola_loading").show()
+
+    def _update_cupola_loading(self, dt):
+        # Model loads give no byte progress: ease toward full while waiting
+        self.cupola_loading_t += dt
+        t = 1.0 - math.exp(-self.cupola_loading_t / 2.0)
+        self.cupola_loading_ui.set_progress(t, f"Loading Cupola... {self.cupola_loading_t:.1f}s")
+
+    def _hide_cupola_loading(self):
+        if self.cupola_loading_ui:
+            self.cupola_loading_ui.hide(); self.cupola_loading_ui = None
 
     def enter_cupola(self):
         self._clear_movement()
-        self.state, self.ui_blocked = "cupola3d", False
-        self.layer_bg.hide(); self.layer_game.hide()
-        self.enableMouse()
+        entry = self.scene_cache.get("cupola")
+        if entry is not None:
+            self._attach_cupola_scene(entry)
+            return
+        if self.cupola_ready is None:
+            # Not prefetched (or still in flight): keep the UI blocked behind a progress overlay
+            self.ui_blocked = True
+            self.cupola_waiting = True
+            self._show_cupola_loading()
+            self._request_cupola_model()
+            return
+        self._build_cupola_scene()
+
+    def _build_cupola_scene(self):
         self.cupola_root = self.render.attachNewNode("cupola_root")
 
-        self.cupola_model, used_glb = self._load_model_any()
+        (self.cupola_model, used_glb, baked), self.cupola_ready = self.cupola_ready, None
         if used_glb and self.cupola_model.hasPythonTag("loader-error"):
             used_glb = False
 
@@ -686,16 +1144,26 @@ class Game(ShowBase):
         self.cupola_model.setHpr(*MODEL_HPR)
         self.cupola_model.setScale(MODEL_SCALE)
 
+        from direct.gui.DirectGui import DirectButton, DirectLabel
+        from picking import Picker
         if used_glb is False and not os.path.exists(MODEL_PATH_BAM) and os.path.exists(MODEL_PATH_GLB):
             DirectLabel(parent=self.layer_ui,
                         text="Could not load GLB.\nTip: convert to BAM:\n.gltf2bam assets/cupola.glb assets/cupola.bam",
                         frameColor=(0,0,0,0.6), pos=(0,0,0.8), scale=0.045)
 
-        # Clickables by name
+        # Picking (markers: vectorized spheres, subparts: BVH in model space)
+        self.picker = Picker(self.camera, self.camNode, self.cupola_root, self.cupola_model)
+
+        # Clickables by name (full-detail level; hover also tints the coarser copies)
+        import lod
+        levels = lod.lod_levels(self.cupola_model)
+        search = levels[0] if levels else self.cupola_model
         for subname, info in OBJ_SUBPARTS_INFO.items():
-            np = self.cupola_model.find(f"**/{subname}")
+            np = search.find(f"**/{subname}")
             if not np.isEmpty():
-                self._make_clickable(np, info)
+                self._make_clickable(np, info, (baked or {}).get(subname))
+                if levels:
+                    np.setPythonTag("lod_twins", [l.find(f"**/{subname}") for l in levels[1:]])
 
         # Invisible markers
         for (x, y, z), radius, info in MARKERS_INFO:
@@ -703,9 +1171,6 @@ class Game(ShowBase):
             marker.setPos(x, y, z)
             self._make_marker_clickable(marker, radius, info)
 
-        # Picking
-        self._setup_picker()
-
         # Orbit camera
         self.camera_orbit = OrbitCamera(self, self.camera, self.camNode)
         self.camera_orbit.target.setPos(self.cupola_model.getPos(self.render))
@@ -717,68 +1182,137 @@ class Game(ShowBase):
         self.info_label = DirectLabel(parent=self.layer_ui, text="",
                                       frameColor=(0,0,0,0.5), frameSize=(-0.8, 0.8, -0.15, 0.15),
                                       pos=(0,0,-0.85), scale=0.055)
-        self.accept("mouse1", self._on_click_3d)
+
+        # Keep it warm: next enter is only a reparent (unless over the memory cap)
+        entry = {"root": self.cupola_root, "data": self._cupola_scene_state()}
+        self.scene_cache.put("cupola", self.cupola_root, entry["data"])
+        self._attach_cupola_scene(entry)
+
+    def _cupola_scene_state(self):
+        return {"model": self.cupola_model, "orbit": self.camera_orbit,
+                "picker": self.picker,
+                "back_btn": self.back_btn, "info_label": self.info_label}
+
+    def _attach_cupola_scene(self, entry):
+        d = entry["data"]
+        self.cupola_root = entry["root"]
+        self.cupola_model, self.camera_orbit = d["model"], d["orbit"]
+        self.picker = d["picker"]
+        self.hover_np, self.clicked_info = None, ""
+        self.back_btn, self.info_label = d["back_btn"], d["info_label"]
+        self.cupola_root.reparentTo(self.render)
+        self.back_btn.show(); self.info_label.show()
+        self.info_label["text"] = ""
+        self.camera_orbit.invalidate()
+
+        # OrbitCamera owns the camera; the default trackball would only be
+        # overwritten by it every frame, so it stays disabled.
+        self.state, self.ui_blocked = "cupola3d", False
+        self.layer_bg.hide(); self.layer_game.hide()
 
     def exit_cupola(self):
+        self._record_action("exit_cupola")
         self._clear_movement()
+        self._set_hover(None)
         self.state = "map2d"
         self.disableMouse()
-        if self.back_btn: self.back_btn.destroy(); self.back_btn = None
-        if self.info_label: self.info_label.destroy(); self.info_label = None
-        if self.cupola_root: self.cupola_root.removeNode(); self.cupola_root = None
+        if "cupola" in self.scene_cache:
+            # Detach only; the scene stays built in the cache
+            if self.back_btn: self.back_btn.hide()
+            if self.info_label: self.info_label.hide()
+            if self.cupola_root: self.cupola_root.detachNode()
+        else:
+            self._release_cupola_scene(self._cupola_scene_state())
+            if self.cupola_root: self.cupola_root.removeNode()
+        self.back_btn = self.info_label = None
+        self.cupola_root = None
         self.camera_orbit = None
-        self.ignore("mouse1")
         self.layer_bg.show()
         self.layer_game.show()
 
+    def _release_cupola_scene(self, d):
+        if d["back_btn"]: d["back_btn"].destroy()
+        if d["info_label"]: d["info_label"].destroy()
+        if d["orbit"]: d["orbit"].target.removeNode()
+
+    def _on_scene_evicted(self, key, entry):
+        if key == "cupola":
+            self._release_cupola_scene(entry["data"])
+
+    def evict_scene(self, key):
+        """Drop a warm scene (e.g. on low memory). Leaves it first if it is on screen."""
+        if key == "cupola" and self.state == "cupola3d":
+            self.exit_cupola()
+        return self.scene_cache.evict(key)
+
     # ----- Picking (3D) -----
-    def _setup_picker(self):
-        self.picker_trav  = CollisionTraverser()
-        self.picker_queue = CollisionHandlerQueue()
-        self.picker_ray   = CollisionRay()
-        picker_node = CollisionNode('mouseRay')
-        picker_node.setFromCollideMask(self.click_mask)
-        self.picker_np = self.camera.attachNewNode(picker_node)
-        picker_node.addSolid(self.picker_ray)
-        self.picker_trav.addCollider(self.picker_np, self.picker_queue)
-
-    def _make_clickable(self, nodepath, info_text: str):
+    def _make_clickable(self, nodepath, info_text: str, baked=None):
         nodepath.setTag("clickable", "1")
         nodepath.setTag("info", info_text)
-        minb, maxb = nodepath.getTightBounds()
-        radius = (max((maxb - minb).length(), 0.001) * 0.25) if (minb and maxb) else 0.3
-        cnode = CollisionNode("col_" + (nodepath.getName() or "part"))
-        cnode.addSolid(CollisionSphere(0, 0, 0, radius))
-        cnode.setIntoCollideMask(self.click_mask)
-        nodepath.attachNewNode(cnode)
+        if baked is not None:
+            # From the model cache, no getTightBounds()
+            mminb, mmaxb, box = baked.get("model_min"), baked.get("model_max"), baked.get("box")
+        else:
+            import scene_opt
+            bounds = nodepath.getTightBounds(self.cupola_model)
+            mminb, mmaxb = bounds if bounds else (None, None)
+            box = scene_opt.proxy_box(nodepath, self.cupola_model, bounds) if bounds else None
+        if mminb is not None:
+            # AABB for the BVH, oriented box (if any) for the exact ray test
+            self.picker.add_part(nodepath, mminb, mmaxb, box)
 
     def _make_marker_clickable(self, nodepath, radius: float, info_text: str):
         nodepath.setTag("clickable", "1")
         nodepath.setTag("info", info_text)
-        cnode = CollisionNode("col_marker")
-        cnode.addSolid(CollisionSphere(0, 0, 0, radius))
-        cnode.setIntoCollideMask(self.click_mask)
-        nodepath.attachNewNode(cnode)
+        self.picker.add_marker(nodepath, radius)
+
+    def _pick_under_mouse(self):
+        mw = self.mouseWatcherNode
+        if not mw or not mw.hasMouse() or self.picker is None:
+            return None
+        mpos = mw.getMouse()
+        with profiler.scope("picking"):
+            return self.picker.pick(mpos.getX(), mpos.getY())
+
+    def _set_hover(self, np):
+        if np is self.hover_np:
+            return
+        if self.hover_np is not None and not self.hover_np.isEmpty():
+            for n in [self.hover_np] + (self.hover_np.getPythonTag("lod_twins") or []):
+                n.clearColorScale()
+        self.hover_np = np
+        self.mark_dirty()
+        if np is not None:
+            for n in [np] + (np.getPythonTag("lod_twins") or []):
+                n.setColorScale(*HOVER_TINT)
+        if self.info_label:
+            self.info_label["text"] = np.getTag("info") if np is not None else self.clicked_info
+
+    def _update_hover(self):
+        # Cached in Picker: no work while mouse, camera and model are still
+        self._set_hover(self._pick_under_mouse())
+
+    def _on_click(self):
+        mw = self.mouseWatcherNode
+        if self.input_replay is not None or not mw or not mw.hasMouse():
+            return
+        mx, my = mw.getMouseX(), mw.getMouseY()
+        if self.input_recorder is not None:
+            self.input_recorder.click(self.logic_ticks, mx, my)
+        self._click_at(mx, my)
 
-    def _on_click_3d(self):
-        if not self.mouseWatcherNode.hasMouse():
+    def _click_at(self, mx, my):
+        if self.state == "map2d":
+            # Click-to-move (render2d units == map units); offline only, the server gets keys
+            if not (self.ui_blocked or self.dialog or self.wall_edit or self.bed_edit or self.net):
+                self.sim.move_to(mx, my)
             return
-        mpos = self.mouseWatcherNode.getMouse()
-        self.picker_ray.setFromLens(self.camNode, mpos.getX(), mpos.getY())
-        self.picker_trav.traverse(self.cupola_root)
-        if self.picker_queue.getNumEntries() == 0:
-            self.info_label["text"] = ""
+        if self.state != "cupola3d" or self.picker is None:
             return
-        self.picker_queue.sortEntries()
-        for i in range(self.picker_queue.getNumEntries()):
-            entry = self.picker_queue.getEntry(i)
-            np = entry.getIntoNodePath()
-            target = np
-            while not target.isEmpty() and not target.hasNetTag("clickable"):
-                target = target.getParent()
-            if not target.isEmpty() and target.hasNetTag("info"):
-                self.info_label["text"] = target.getNetTag("info")
-                break
+        with profiler.scope("picking"):
+            target = self.picker.pick(mx, my)
+        self.clicked_info = target.getTag("info") if target is not None else ""
+        self.info_label["text"] = self.clicked_info
 
     # ----- 3D transforms (keys) -----
     def _model_hpr_delta(self, dh, dp, dr):
@@ -805,38 +1339,38 @@ class Game(ShowBase):
 
     # =================== WALLS (editor) ===================
     def _build_walls_from_config(self):
-        for (x,z,w,h) in WALLS:
+        baked = None
+        if COLLISION_MODE == "grid":
+            import bake_walls
+            baked = bake_walls.load_level(WALLS_BAKED, WALLS, MAP_BOUNDS, WALLS_BAKED_CELL)
+        for (x,z,w,h) in (baked[1] if baked else WALLS):   # baked: merged, non-overlapping
             self._add_wall(x, z, w, h)
+        if baked:
+            self.sim.set_occupancy(baked[0])
         if not self.show_walls:
             for w in self.walls:
-                w["node"].hide()
+                self.wall_batch.set_visible(w["slot"], False)
 
     def _add_wall(self, x, z, w, h):
-        cm = CardMaker("wall"); cm.setFrame(-w/2, w/2, -h/2, h/2)
-        np = self.layer_game.attachNewNode(cm.generate())
-        np.setTransparency(TransparencyAttrib.M_alpha)
-        np.setColor(1, 0, 0, 0.25)  # red translucent
-        np.setPos(x, 0, z)
-        wall = {"x":x, "z":z, "w":w, "h":h, "node":np}
-        self.walls.append(wall)
+        wall = self.sim.add_wall(x, z, w, h)
+        wall["slot"] = self.wall_batch.add(x, z, w, h, (1, 0, 0, 0.25))  # red translucent
         return len(self.walls)-1
 
     def _toggle_wall_editor(self):
         self.wall_edit = not self.wall_edit
         self._clear_movement()
         if self.wall_edit:
-            if self.wall_hint is None:
-                self.wall_hint = DirectLabel(parent=self.layer_ui, text="", scale=0.045,
-                                             frameColor=(0,0,0,0.6), pos=(0,0,0.9))
+            self.wall_hint = self.ui.get("wall_hint")
             self._update_wall_hint()
+            self.wall_hint.show()
         else:
             if self.wall_hint:
-                self.wall_hint.destroy(); self.wall_hint = None
+                self.wall_hint.hide(); self.wall_hint = None
 
     def _toggle_wall_visibility(self):
         self.show_walls = not self.show_walls
         for w in self.walls:
-            (w["node"].show() if self.show_walls else w["node"].hide())
+            self.wall_batch.set_visible(w["slot"], self.show_walls)
 
     def _cycle_wall(self, step):
         if not self.wall_edit or not self.walls: return
@@ -854,8 +1388,9 @@ class Game(ShowBase):
 
     def _delete_wall(self):
         if not self.wall_edit or self.wall_sel < 0 or not self.walls: return
-        w = self.walls.pop(self.wall_sel)
-        w["node"].removeNode()
+        w = self.walls[self.wall_sel]
+        self.sim.remove_wall(w)
+        self.wall_batch.remove(w["slot"])
         self.wall_sel = max(-1, min(self.wall_sel, len(self.walls)-1))
         self._highlight_selected()
         self._update_wall_hint()
@@ -864,7 +1399,8 @@ class Game(ShowBase):
         if not self.wall_edit or self.wall_sel < 0: return
         w = self.walls[self.wall_sel]
         w["x"] += dx; w["z"] += dz
-        w["node"].setPos(w["x"], 0, w["z"])
+        self.wall_batch.set_rect(w["slot"], w["x"], w["z"], w["w"], w["h"])
+        self.sim.update_wall(w)
         self._update_wall_hint()
 
     def _resize_wall(self, dw, dh):
@@ -872,20 +1408,14 @@ class Game(ShowBase):
         w = self.walls[self.wall_sel]
         w["w"] = max(0.05, w["w"] + dw)
         w["h"] = max(0.05, w["h"] + dh)
-        # rebuild card
-        w["node"].removeNode()
-        cm = CardMaker("wall"); cm.setFrame(-w["w"]/2, w["w"]/2, -w["h"]/2, w["h"]/2)
-        np = self.layer_game.attachNewNode(cm.generate())
-        np.setTransparency(TransparencyAttrib.M_alpha)
-        np.setColor(1, 0, 0, 0.25)
-        np.setPos(w["x"], 0, w["z"])
-        w["node"] = np
-        self._highlight_selected()
+        self.sim.update_wall(w)
+        # rewrite the 4 vertices in place
+        self.wall_batch.set_rect(w["slot"], w["x"], w["z"], w["w"], w["h"])
         self._update_wall_hint()
 
     def _highlight_selected(self):
         for i, w in enumerate(self.walls):
-            w["node"].setColor(1, 0, 0, 0.45 if i == self.wall_sel else 0.25)
+            self.wall_batch.set_color(w["slot"], (1, 0, 0, 0.45 if i == self.wall_sel else 0.25))
 
     def _update_wall_hint(self):
         if not self.wall_hint: return
@@ -904,6 +1434,57 @@ class Game(ShowBase):
         print("WALLS = [\n    " + items + "\n]")
         self._update_wall_hint()
 
+    # =================== CREW (NPCs) ===================
+    def _build_crowd(self, n):
+        from crowd import CrowdSim, CrowdLayer
+        try:
+            self.crowd = CrowdSim(n, MAP_BOUNDS, size=CROWD_SCALE, speed=CROWD_SPEED, seed=CROWD_SEED)
+            self.crowd.set_walls(self.walls, self.sim.walls_version)
+            self.crowd.spawn()
+            if CROWD_GOAL:
+                self.crowd.route(self.sim.nav.flow(CROWD_GOAL))
+            fb = self.player.flipbook   # same walk cycle, own phase per agent
+            self.crowd_layer = CrowdLayer(self.layer_game, self.crowd.n, CROWD_SCALE, fb.atlas.texture, seed=CROWD_SEED)
+            self.crowd_layer.set_flipbook(fb, seed=CROWD_SEED)
+            self.anim.add_batch(self.crowd_layer.animate)
+            self.player.node.reparentTo(self.layer_game)   # keep the player drawn on top
+        except Exception as e:
+            print(f"[WARN] Crowd disabled: {e}")
+            self.crowd = self.crowd_layer = None
+
+    # =================== MULTIPLAYER ===================
+    def _join_server(self, address):
+        import net
+        try:
+            client = net.connect(self.sim, address)
+        except Exception as e:
+            print(f"[WARN] Multiplayer disabled ({address}): {e}")
+            return
+        if abs(client.tick_rate - FIXED_TICK_RATE) > 1e-6:
+            print(f"[WARN] Server ticks at {client.tick_rate:g} Hz but FIXED_TICK_RATE is {FIXED_TICK_RATE:g}")
+        self.net = client
+        print(f"[NET] joined {address} as player {client.id}")
+
+    def _draw_remote_players(self):
+        from net import F_MOVING, F_JUMP
+        fb = self.player.flipbook          # same walk cycle and atlas as the local player
+        remote = self.net.remote()
+        for pid, (x, z, facing, flags) in remote.items():
+            e = self.remote_sprites.get(pid)
+            if e is None:
+                e = self.remote_sprites[pid] = Entity(self, None, self.layer_game, pos=(x, z))
+                e.set_texture(fb.atlas.texture)
+                e.track = self.anim.add(e.node, fb)
+            e.set_pos(x, z)
+            sc = PLAYER_SCALE_JUMP if flags & F_JUMP else PLAYER_SCALE
+            e.set_scale_xy(sc * facing, sc)
+            if flags & F_MOVING: e.track.play()
+            else: e.track.stop()
+        for pid in [p for p in self.remote_sprites if p not in remote]:
+            e = self.remote_sprites.pop(pid)
+            self.anim.remove(e.track)
+            e.node.removeNode()
+
     # =================== BED (sleep) EDITOR ===================
     def _toggle_bed_editor(self):
         self.bed_edit = not self.bed_edit
@@ -913,13 +1494,12 @@ class Game(ShowBase):
         if self.bed_icon:
             self.bed_icon.show()
         if self.bed_edit:
-            if self.bed_hint is None:
-                self.bed_hint = DirectLabel(parent=self.layer_ui, text="", scale=0.045,
-                                            frameColor=(0,0,0,0.6), pos=(0,0,0.8))
+            self.bed_hint = self.ui.get("bed_hint")
             self._update_bed_hint()
+            self.bed_hint.show()
         else:
             if self.bed_hint:
-                self.bed_hint.destroy(); self.bed_hint = None
+                self.bed_hint.hide(); self.bed_hint = None
 
     def _update_bed_hint(self):
         if not self.bed_hint: return
@@ -934,6 +1514,7 @@ class Game(ShowBase):
         x = self.sleep_trigger.x + dx
         z = self.sleep_trigger.z + dz
         self.sleep_trigger.set_center(x, z)
+        self.sim.move_trigger("sleep")
         if self.bed_icon:
             self.bed_icon.set_pos(x, z)
         self._update_bed_hint()
@@ -943,30 +1524,110 @@ class Game(ShowBase):
         w = self.sleep_trigger.w + dw
         h = self.sleep_trigger.h + dh
         self.sleep_trigger.set_size(w, h)
+        self.sim.move_trigger("sleep")
         self._update_bed_hint()
 
     def _print_bed_trigger_constant(self):
         print(f"SLEEP_TRIGGER_CENTER = ({self.sleep_trigger.x:.3f}, {self.sleep_trigger.z:.3f})")
         print(f"SLEEP_TRIGGER_SIZE   = ({self.sleep_trigger.w:.3f}, {self.sleep_trigger.h:.3f})")
 
+    # =================== STARTUP ===================
+    def _on_first_frame(self, task):
+        """Once, after the first igLoop render: time-to-first-frame, then deferred loads."""
+        now = time.perf_counter()
+        self.first_frame_s = now - T_IMPORT
+        st = self.startup_times
+        st["first_frame"] = self.first_frame_s
+        print(f"[STARTUP] first frame {self.first_frame_s:.3f}s after import "
+              f"(Game init {st['init']:.3f}s, fast={FAST_STARTUP})")
+        if FAST_STARTUP:
+            self._load_bed_icon()
+            if UI_PREBUILD:
+                # One widget per frame (the sleep overlay waits for the HUD atlas)
+                self.prebuild_queue = [n for n in self.ui.factories if n != "sleep"]
+                self.taskMgr.add(self._prebuild_ui_task, "ui-prebuild")
+            if self.assets_thread:
+                self.taskMgr.add(self._hud_atlas_task, "hud-atlas", taskChain="assets")
+            else:
+                self._on_hud_atlas_ready()
+        else:
+            self._log_startup()
+        return Task.done
+
+    def _prebuild_ui_task(self, task):
+        if self.prebuild_queue:
+            self.ui.get(self.prebuild_queue.pop(0))
+        return Task.cont if self.prebuild_queue else Task.done
+
+    def _hud_atlas_task(self, task):
+        # Worker thread: decode + pack the 22 HUD images; widgets are made on the main thread
+        self._load_hud_atlas()
+        self.taskMgr.add(lambda t: self._on_hud_atlas_ready() or Task.done, "hud-atlas-ready")
+        return Task.done
+
+    def _on_hud_atlas_ready(self):
+        self._load_hud()
+        # Asleep before the atlas came in: the HUD comes back with _finish_sleep
+        if self.loading_overlay is not None:
+            for w in (getattr(self, "hud_anchor", None), self.energy_img, self.energy_lbl):
+                if w: w.hide()
+        # A sleep overlay built meanwhile has the plain bar: rebuild it with the images
+        ov = self.ui.widgets.get("sleep")
+        if ov is not None and ov.img is None and self.sleep_images_loaded and ov is not self.loading_overlay:
+            self.ui.discard("sleep")
+        if UI_PREBUILD:
+            self.ui.get("sleep")
+        self.startup_times["hud_ready"] = time.perf_counter() - T_IMPORT
+        print(f"[STARTUP] HUD textures ready {self.startup_times['hud_ready']:.3f}s after import")
+        self._log_startup()
+
+    def _log_startup(self):
+        if not STARTUP_LOG_PATH:
+            return
+        row = {"time": round(time.time(), 3), "fast": FAST_STARTUP}
+        row.update({k: round(v, 4) for k, v in self.startup_times.items()})
+        try:
+            with open(STARTUP_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row) + "\n")
+        except OSError as e:
+            print(f"[WARN] Could not write {STARTUP_LOG_PATH}: {e}")
+
+    def _load_bed_icon(self):
+        try:
+            self.bed_icon = Entity(self, BED_IMAGE, self.layer_game, pos=SLEEP_TRIGGER_CENTER, scale=BED_SCALE)
+            self.mark_dirty()
+        except Exception:
+            self.bed_icon = None
+
+    def _load_hud(self):
+        self.energy_icons_loaded = self._load_energy_icons()
+        self._build_energy_hud()
+        self.sleep_images_loaded = self._load_sleep_bar_images()
+
+    # =================== HUD ATLAS ===================
+    def _load_hud_atlas(self):
+        if self.hud_atlas is None:
+            try:
+                self.hud_atlas = build_atlas(ENERGY_ICON_PATHS + SLEEP_BAR_IMAGE_PATHS, name="hud_atlas",
+                                             cache_dir=MODEL_CACHE_DIR)
+            except Exception as e:
+                print(f"[WARN] Could not build HUD atlas: {e}")
+        return self.hud_atlas
+
     # =================== ENERGY HUD ===================
     def _load_energy_icons(self):
-        self.energy_textures = []
-        ok = True
+        self.energy_frames = []
         if len(ENERGY_ICON_PATHS) != 11:
             print("[WARN] ENERGY_ICON_PATHS must have 11 items (100..0).")
             return False
-        for p in ENERGY_ICON_PATHS:
-            try:
-                self.energy_textures.append(self.loader.loadTexture(p))
-            except Exception:
-                print(f"[WARN] Could not load energy icon: {p}")
-                ok = False
-        return ok
+        if self._load_hud_atlas() is None:
+            return False
+        self.energy_frames = self.hud_atlas.frames_for(ENERGY_ICON_PATHS)
+        return True
 
     def _build_energy_hud(self):
         if self.energy_icons_loaded:
-            self.energy_img = OnscreenImage(parent=self.layer_ui, image=self.energy_textures[0])
+            self.energy_img = OnscreenImage(parent=self.layer_ui, image=self.hud_atlas.texture)
             self.energy_img.setTransparency(TransparencyAttrib.M_alpha)
             self.energy_img.setScale(ENERGY_HUD_SCALE_X, 1, ENERGY_HUD_SCALE_Z)
 
@@ -982,34 +1643,36 @@ class Game(ShowBase):
 
             self._update_energy_hud()
         else:
+            from direct.gui.DirectGui import DirectLabel
             self.energy_lbl = DirectLabel(parent=self.layer_ui,
-                                          text=f"Energy: {self.energy_level}/10",
+                                          text=f"Energy: {self.sim.energy_level}/10",
                                           scale=0.055,
                                           pos=(-1.05,0,0.9),
                                           frameColor=(0,0,0,0.4))
 
     def _update_energy_hud(self):
+        self.mark_dirty()
         # energy_level 10..0  → idx 0..10  (100..0)
-        idx = max(0, min(10, 10 - self.energy_level))
+        idx = max(0, min(10, 10 - self.sim.energy_level))
         if self.energy_img is not None and self.energy_icons_loaded:
-            self.energy_img.setImage(self.energy_textures[idx])
+            self.hud_atlas.apply(self.energy_img, self.energy_frames[idx])
         elif self.energy_lbl is not None:
-            self.energy_lbl["text"] = f"Energy: {self.energy_level}/10"
+            self.energy_lbl["text"] = f"Energy: {self.sim.energy_level}/10"
 
     # =================== SLEEP BAR IMAGES ===================
     def _load_sleep_bar_images(self):
-        self.sleep_textures = []
-        ok = True
+        self.sleep_frames = []
         if len(SLEEP_BAR_IMAGE_PATHS) != 11:
             print("[WARN] SLEEP_BAR_IMAGE_PATHS must have 11 items (0..100).")
             return False
-        for p in SLEEP_BAR_IMAGE_PATHS:
-            try:
-                self.sleep_textures.append(self.loader.loadTexture(p))
-            except Exception:
-                print(f"[WARN] Could not load sleep bar image: {p}")
-                ok = False
-        return ok
+        if self._load_hud_atlas() is None:
+            return False
+        self.sleep_frames = self.hud_atlas.frames_for(SLEEP_BAR_IMAGE_PATHS)
+        return True
 
 if __name__ == "__main__":
+    # python levels/main.py [--record FILE | --replay FILE]
+    args = sys.argv[1:]
+    if "--record" in args[:-1]: RECORD_INPUT_PATH = args[args.index("--record") + 1]
+    if "--replay" in args[:-1]: REPLAY_INPUT_PATH = args[args.index("--replay") + 1]
     Game().run()
@@ -0,0 +1,95 @@
+# model_cache.py
+# On-disk compile cache: GLB -> BAM keyed by a content hash, plus baked
+# pick metadata (model-space bounds + pick box per OBJ_SUBPARTS_INFO name).
+# Hashing and writes are meant for the "assets" thread (main._run_on_assets).
+import os, json, hashlib
+from panda3d.core import Filename, PandaSystem
+from scene_opt import proxy_box
+
+CACHE_FORMAT = 5
+
+def file_digest(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def bake_pick_metadata(model, names):
+    """
+    {name: {"box", "model_min", "model_max"}} relative to the model root: the
+    AABB for Picker's tree and box (scene_opt.proxy_box) for its narrow phase.
+    """
+    meta = {}
+    lod = model.find("**/+LODNode")
+    root = model if lod.isEmpty() else lod.getChild(0)   # lod.py chain: the full-detail level
+    for name in names:
+        np = root.find(f"**/{name}")
+        if np.isEmpty():
+            continue
+        bounds = np.getTightBounds(model)
+        if bounds and bounds[0] and bounds[1]:
+            mminb, mmaxb = bounds
+            meta[name] = {"box": proxy_box(np, model, bounds),
+                          "model_min": list(mminb), "model_max": list(mmaxb)}
+        else:
+            meta[name] = {"box": None, "model_min": None, "model_max": None}
+    return meta
+
+class ModelCache:
+    """
+    <cache_dir>/<key>.bam   compiled model (only for non-BAM sources)
+    <cache_dir>/<key>.json  {"source", "subparts": {...}}
+    key = sha1(source bytes + loader settings), so edits to the asset or a
+    plugin/Panda3D upgrade never serve a stale entry.
+    """
+    def __init__(self, cache_dir, settings=None):
+        self.cache_dir = cache_dir
+        self.settings = dict(settings or {})
+        self.settings.setdefault("format", CACHE_FORMAT)
+        self.settings.setdefault("panda3d", PandaSystem.getVersionString())
+        self._keys = {}   # (path, mtime, size) -> key (hash once per process)
+
+    def key_for(self, src):
+        st = os.stat(src)
+        memo = (os.path.abspath(src), st.st_mtime_ns, st.st_size)
+        key = self._keys.get(memo)
+        if key is None:
+            h = hashlib.sha1(file_digest(src).encode())
+            h.update(json.dumps(self.settings, sort_keys=True).encode())
+            key = self._keys[memo] = h.hexdigest()[:20]
+        return key
+
+    def _paths(self, src):
+        base = os.path.join(self.cache_dir, self.key_for(src))
+        return base + ".bam", base + ".json"
+
+    def compiled_path(self, src):
+        """Cached BAM for src, or None."""
+        bam, _ = self._paths(src)
+        return bam if os.path.exists(bam) else None
+
+    def load_meta(self, src):
+        _, meta = self._paths(src)
+        try:
+            with open(meta, "r", encoding="utf-8") as f:
+                return json.load(f).get("subparts", {})
+        except (OSError, ValueError):
+            return None
+
+    def store(self, src, model, subpart_names, compile_bam=True):
+        """Write the compiled BAM (optional) and baked metadata. Returns the meta dict."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        bam, meta_path = self._paths(src)
+        if compile_bam and not os.path.exists(bam):
+            tmp = bam + ".tmp"
+            if model.writeBamFile(Filename.fromOsSpecific(tmp)):
+                os.replace(tmp, bam)
+            else:
+                print(f"[WARN] Could not write model cache: {bam}")
+        meta = bake_pick_metadata(model, subpart_names)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": os.path.basename(src), "subparts": meta}, f, indent=1)
+        os.replace(tmp, meta_path)
+        return meta
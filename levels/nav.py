@@ -0,0 +1,360 @@
+# nav.py
+# Navigation over the WALLS map (render2d units). Walls are rasterized into a
+# grid of agent-center cells (blocked = an agent box there would overlap a
+# wall); A* answers point-to-point queries and flow fields answer "how do I
+# get to X" for any number of agents at once. Pure Python (headless).
+import heapq, math
+from spatial import SpatialHash
+
+INF = float("inf")
+SQRT2 = math.sqrt(2.0)
+# 8 neighbours: (dcol, drow, cost); diagonals only if both sides are free (no corner cutting)
+_MOVES = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+          (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2))
+
+class FlowField:
+    """
+    Distance-to-goal over the grid (Dijkstra from the goal cell) + per-cell
+    parent: next_point() is the next cell center toward the goal. Built once,
+    shared by every agent; wall edits repair only the cells they affect.
+    """
+    def __init__(self, grid, x, z):
+        self.grid = grid
+        self.goal = (x, z)
+        self.goal_cell = grid.nearest_free(grid.cell_of(x, z))
+        self.dist = []
+        self.parent = []
+        self.version = 0          # bumped on every (re)build or repair
+        self.build()
+
+    def build(self):
+        g = self.grid
+        self.dist = [INF] * g.n
+        self.parent = [-1] * g.n
+        if self.goal_cell is not None and not g.blocked(self.goal_cell):
+            self.dist[self.goal_cell] = 0.0
+            self._propagate([(0.0, self.goal_cell)])
+        self.version += 1
+
+    def _propagate(self, heap):
+        g, dist, parent = self.grid, self.dist, self.parent
+        heapq.heapify(heap)
+        while heap:
+            d, i = heapq.heappop(heap)
+            if d > dist[i]:
+                continue
+            for j, cost in g.neighbours(i):
+                nd = d + cost
+                if nd < dist[j] - 1e-12:
+                    dist[j] = nd
+                    parent[j] = i
+                    heapq.heappush(heap, (nd, j))
+
+    def repair(self, now_blocked, now_free):
+        """Cells whose blocked state flipped (NavGrid does this on wall edits)."""
+        g = self.grid
+        goal_cell = g.nearest_free(g.cell_of(*self.goal))
+        if goal_cell is None or goal_cell != self.goal_cell:
+            self.goal_cell = goal_cell        # goal covered/uncovered: snaps to another cell
+            self.build()
+            return
+        dist, parent = self.dist, self.parent
+        # 1) Cells routed through a now-blocked cell (or cutting its corner) lose their route
+        roots = [i for i in now_blocked if dist[i] < INF]
+        for b in now_blocked:
+            c, r = g.col_row(b)
+            for (dc1, dr1), (dc2, dr2) in (((1, 0), (0, 1)), ((0, 1), (-1, 0)), ((-1, 0), (0, -1)), ((0, -1), (1, 0))):
+                a, e = g.index(c + dc1, r + dr1), g.index(c + dc2, r + dr2)
+                if a is not None and e is not None:
+                    if parent[a] == e: roots.append(a)
+                    if parent[e] == a: roots.append(e)
+        lost = set()
+        if roots:
+            children = {}
+            for i, p in enumerate(parent):
+                if p >= 0: children.setdefault(p, []).append(i)
+            stack = roots
+            while stack:
+                i = stack.pop()
+                if i in lost: continue
+                lost.add(i)
+                stack.extend(children.get(i, ()))
+            for i in lost:
+                dist[i], parent[i] = INF, -1
+        # 2) Re-seed from the still-valid ring around the changed cells and relax
+        heap = []
+        for i in lost | set(now_free):
+            for j, _ in g.neighbours(i, any_state=True):
+                if dist[j] < INF:
+                    heap.append((dist[j], j))
+        self._propagate(heap)
+        self.version += 1
+
+    def distance(self, x, z):
+        i = self.grid.cell_of(x, z)
+        return INF if i is None else self.dist[i]
+
+    def next_point(self, x, z):
+        """Next waypoint toward the goal from (x, z) (the goal itself from the goal cell); None if unreachable."""
+        g = self.grid
+        i = g.cell_of(x, z)
+        if i is None or self.dist[i] == INF:
+            return None
+        p = self.parent[i]
+        return self.goal if p < 0 else g.center(p)
+
+    def next_points(self):
+        """(xs, zs) per cell, for batched lookups (NaN where unreachable)."""
+        g, nan = self.grid, float("nan")
+        xs, zs = [nan] * g.n, [nan] * g.n
+        for i in range(g.n):
+            if self.dist[i] < INF:
+                p = self.parent[i]
+                xs[i], zs[i] = self.goal if p < 0 else g.center(p)
+        return xs, zs
+
+class NavGrid:
+    """
+    cell: grid step. half: agent half-size (AABB). margin: extra clearance so
+    the separable-axis collision step doesn't graze corners along a path.
+    Walls are the game dicts ({"x","z","w","h","id"}); each one adds to a
+    coverage count over its own span, so an edit only touches that region.
+    """
+    def __init__(self, bounds, cell=0.025, half=0.075, margin=0.005):
+        self.bounds = bounds
+        self.cell = float(cell)
+        self.pad = half + margin
+        x0, x1, z0, z1 = bounds
+        self.cols = int(math.floor((x1 - x0) / self.cell)) + 1
+        self.rows = int(math.floor((z1 - z0) / self.cell)) + 1
+        self.n = self.cols * self.rows
+        self.cover = [0] * self.n               # walls covering each cell center
+        self.spans = {}                         # wall id -> (c0, r0, c1, r1, rect)
+        self.rects = SpatialHash(cell=0.25)     # inflated walls (line of sight)
+        self.goals = {}                         # name -> (x, z)
+        self.fields = {}                        # name -> FlowField (built on demand)
+        self.version = 0
+
+    # ----- Cells -----
+    def index(self, c, r):
+        if 0 <= c < self.cols and 0 <= r < self.rows:
+            return r * self.cols + c
+        return None
+
+    def col_row(self, i):
+        return i % self.cols, i // self.cols
+
+    def center(self, i):
+        c, r = self.col_row(i)
+        return self.bounds[0] + c * self.cell, self.bounds[2] + r * self.cell
+
+    def cell_of(self, x, z):
+        c = int(round((x - self.bounds[0]) / self.cell))
+        r = int(round((z - self.bounds[2]) / self.cell))
+        return self.index(min(max(c, 0), self.cols - 1), min(max(r, 0), self.rows - 1))
+
+    def blocked(self, i):
+        return self.cover[i] > 0
+
+    def neighbours(self, i, any_state=False):
+        """(j, cost) reachable from i in one step (any_state: every in-grid neighbour)."""
+        c, r = i % self.cols, i // self.cols
+        cols, rows, cover = self.cols, self.rows, self.cover
+        out = []
+        for dc, dr, cost in _MOVES:
+            nc, nr = c + dc, r + dr
+            if not (0 <= nc < cols and 0 <= nr < rows):
+                continue
+            j = nr * cols + nc
+            if not any_state:
+                if cover[j] or cover[i]:
+                    continue
+                if dc and dr and (cover[r * cols + nc] or cover[nr * cols + c]):
+                    continue
+            out.append((j, cost))
+        return out
+
+    def nearest_free(self, i, max_ring=None):
+        """i if free, else the closest free cell by rings (None if none)."""
+        if i is None:
+            return None
+        if not self.cover[i]:
+            return i
+        c, r = self.col_row(i)
+        best, best_d = None, INF
+        for k in range(1, max_ring or max(self.cols, self.rows)):
+            for dc in range(-k, k + 1):
+                for dr in (-k, k) if abs(dc) != k else range(-k, k + 1):
+                    j = self.index(c + dc, r + dr)
+                    if j is not None and not self.cover[j]:
+                        d = dc * dc + dr * dr
+                        if d < best_d: best, best_d = j, d
+            if best is not None:
+                return best
+        return None
+
+    # ----- Walls (regional updates) -----
+    def _span(self, wall):
+        x0, _, z0, _ = self.bounds
+        hw, hh = wall["w"] * 0.5 + self.pad, wall["h"] * 0.5 + self.pad
+        # Cells whose center is strictly inside the inflated rect
+        c0 = int(math.floor((wall["x"] - hw - x0) / self.cell)) + 1
+        c1 = int(math.ceil((wall["x"] + hw - x0) / self.cell)) - 1
+        r0 = int(math.floor((wall["z"] - hh - z0) / self.cell)) + 1
+        r1 = int(math.ceil((wall["z"] + hh - z0) / self.cell)) - 1
+        return (max(c0, 0), max(r0, 0), min(c1, self.cols - 1), min(r1, self.rows - 1),
+                (wall["x"], wall["z"], hw * 2, hh * 2))
+
+    def _cover(self, span, delta, touched):
+        c0, r0, c1, r1, _ = span
+        cover, cols = self.cover, self.cols
+        for r in range(r0, r1 + 1):
+            base = r * cols
+            for c in range(c0, c1 + 1):
+                i = base + c
+                if i not in touched:
+                    touched[i] = cover[i] > 0     # blocked before the edit
+                cover[i] += delta
+
+    def add_wall(self, wall):
+        self.update_wall(wall)
+
+    def update_wall(self, wall):
+        touched = {}
+        old = self.spans.get(wall["id"])
+        span = self._span(wall)
+        if old is not None:
+            if old == span:
+                return
+            self._cover(old, -1, touched)
+        self._cover(span, 1, touched)
+        self.spans[wall["id"]] = span
+        self.rects.insert(wall["id"], *span[4])
+        self._changed(touched)
+
+    def remove_wall(self, wall):
+        span = self.spans.pop(wall["id"], None)
+        if span is None:
+            return
+        touched = {}
+        self._cover(span, -1, touched)
+        self.rects.remove(wall["id"])
+        self._changed(touched)
+
+    def _changed(self, touched):
+        # Only cells whose blocked state flipped (old and new span overlap cancels out)
+        self.version += 1
+        cover = self.cover
+        now_blocked = [i for i, was in touched.items() if not was and cover[i]]
+        now_free = [i for i, was in touched.items() if was and not cover[i]]
+        if not now_blocked and not now_free:
+            return
+        for field in self.fields.values():
+            field.repair(now_blocked, now_free)
+
+    # ----- Flow fields -----
+    def set_goal(self, name, x, z):
+        """Named goal; its field is built on the first flow(name) and then kept repaired."""
+        if self.goals.get(name) == (x, z):
+            return
+        self.goals[name] = (x, z)
+        self.fields.pop(name, None)
+
+    def flow(self, name):
+        """Shared FlowField toward goal `name` (None if there is no such goal)."""
+        field = self.fields.get(name)
+        if field is None and name in self.goals:
+            field = self.fields[name] = FlowField(self, *self.goals[name])
+        return field
+
+    # ----- A* -----
+    def line_clear(self, x0, z0, x1, z1):
+        """The agent can go straight from (x0, z0) to (x1, z1) (segment vs inflated walls)."""
+        cand = self.rects.query(min(x0, x1), min(z0, z1), max(x0, x1), max(z0, z1))
+        dx, dz = x1 - x0, z1 - z0
+        for k in cand:
+            wx, wz, w, h = self.rects.rects[k]
+            t0, t1 = 0.0, 1.0
+            for p, d, lo, hi in ((x0, dx, wx - w * 0.5, wx + w * 0.5), (z0, dz, wz - h * 0.5, wz + h * 0.5)):
+                if d == 0.0:
+                    if not (lo < p < hi):
+                        t0, t1 = 1.0, 0.0
+                        break
+                    continue
+                a, b = (lo - p) / d, (hi - p) / d
+                if a > b: a, b = b, a
+                t0, t1 = max(t0, a), min(t1, b)
+            if t1 - t0 > 1e-9:
+                return False
+        return True
+
+    def find_path(self, start, goal, smooth=True):
+        """
+        World waypoints from start to goal (start excluded, goal included when
+        reachable, else the closest reachable cell). [] if start is enclosed.
+        """
+        s = self.nearest_free(self.cell_of(*start))
+        t = self.nearest_free(self.cell_of(*goal))
+        if s is None or t is None:
+            return []
+        field = next((f for f in self.fields.values() if f.goal_cell == t), None)
+        if field is not None and field.dist[s] < INF:
+            cells = [s]                        # shared field: just walk the parents
+            while cells[-1] != t:
+                cells.append(field.parent[cells[-1]])
+        else:
+            cells = self._astar(s, t)
+        if not cells:
+            return []
+        pts = [self.center(i) for i in cells[1:]]
+        if cells[-1] == t and self.line_clear(*(pts[-1] if pts else self.center(s)), *goal):
+            pts.append(tuple(goal))            # end on the exact point, not the cell center
+        if smooth:
+            pts = self._smooth(tuple(start), pts)
+        return pts
+
+    def _astar(self, s, t):
+        tc, tr = self.col_row(t)
+        cols = self.cols
+        def h(i):
+            dc, dr = abs(i % cols - tc), abs(i // cols - tr)
+            return (dc + dr) + (SQRT2 - 2.0) * min(dc, dr)   # octile
+        g = {s: 0.0}
+        came = {}
+        best, best_h = s, h(s)
+        heap, seq = [(best_h, 0, s)], 0
+        closed = set()
+        while heap:
+            _, _, i = heapq.heappop(heap)
+            if i == t:
+                best = t
+                break
+            if i in closed:
+                continue
+            closed.add(i)
+            hi = h(i)
+            if hi < best_h: best, best_h = i, hi
+            gi = g[i]
+            for j, cost in self.neighbours(i):
+                ng = gi + cost
+                if ng < g.get(j, INF) - 1e-12:
+                    g[j] = ng
+                    came[j] = i
+                    seq += 1
+                    heapq.heappush(heap, (ng + h(j), seq, j))
+        cells = [best]
+        while cells[-1] != s:
+            cells.append(came[cells[-1]])
+        cells.reverse()
+        return cells
+
+    def _smooth(self, start, pts):
+        # String pulling: skip waypoints while the straight line stays clear
+        out, cur, k = [], start, 0
+        while k < len(pts):
+            j = len(pts) - 1
+            while j > k and not self.line_clear(cur[0], cur[1], pts[j][0], pts[j][1]):
+                j -= 1
+            out.append(pts[j])
+            cur, k = pts[j], j + 1
+        return out
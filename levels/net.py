@@ -0,0 +1,426 @@
+# net.py
+# Multiplayer over TCP (asyncio). The server is the only authority: it runs
+# one MapSim per visitor on a shared map and steps each one exactly once per
+# input it receives. Clients send their key mask every tick, predict their own
+# player with the same MapSim, and get delta snapshots: only the fields that
+# changed since the last snapshot they acked.
+#
+#   frame   : u16 size + u8 kind + payload
+#   C_HELLO : -                S_WELCOME: player id u16, tick rate f64, snapshot rate f64
+#   C_INPUT : seq u32, acked snapshot u32, keys u8 (replay.KEY_ORDER bits), actions u8
+#   S_SNAP  : snapshot u32, base u32 (0 = full), your last input seq u32,
+#             n u16 x (id u16, field mask u8, changed FIELDS), n u16 x removed id u16
+#
+#   python levels/net.py --serve              (server on NET_PORT)
+#   python levels/net.py --demo 32            (server + 32 bots over localhost)
+import asyncio, struct, time, math, random
+from collections import deque
+from replay import KEY_ORDER, keys_mask
+from sim import make_default_sim, PLAYER_SCALE, PLAYER_SCALE_JUMP
+
+NET_PORT = 47800
+C_HELLO, C_INPUT, S_WELCOME, S_SNAP = range(4)
+A_RESTORE_ENERGY = 1          # input action bits (applied before that tick's step)
+
+_FRAME   = struct.Struct("<HB")
+_WELCOME = struct.Struct("<Hdd")
+_INPUT   = struct.Struct("<IIBB")
+_SNAP    = struct.Struct("<III")
+_EHEAD   = struct.Struct("<HB")
+_U16     = struct.Struct("<H")
+
+# Entity = (x, z, facing, energy, walk_accum, flags), as sent. x/z stay f64:
+# players rest exactly on wall faces (snap or sweep) and collision only
+# tolerates 1e-9 there, so a rounded position would re-simulate differently.
+FIELDS = ("x", "z", "facing", "energy", "walk", "flags")
+_FIELD = [struct.Struct(f) for f in ("<d", "<d", "<b", "<B", "<f", "<B")]
+_ENTITY = struct.Struct("<ddbBfB")
+F_MOVING, F_JUMP, F_CUPOLA, F_SLEEP = 1, 2, 4, 8
+
+def entity_of(sim):
+    """MapSim -> entity tuple, rounded to what goes on the wire."""
+    t = sim.triggers
+    flags = ((F_MOVING if sim.moving else 0) | (F_JUMP if sim.scale == PLAYER_SCALE_JUMP else 0)
+             | (F_CUPOLA if t.is_inside("cupola") else 0) | (F_SLEEP if t.is_inside("sleep") else 0))
+    x, z, facing, energy, walk, _ = sim.get_state()
+    return _ENTITY.unpack(_ENTITY.pack(x, z, facing, energy, walk, flags))
+
+def state_of(entity):
+    """Entity -> MapSim.set_state() tuple."""
+    x, z, facing, energy, walk, flags = entity
+    return (x, z, facing, energy, walk, PLAYER_SCALE_JUMP if flags & F_JUMP else PLAYER_SCALE)
+
+def encode_delta(base, cur):
+    """Snapshot body: entities of `cur` ({id: entity}) that differ from `base`, plus removed ids."""
+    out, n = [], 0
+    for pid, ent in cur.items():
+        old = base.get(pid)
+        mask = 0
+        for i, v in enumerate(ent):
+            if old is None or old[i] != v:
+                mask |= 1 << i
+        if mask:
+            n += 1
+            out.append(_EHEAD.pack(pid, mask))
+            out.extend(_FIELD[i].pack(v) for i, v in enumerate(ent) if mask >> i & 1)
+    removed = [pid for pid in base if pid not in cur]
+    return (_U16.pack(n) + b"".join(out)
+            + _U16.pack(len(removed)) + b"".join(_U16.pack(pid) for pid in removed))
+
+def decode_delta(base, data, offset=0):
+    """Inverse of encode_delta: the full {id: entity} the sender had."""
+    cur = dict(base)
+    (n,) = _U16.unpack_from(data, offset); offset += _U16.size
+    for _ in range(n):
+        pid, mask = _EHEAD.unpack_from(data, offset); offset += _EHEAD.size
+        ent = list(cur.get(pid, (0.0, 0.0, 1, 0, 0.0, 0)))
+        for i, f in enumerate(_FIELD):
+            if mask >> i & 1:
+                (ent[i],) = f.unpack_from(data, offset); offset += f.size
+        cur[pid] = tuple(ent)
+    (n,) = _U16.unpack_from(data, offset); offset += _U16.size
+    for _ in range(n):
+        (pid,) = _U16.unpack_from(data, offset); offset += _U16.size
+        cur.pop(pid, None)
+    return cur
+
+def _keys(mask):
+    return {k: bool(mask >> i & 1) for i, k in enumerate(KEY_ORDER)}
+
+def _apply(sim, mask, actions, dt, triggers=True):
+    # Same code on both ends, so the prediction replays exactly what the server ran
+    if actions & A_RESTORE_ENERGY:
+        sim.restore_energy()
+    return sim.step(_keys(mask), dt, triggers)
+
+def _send(writer, kind, payload=b""):
+    writer.write(_FRAME.pack(len(payload), kind) + payload)
+
+async def _receive(reader):
+    size, kind = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    return kind, await reader.readexactly(size)
+
+# ============ Server ============
+class _Peer:
+    __slots__ = ("id", "sim", "writer", "inputs", "queued", "last_seq", "acked")
+    def __init__(self, pid, sim, writer, max_queue):
+        self.id, self.sim, self.writer = pid, sim, writer
+        self.inputs = deque(maxlen=max_queue)   # (seq, keys, actions) not run yet
+        self.queued = self.last_seq = 0
+        self.acked = 0                          # last snapshot the client has (delta base)
+
+class GameServer:
+    """
+    Authoritative map server. tick_rate must match the clients' fixed tick
+    (Game FIXED_TICK_RATE). A player may use up to `max_inputs` queued inputs
+    per tick (catch-up after jitter); a client with a full send buffer skips
+    snapshots instead of queueing them (the next delta covers the gap).
+    """
+    def __init__(self, host="127.0.0.1", port=NET_PORT, tick_rate=60.0, snapshot_rate=20.0,
+                 max_players=64, max_inputs=3, history=64, max_buffer=64 * 1024):
+        self.host, self.port = host, port
+        self.tick_rate, self.snapshot_rate = float(tick_rate), float(snapshot_rate)
+        self.dt = 1.0 / self.tick_rate
+        self.max_players, self.max_inputs = max_players, max_inputs
+        self.history, self.max_buffer = history, max_buffer
+        self.world = make_default_sim()     # owns the map; every player's sim shares it
+        self.peers = {}
+        self.snaps = {0: {}}                # snapshot id -> {id: entity} (delta bases)
+        self.snap_id = 0
+        self.ticks = 0
+        self._next_id = 0
+        self.server = self._task = None
+        self._handlers = set()
+        self.stats = {"snapshots": 0, "bytes": 0, "full_bytes": 0, "skipped": 0, "tick_s": 0.0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._task = asyncio.ensure_future(self._run())
+        print(f"[NET] server on {self.host}:{self.port} ({self.tick_rate:g} ticks/s, "
+              f"{self.snapshot_rate:g} snapshots/s)")
+        return self
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.server:
+            self.server.close()
+        for peer in list(self.peers.values()):
+            peer.writer.close()             # the handler sees EOF and cleans up
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=1.0)
+        if self.server:
+            await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        if len(self.peers) >= self.max_players:
+            writer.close()
+            return
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await self._session(reader, writer)
+        finally:
+            self._handlers.discard(task)
+
+    async def _session(self, reader, writer):
+        try:
+            kind, _ = await _receive(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        if kind != C_HELLO:
+            writer.close()
+            return
+        self._next_id = self._next_id % 0xFFFF + 1
+        peer = _Peer(self._next_id, make_default_sim(world=self.world), writer, int(self.tick_rate * 2))
+        self.peers[peer.id] = peer
+        _send(writer, S_WELCOME, _WELCOME.pack(peer.id, self.tick_rate, self.snapshot_rate))
+        try:
+            while True:
+                kind, payload = await _receive(reader)
+                if kind == C_INPUT:
+                    seq, ack, mask, actions = _INPUT.unpack(payload)
+                    if seq > peer.queued:
+                        peer.inputs.append((seq, mask, actions))
+                        peer.queued = seq
+                    if ack > peer.acked and ack in self.snaps:
+                        peer.acked = ack
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.peers.pop(peer.id, None)
+            writer.close()
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        every = max(1, int(round(self.tick_rate / self.snapshot_rate)))
+        next_t = loop.time()
+        while True:
+            t0 = time.perf_counter()
+            self.tick()
+            if self.ticks % every == 0:
+                self.broadcast()
+            self.stats["tick_s"] += time.perf_counter() - t0
+            next_t += self.dt
+            await asyncio.sleep(max(0.0, next_t - loop.time()))
+
+    def tick(self):
+        """One server tick: every player runs its queued inputs, in order."""
+        for peer in self.peers.values():
+            for _ in range(min(len(peer.inputs), self.max_inputs)):
+                seq, mask, actions = peer.inputs.popleft()
+                _apply(peer.sim, mask, actions, self.dt)
+                peer.last_seq = seq
+        self.ticks += 1
+
+    def broadcast(self):
+        self.snap_id += 1
+        cur = {}
+        for pid, peer in self.peers.items():
+            # The server continues from the wire values too, so a client that
+            # restores this snapshot and re-runs its inputs lands on the same spot
+            cur[pid] = ent = entity_of(peer.sim)
+            peer.sim.set_state(state_of(ent))
+        self.snaps[self.snap_id] = cur
+        self.snaps.pop(self.snap_id - self.history, None)
+        bodies = {}                         # base -> body (peers on the same base share it)
+        for peer in self.peers.values():
+            if peer.writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.stats["skipped"] += 1
+                continue
+            base = peer.acked if peer.acked in self.snaps else 0
+            body = bodies.get(base)
+            if body is None:
+                body = bodies[base] = encode_delta(self.snaps[base], cur)
+            _send(peer.writer, S_SNAP, _SNAP.pack(self.snap_id, base, peer.last_seq) + body)
+            self.stats["snapshots"] += 1
+            self.stats["bytes"] += _FRAME.size + _SNAP.size + len(body)
+        if self.peers:
+            full = bodies.get(0)
+            self.stats["full_bytes"] += len(self.peers) * (
+                _FRAME.size + _SNAP.size + len(full if full is not None else encode_delta({}, cur)))
+
+# ============ Client ============
+class GameClient:
+    """
+    Connection to a GameServer. `sim` is the local player's MapSim (built like
+    the server's: level_map walls and triggers) and is predicted: step() runs
+    the input right away and sends it; each snapshot resets the player to the
+    server state and re-runs the inputs the server hasn't processed yet.
+    Other players are in `players` ({id: entity}, latest snapshot).
+    """
+    def __init__(self, sim, host="127.0.0.1", port=NET_PORT):
+        self.sim, self.host, self.port = sim, host, port
+        self.reader = self.writer = self.loop = None
+        self.id, self.tick_rate, self.snapshot_rate, self.dt = None, 0.0, 0.0, 0.0
+        self.connected = False
+        self.seq = self.acked = 0
+        self.actions = 0
+        self.pending = deque()          # (seq, keys, actions) sent, not yet in a snapshot
+        self.snaps = {0: {}}            # received snapshots (bases the server may use)
+        self.players, self.prev_players = {}, {}
+        self.snap_time = 0.0
+        self.corrections, self.max_error = 0, 0.0
+        self._task = None
+
+    async def connect(self, timeout=3.0):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout)
+        _send(self.writer, C_HELLO)
+        kind, payload = await asyncio.wait_for(_receive(self.reader), timeout)
+        if kind != S_WELCOME:
+            raise ConnectionError("unexpected server reply")
+        self.id, self.tick_rate, self.snapshot_rate = _WELCOME.unpack(payload)
+        self.dt = 1.0 / self.tick_rate
+        self.connected = True
+        self._task = asyncio.ensure_future(self._read_loop())
+        return self
+
+    def close(self):
+        self.connected = False
+        if self._task:
+            self._task.cancel()
+        if self.writer:
+            self.writer.close()
+
+    def poll(self):
+        """Run the client's own event loop once without blocking (Game calls this every frame)."""
+        if self.loop is not None and not self.loop.is_running():
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                kind, payload = await _receive(self.reader)
+                if kind == S_SNAP:
+                    self._on_snapshot(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print("[NET] disconnected")
+        self.connected = False
+
+    # ----- Local player -----
+    def restore_energy(self):
+        """Sleep: applied locally now and on the server with the next input."""
+        self.actions |= A_RESTORE_ENERGY
+
+    def step(self, pressed):
+        """One fixed tick of the local player (prediction). Returns MapSim events."""
+        if not self.connected:
+            return self.sim.step(pressed, self.dt)
+        self.seq += 1
+        mask, actions, self.actions = keys_mask(pressed), self.actions, 0
+        _send(self.writer, C_INPUT, _INPUT.pack(self.seq, self.acked, mask, actions))
+        self.pending.append((self.seq, mask, actions))
+        return _apply(self.sim, mask, actions, self.dt)
+
+    def _on_snapshot(self, payload):
+        snap, base, last_seq = _SNAP.unpack_from(payload)
+        if snap <= self.acked or base not in self.snaps:
+            return
+        state = decode_delta(self.snaps[base], payload, _SNAP.size)
+        self.snaps[snap] = state
+        for old in [k for k in self.snaps if 0 < k < base]:
+            del self.snaps[old]
+        self.acked = snap
+        self.prev_players = self.players
+        self.players = {pid: e for pid, e in state.items() if pid != self.id}
+        self.snap_time = time.perf_counter()
+        own = state.get(self.id)
+        if own is not None:
+            self._reconcile(own, last_seq)
+
+    def _reconcile(self, own, last_seq):
+        while self.pending and self.pending[0][0] <= last_seq:
+            self.pending.popleft()
+        s = self.sim
+        before, prev, moving = (s.x, s.z), (s.prev_x, s.prev_z), s.moving
+        s.set_state(state_of(own))
+        for _, mask, actions in self.pending:
+            _apply(s, mask, actions, self.dt, triggers=False)   # edges were already predicted
+        s.prev_x, s.prev_z = prev
+        if not self.pending:
+            s.moving = moving
+        err = math.hypot(s.x - before[0], s.z - before[1])
+        if err > 1e-4:
+            self.corrections += 1
+            self.max_error = max(self.max_error, err)
+
+    # ----- Other players -----
+    def remote(self):
+        """{id: (x, z, facing, flags)} interpolated between the last two snapshots."""
+        t = min(1.0, (time.perf_counter() - self.snap_time) * self.snapshot_rate)
+        out = {}
+        for pid, (x, z, facing, _, _, flags) in self.players.items():
+            p = self.prev_players.get(pid)
+            if p is not None:
+                x, z = p[0] + (x - p[0]) * t, p[1] + (z - p[1]) * t
+            out[pid] = (x, z, facing, flags)
+        return out
+
+def connect(sim, address, timeout=3.0):
+    """Blocking connect for non-async callers: "host:port" -> GameClient driven by poll()."""
+    host, _, port = address.rpartition(":")
+    client = GameClient(sim, host or "127.0.0.1", int(port or NET_PORT))
+    client.loop = asyncio.new_event_loop()
+    try:
+        client.loop.run_until_complete(client.connect(timeout))
+    except BaseException:
+        client.loop.close()
+        raise
+    return client
+
+# ============ Localhost demo ============
+async def _demo(n, seconds, tick_rate, snapshot_rate, seed):
+    server = await GameServer(port=0, tick_rate=tick_rate, snapshot_rate=snapshot_rate,
+                              max_players=max(64, n)).start()
+    bots = [await GameClient(make_default_sim(), port=server.port).connect() for _ in range(n)]
+    rng = random.Random(seed)
+    loop = asyncio.get_event_loop()
+    dt, next_t, keys = 1.0 / tick_rate, loop.time(), [{} for _ in bots]
+    for tick in range(int(seconds * tick_rate)):
+        for i, bot in enumerate(bots):
+            if tick % 20 == 0:              # new random heading every 1/3 s
+                keys[i] = {k: rng.random() < 0.3 for k in ("w", "a", "s", "d")}
+            bot.step(keys[i])
+        next_t += dt
+        await asyncio.sleep(max(0.0, next_t - loop.time()))
+    await asyncio.sleep(0.5)                # let the last inputs and snapshots land
+    # Prediction check: every local player ends where the server has it
+    drift = max(math.hypot(b.sim.x - server.peers[b.id].sim.x, b.sim.z - server.peers[b.id].sim.z)
+                for b in bots)
+    st = server.stats
+    k = max(1, st["snapshots"])
+    print(f"[NET] {n} players, {server.ticks} ticks, server tick {st['tick_s'] / max(1, server.ticks) * 1e3:.3f} ms")
+    print(f"[NET] snapshot avg {st['bytes'] / k:.0f} B (full {st['full_bytes'] / k:.0f} B), "
+          f"{st['bytes'] / max(1, n) / seconds / 1024:.1f} KiB/s per client, skipped {st['skipped']}")
+    print(f"[NET] prediction corrections {sum(b.corrections for b in bots)} "
+          f"(max {max(b.max_error for b in bots):.4f}), final drift {drift:.6f}")
+    for b in bots:
+        b.close()
+    await server.stop()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="ISS map multiplayer server / localhost demo")
+    ap.add_argument("--serve", action="store_true", help="run a server until Ctrl+C")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=NET_PORT)
+    ap.add_argument("--demo", type=int, default=8, metavar="N", help="bots for the localhost demo")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--tick", type=float, default=60.0, help="ticks/s (= Game FIXED_TICK_RATE)")
+    ap.add_argument("--snapshot", type=float, default=20.0, help="snapshots/s")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    if args.serve:
+        async def serve():
+            await GameServer(args.host, args.port, args.tick, args.snapshot).start()
+            await asyncio.Event().wait()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_demo(args.demo, args.seconds, args.tick, args.snapshot, args.seed))
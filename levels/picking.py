@@ -0,0 +1,186 @@
+# picking.py
+# Ray picking for the Cupola scene without a CollisionTraverser:
+#  - markers: one vectorized ray-vs-sphere test over all of them (NumPy if available)
+#  - subparts: bounding-volume hierarchy of AABBs (model space), then the
+#    part's oriented box (scene_opt.proxy_box) if it has one
+# Results are cached until the mouse, camera or model moves.
+import math
+try:
+    import numpy
+except ImportError:   # optional: falls back to a plain loop
+    numpy = None
+
+INF = float("inf")
+
+def ray_aabb(o, inv, bmin, bmax, t_max=INF):
+    """Slab test; returns entry t (>= 0) or None."""
+    t0, t1 = 0.0, t_max
+    for a in range(3):
+        if inv[a] == INF or inv[a] == -INF:
+            if o[a] < bmin[a] or o[a] > bmax[a]:
+                return None
+            continue
+        ta = (bmin[a] - o[a]) * inv[a]
+        tb = (bmax[a] - o[a]) * inv[a]
+        if ta > tb: ta, tb = tb, ta
+        if ta > t0: t0 = ta
+        if tb < t1: t1 = tb
+        if t0 > t1:
+            return None
+    return t0
+
+def ray_obb(o, d, box, t_max=INF):
+    """Ray vs oriented box {"center", "axes", "half"}; entry t (>= 0) or None."""
+    c, axes = box["center"], box["axes"]
+    r = (o[0] - c[0], o[1] - c[1], o[2] - c[2])
+    lo = tuple(r[0] * a[0] + r[1] * a[1] + r[2] * a[2] for a in axes)      # ray in the box frame
+    ld = tuple(d[0] * a[0] + d[1] * a[1] + d[2] * a[2] for a in axes)      # (orthonormal: same t)
+    inv = tuple((1.0 / v) if v != 0 else INF for v in ld)
+    half = box["half"]
+    return ray_aabb(lo, inv, (-half[0], -half[1], -half[2]), half, t_max)
+
+class _BVHNode:
+    __slots__ = ("bmin", "bmax", "left", "right", "items")
+    def __init__(self, bmin, bmax, left=None, right=None, items=None):
+        self.bmin, self.bmax, self.left, self.right, self.items = bmin, bmax, left, right, items
+
+def _merge(boxes):
+    return (tuple(min(b[0][a] for b in boxes) for a in range(3)),
+            tuple(max(b[1][a] for b in boxes) for a in range(3)))
+
+def build_bvh(items, leaf_size=4):
+    """items: [(bmin, bmax, payload, obb or None)] -> root node (median split on the longest axis)."""
+    if not items:
+        return None
+    bmin, bmax = _merge(items)
+    if len(items) <= leaf_size:
+        return _BVHNode(bmin, bmax, items=list(items))
+    axis = max(range(3), key=lambda a: bmax[a] - bmin[a])
+    items = sorted(items, key=lambda it: it[0][axis] + it[1][axis])
+    mid = len(items) // 2
+    return _BVHNode(bmin, bmax, build_bvh(items[:mid], leaf_size), build_bvh(items[mid:], leaf_size))
+
+def bvh_raycast(root, o, d):
+    """Nearest (t, payload) along the ray, or (INF, None)."""
+    inv = tuple((1.0 / c) if c != 0 else INF for c in d)
+    best_t, best = INF, None
+    stack = [root] if root else []
+    while stack:
+        node = stack.pop()
+        if ray_aabb(o, inv, node.bmin, node.bmax, best_t) is None:
+            continue
+        if node.items is not None:
+            for bmin, bmax, payload, obb in node.items:
+                t = ray_aabb(o, inv, bmin, bmax, best_t)
+                if t is not None and obb is not None:
+                    t = ray_obb(o, d, obb, best_t)
+                if t is not None and t < best_t:
+                    best_t, best = t, payload
+        else:
+            stack.append(node.left); stack.append(node.right)
+    return best_t, best
+
+class SpherePicker:
+    """All markers as arrays: centers (N,3), radii (N,)."""
+    def __init__(self):
+        self.centers, self.radii, self.payloads = [], [], []
+        self._c = self._r2 = None
+
+    def add(self, center, radius, payload):
+        self.centers.append(tuple(center)); self.radii.append(float(radius))
+        self.payloads.append(payload)
+        self._c = None
+
+    def __len__(self): return len(self.payloads)
+
+    def raycast(self, o, d):
+        if not self.payloads:
+            return INF, None
+        if numpy is None:
+            best_t, best = INF, None
+            for (cx, cy, cz), r, p in zip(self.centers, self.radii, self.payloads):
+                ox, oy, oz = cx - o[0], cy - o[1], cz - o[2]
+                tca = ox * d[0] + oy * d[1] + oz * d[2]
+                h = r * r - (ox * ox + oy * oy + oz * oz - tca * tca)
+                if h < 0: continue
+                h = math.sqrt(h)
+                t = tca - h if tca - h >= 0 else tca + h
+                if 0 <= t < best_t:
+                    best_t, best = t, p
+            return best_t, best
+        if self._c is None:
+            self._c = numpy.asarray(self.centers, dtype=numpy.float64)
+            self._r2 = numpy.asarray(self.radii, dtype=numpy.float64) ** 2
+        oc = self._c - numpy.asarray(o, dtype=numpy.float64)
+        tca = oc @ numpy.asarray(d, dtype=numpy.float64)
+        h = self._r2 - (numpy.einsum("ij,ij->i", oc, oc) - tca * tca)
+        hit = h >= 0
+        if not hit.any():
+            return INF, None
+        sq = numpy.sqrt(numpy.where(hit, h, 0.0))
+        t = numpy.where(tca - sq >= 0, tca - sq, tca + sq)
+        t = numpy.where(hit & (t >= 0), t, INF)
+        i = int(numpy.argmin(t))
+        return (float(t[i]), self.payloads[i]) if t[i] < INF else (INF, None)
+
+class Picker:
+    """
+    Markers live in `marker_space` (cupola_root), subparts in `part_space`
+    (the model) so model edits (keys R/T/Y/U..., +/-) need no rebuild.
+    pick() returns a payload (NodePath) or None.
+    """
+    def __init__(self, camera, camnode, marker_space, part_space):
+        self.camera, self.camnode = camera, camnode
+        self.marker_space, self.part_space = marker_space, part_space
+        self.spheres = SpherePicker()
+        self.parts = []
+        self.bvh = None
+        self._key = None
+        self._hit = None
+        self.queries = self.cache_hits = 0
+
+    def add_marker(self, nodepath, radius):
+        self.spheres.add(nodepath.getPos(self.marker_space), radius, nodepath)
+        self._key = None
+
+    def add_part(self, nodepath, bmin, bmax, obb=None):
+        """bmin/bmax: AABB in part_space; obb: tighter oriented box there (scene_opt.proxy_box)."""
+        self.parts.append((tuple(bmin), tuple(bmax), nodepath, obb))
+        self.bvh = None; self._key = None
+
+    def _ray(self, space, near, far):
+        o = space.getRelativePoint(self.camera, near)
+        f = space.getRelativePoint(self.camera, far)
+        d = f - o
+        n = d.length()
+        return (o.x, o.y, o.z), (d.x / n, d.y / n, d.z / n), n
+
+    def pick(self, mx, my):
+        key = (mx, my,
+               tuple(self.camera.getMat(self.marker_space).getRow(3)) + tuple(self.camera.getQuat(self.marker_space)),
+               tuple(self.part_space.getMat(self.marker_space).getRow(3)) + tuple(self.part_space.getQuat(self.marker_space))
+               + tuple(self.part_space.getScale(self.marker_space)))
+        self.queries += 1
+        if key == self._key:
+            self.cache_hits += 1
+            return self._hit
+        from panda3d.core import Point2, Point3
+        near, far = Point3(), Point3()
+        if not self.camnode.getLens().extrude(Point2(mx, my), near, far):
+            self._key, self._hit = key, None
+            return None
+
+        # Compare hits in world units along the same segment (fraction of near->far)
+        best_f, best = INF, None
+        if len(self.spheres):
+            o, d, n = self._ray(self.marker_space, near, far)
+            t, p = self.spheres.raycast(o, d)
+            if p is not None: best_f, best = t / n, p
+        if self.parts:
+            if self.bvh is None:
+                self.bvh = build_bvh(self.parts)
+            o, d, n = self._ray(self.part_space, near, far)
+            t, p = bvh_raycast(self.bvh, o, d)
+            if p is not None and t / n < best_f: best_f, best = t / n, p
+        self._key, self._hit = key, best
+        return best
@@ -0,0 +1,159 @@
+# profiling.py
+# Named timing scopes for the hot paths. Each scope is also a PStats
+# collector ("Game:<name>"), so `pstats` shows them next to Panda3D's own.
+# Disabled scopes cost one attribute check (shared no-op context).
+import os, json, time
+from collections import deque
+try:
+    from panda3d.core import PStatCollector, PStatClient
+except ImportError:   # headless sim/tools without Panda3D
+    PStatCollector = PStatClient = None
+
+class _NullScope:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullScope()
+
+class _Scope:
+    __slots__ = ("name", "collector", "total", "calls", "frame", "frame_calls", "history", "_t0s")
+    def __init__(self, name, window):
+        self.name = name
+        self.collector = PStatCollector("Game:" + name) if PStatCollector else None
+        self.total, self.calls = 0.0, 0          # since start (seconds, count)
+        self.frame, self.frame_calls = 0.0, 0    # current frame
+        self.history = deque(maxlen=window)      # seconds per frame
+        self._t0s = []                           # start times of open (nested) entries
+
+    def __enter__(self):
+        if not self._t0s and self.collector is not None: self.collector.start()
+        self._t0s.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        # Re-entry (recursion, nested same-name scopes) counts each call but only
+        # the outermost span's time, so the inner time is not added twice.
+        dt = time.perf_counter() - self._t0s.pop()
+        if not self._t0s:
+            if self.collector is not None: self.collector.stop()
+            self.frame += dt
+        self.frame_calls += 1
+        return False
+
+class Profiler:
+    """
+    with profiler.scope("map2d:collision"): ...
+    end_frame() once per frame rolls the per-frame totals into a window
+    (overlay: avg/max ms) and every `export_every` frames appends one row
+    per scope to a CSV or JSONL file (by extension), rotated to <file>.1
+    after `export_max_rows` rows.
+    """
+    FIELDS = ("time", "frame", "scope", "avg_ms", "max_ms", "calls")
+
+    def __init__(self, window=120):
+        self.enabled = False
+        self.window = window
+        self.scopes = {}
+        self.frames = 0
+        self.export_path, self.export_every, self.export_max_rows = "", 60, 100000
+        self._rows = 0
+        self._file = None
+
+    def configure(self, enabled=None, window=None, export_path=None, export_every=None,
+                  export_max_rows=None, pstats=False):
+        if window is not None and window != self.window:
+            self.window = window
+            for s in self.scopes.values():
+                s.history = deque(s.history, maxlen=window)
+        if export_path is not None and export_path != self.export_path:
+            self.close()
+            self.export_path = export_path
+        if export_every is not None: self.export_every = max(1, int(export_every))
+        if export_max_rows is not None: self.export_max_rows = export_max_rows
+        if enabled is not None: self.enabled = enabled
+        if pstats and PStatClient is not None and not PStatClient.isConnected():
+            if not PStatClient.connect():
+                print("[WARN] Could not connect to the PStats server")
+
+    def scope(self, name):
+        if not self.enabled:
+            return _NULL
+        s = self.scopes.get(name)
+        if s is None:
+            s = self.scopes[name] = _Scope(name, self.window)
+        return s
+
+    # ----- Per frame -----
+    def end_frame(self):
+        if not self.enabled:
+            return
+        for s in self.scopes.values():
+            s.history.append(s.frame)
+            s.total += s.frame; s.calls += s.frame_calls
+            s.frame, s.frame_calls = 0.0, 0
+        self.frames += 1
+        if self.export_path and self.frames % self.export_every == 0:
+            self._export()
+
+    def stats(self):
+        """{name: (avg_ms, max_ms)} over the window."""
+        out = {}
+        for name, s in self.scopes.items():
+            if s.history:
+                out[name] = (1000.0 * sum(s.history) / len(s.history), 1000.0 * max(s.history))
+        return out
+
+    def totals(self):
+        """{name: (seconds, calls)} since start (completed frames only)."""
+        return {name: (s.total, s.calls) for name, s in self.scopes.items()}
+
+    def overlay_text(self):
+        rows = sorted(self.stats().items())
+        lines = [f"{'scope':<18}{'avg':>8}{'max':>8}  ms"]
+        lines += [f"{name:<18}{avg:8.3f}{mx:8.3f}" for name, (avg, mx) in rows]
+        return "\n".join(lines)
+
+    # ----- Export -----
+    def _open(self):
+        jsonl = self.export_path.endswith((".jsonl", ".json"))
+        new = not os.path.exists(self.export_path) or os.path.getsize(self.export_path) == 0
+        self._rows = 0
+        if not new:
+            # Appending to an earlier session's file: its rows count towards the cap
+            with open(self.export_path, "rb") as f:
+                self._rows = sum(1 for _ in f) - (0 if jsonl else 1)
+        self._file = open(self.export_path, "a", encoding="utf-8", newline="")
+        if new and not jsonl:
+            self._file.write(",".join(self.FIELDS) + "\n")
+
+    def _export(self):
+        try:
+            if self._file is None:
+                self._open()
+            if self._rows >= self.export_max_rows:
+                self.close()
+                os.replace(self.export_path, self.export_path + ".1")
+                self._open()
+            jsonl = self.export_path.endswith((".jsonl", ".json"))
+            now = round(time.time(), 3)
+            for name, (avg, mx) in sorted(self.stats().items()):
+                s = self.scopes[name]
+                row = (now, self.frames, name, round(avg, 4), round(mx, 4), s.calls)
+                if jsonl:
+                    self._file.write(json.dumps(dict(zip(self.FIELDS, row))) + "\n")
+                else:
+                    self._file.write(",".join(str(v) for v in row) + "\n")
+                self._rows += 1
+            self._file.flush()
+        except OSError as e:
+            print(f"[WARN] Profile export disabled ({self.export_path}): {e}")
+            self.export_path = ""
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+profiler = Profiler()
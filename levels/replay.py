@@ -0,0 +1,159 @@
+# replay.py
+# Input sessions: a compact binary log of everything that feeds the logic
+# ticks (key state, dialog answers, Cupola camera/clicks), plus checkpoints
+# of the simulation so a replay can prove it reproduced the same run.
+#
+#   header : magic "ISSR", version, tick rate, start x/z, start energy
+#   record : tick (u32) + kind (u8) + payload; keys only when they change
+import struct
+
+MAGIC, VERSION = b"ISSR", 2
+_HEADER = struct.Struct("<4sBdddB")
+_REC = struct.Struct("<IB")
+
+KEY_ORDER = ("w", "a", "s", "d", "space")
+# Dialog/scene actions: Game method names, stored as an index
+ACTIONS = ("_on_cupola_yes", "_on_cupola_no", "_on_sleep_yes", "_on_sleep_no", "exit_cupola")
+
+R_KEYS, R_ACTION, R_POSE, R_CLICK, R_EVENT, R_CHECK, R_END = range(7)
+_PAYLOAD = {
+    R_KEYS:   struct.Struct("<B"),        # bit i = KEY_ORDER[i]
+    R_ACTION: struct.Struct("<B"),        # ACTIONS index
+    R_POSE:   struct.Struct("<6d"),       # orbit radius, yaw, pitch, target x/y/z (as the sim has them)
+    R_CLICK:  struct.Struct("<2f"),       # mouse x, y (-1..1)
+    R_CHECK:  struct.Struct("<ddB"),      # sim x, z, energy
+    R_END:    struct.Struct("<B"),
+}
+
+def keys_mask(pressed):
+    mask = 0
+    for i, k in enumerate(KEY_ORDER):
+        if pressed.get(k): mask |= 1 << i
+    return mask
+
+def _pack_event(kind, arg):
+    # (kind, arg) from MapSim.step: arg is a trigger name or an energy level
+    k = kind.encode(); a = str(arg).encode()
+    return struct.pack("<B", len(k)) + k + struct.pack("<B", len(a)) + a
+
+class InputRecorder:
+    """Appends records as they happen (flushed on close)."""
+    def __init__(self, path, tick_rate, start_pos, start_energy):
+        self.path = path
+        self.f = open(path, "wb")
+        self.f.write(_HEADER.pack(MAGIC, VERSION, tick_rate, start_pos[0], start_pos[1], start_energy))
+        self.mask = 0
+        self.pose = None
+
+    def _rec(self, tick, kind, payload):
+        self.f.write(_REC.pack(tick, kind) + payload)
+
+    def keys(self, tick, pressed):
+        mask = keys_mask(pressed)
+        if mask != self.mask:
+            self.mask = mask
+            self._rec(tick, R_KEYS, _PAYLOAD[R_KEYS].pack(mask))
+
+    def action(self, tick, name):
+        self._rec(tick, R_ACTION, _PAYLOAD[R_ACTION].pack(ACTIONS.index(name)))
+
+    def camera(self, tick, pose):
+        if pose != self.pose:
+            self.pose = pose
+            self._rec(tick, R_POSE, _PAYLOAD[R_POSE].pack(*pose))
+
+    def click(self, tick, mx, my):
+        self._rec(tick, R_CLICK, _PAYLOAD[R_CLICK].pack(mx, my))
+
+    def events(self, tick, events):
+        for kind, arg in events:
+            self._rec(tick, R_EVENT, _pack_event(kind, arg))
+
+    def check(self, tick, x, z, energy):
+        self._rec(tick, R_CHECK, _PAYLOAD[R_CHECK].pack(x, z, energy))
+
+    def close(self, tick, x, z, energy):
+        """`tick` = ticks run so far; the final state is checked at the end of the replay."""
+        if self.f is None:
+            return
+        self.check(tick, x, z, energy)
+        self._rec(tick, R_END, _PAYLOAD[R_END].pack(0))
+        self.f.close(); self.f = None
+
+class InputReplay:
+    """
+    Loads a session. inputs_at(tick) -> records to apply before that tick;
+    verify_*() compare the replayed run against the recorded events and
+    checkpoints (exact float equality: same inputs + same dt = same run).
+    A malformed file raises ValueError (like OSError, the caller's to report).
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ValueError(f"empty or truncated session file: {path}")
+        magic, version, self.tick_rate, sx, sz, self.start_energy = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a session file (v{VERSION}): {path}")
+        self.start_pos = (sx, sz)
+        self.inputs, self.expect_events, self.expect_checks = {}, {}, {}
+        self.end_tick = 0
+        try:
+            self._parse(data, _HEADER.size)
+        except (KeyError, IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"corrupt session file: {path} ({e!r})") from None
+        self.mismatches = []
+        self.events_checked = self.checks_passed = 0
+
+    def _parse(self, data, off):
+        while off < len(data):
+            tick, kind = _REC.unpack_from(data, off); off += _REC.size
+            if kind == R_EVENT:
+                n = data[off]; k = data[off + 1:off + 1 + n].decode(); off += 1 + n
+                n = data[off]; a = data[off + 1:off + 1 + n].decode(); off += 1 + n
+                if off > len(data):
+                    raise IndexError("event record cut short")
+                self.expect_events.setdefault(tick, []).append((k, a))
+                continue
+            st = _PAYLOAD[kind]
+            vals = st.unpack_from(data, off); off += st.size
+            if kind == R_ACTION and vals[0] >= len(ACTIONS):
+                raise IndexError(f"unknown action {vals[0]}")
+            if kind == R_CHECK:
+                self.expect_checks[tick] = vals
+            elif kind == R_END:
+                self.end_tick = tick
+            else:
+                self.inputs.setdefault(tick, []).append((kind, vals))
+            self.end_tick = max(self.end_tick, tick)
+
+    def inputs_at(self, tick):
+        return self.inputs.get(tick, ())
+
+    def done(self, tick):
+        return tick >= self.end_tick
+
+    def verify_events(self, tick, events):
+        got = [(k, str(a)) for k, a in events]
+        want = self.expect_events.get(tick, [])
+        if got != want:
+            self.mismatches.append((tick, "events", want, got))
+        self.events_checked += len(want)
+
+    def verify_check(self, tick, x, z, energy):
+        want = self.expect_checks.get(tick)
+        if want is None:
+            return
+        if want != (x, z, energy):
+            self.mismatches.append((tick, "state", want, (x, z, energy)))
+        else:
+            self.checks_passed += 1
+
+    def summary(self):
+        if not self.mismatches:
+            return (f"[REPLAY] identical: {self.end_tick} ticks, {self.checks_passed} checkpoints, "
+                    f"{self.events_checked} events")
+        lines = [f"[REPLAY] {len(self.mismatches)} mismatches (first at tick {self.mismatches[0][0]})"]
+        for tick, what, want, got in self.mismatches[:5]:
+            lines.append(f"  tick {tick} {what}: recorded {want} replayed {got}")
+        return "\n".join(lines)
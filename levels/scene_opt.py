@@ -0,0 +1,140 @@
+# scene_opt.py
+# Optimization pass for static models as they come from the loader: deep
+# hierarchies and many small Geoms are flattened into a few GeomNodes, render
+# states are pushed into the vertices where that lets Geoms merge, and every
+# name in OBJ_SUBPARTS_INFO survives as its own node (picking, hover tint).
+# Also builds the per-subpart pick proxies (oriented box by PCA, or the AABB)
+# that picking.Picker tests the ray against after its AABB tree.
+#
+#   python levels/scene_opt.py assets/cupola.glb   (report only, nothing is written)
+try:
+    import numpy
+except ImportError:   # optional: proxies fall back to the local AABB
+    numpy = None
+from panda3d.core import Geom, InternalName, ModelNode, NodePath, RenderState
+
+def scene_stats(np):
+    """{"nodes", "geom_nodes", "geoms", "states"} under np (states = distinct net render states)."""
+    nodes = np.findAllMatches("**")
+    geom_nodes = np.findAllMatches("**/+GeomNode")
+    geoms, states = 0, set()
+    for gnp in geom_nodes:
+        gn, net = gnp.node(), gnp.getNetState()
+        geoms += gn.getNumGeoms()
+        for i in range(gn.getNumGeoms()):
+            states.add(net.compose(gn.getGeomState(i)))
+    return {"nodes": nodes.getNumPaths(), "geom_nodes": geom_nodes.getNumPaths(),
+            "geoms": geoms, "states": len(states)}
+
+def _keep(np):
+    """Make np a ModelNode that flattening keeps (its transform still goes into the vertices)."""
+    node = np.node()
+    if type(node) is ModelNode:
+        node.setPreserveTransform(ModelNode.PT_none)
+        return np
+    keep = NodePath(ModelNode(node.getName()))
+    keep.node().setPreserveTransform(ModelNode.PT_none)
+    keep.reparentTo(np.getParent(), np.getSort())
+    keep.setTransform(np.getTransform())
+    keep.setState(np.getState())
+    np.clearTransform()
+    np.setState(RenderState.makeEmpty())
+    if node.isGeomNode() or node.getNumChildren() == 0:
+        np.reparentTo(keep)              # the geometry itself was named: wrap it
+    else:
+        for child in list(np.getChildren()):
+            child.reparentTo(keep)
+        for key in node.getTagKeys():
+            keep.setTag(key, node.getTag(key))
+        np.removeNode()
+    return keep
+
+def optimize(model, keep_names=()):
+    """
+    Flattens model in place, keeping keep_names addressable. Returns
+    (before, after) scene_stats, or None if the model is animated (flattening
+    would bake the joints away).
+    """
+    if not model.find("**/+Character").isEmpty():
+        return None
+    before = scene_stats(model)
+    model.clearModelNodes()              # loader ModelNodes would block flattening
+    for name in keep_names:
+        for np in model.findAllMatches(f"**/{name}"):
+            _keep(np)
+    model.flattenStrong()
+    return before, scene_stats(model)
+
+def format_stats(before, after):
+    return ", ".join(f"{k} {before[k]} -> {after[k]}" for k in ("nodes", "geoms", "states"))
+
+# ----- Pick proxies -----
+def _positions(np, space):
+    """(n, 3) float64 vertex positions under np in `space` (float32 vertex columns only)."""
+    out = []
+    for gnp in ([np] if np.node().isGeomNode() else []) + list(np.findAllMatches("**/+GeomNode")):
+        mat = gnp.getMat(space)
+        m = numpy.array([[mat.getCell(r, c) for c in range(4)] for r in range(4)])
+        gn = gnp.node()
+        for i in range(gn.getNumGeoms()):
+            vdata = gn.getGeom(i).getVertexData()
+            fmt = vdata.getFormat()
+            col = fmt.getColumn(InternalName.getVertex())
+            n = vdata.getNumRows()
+            if col is None or col.getNumericType() != Geom.NT_float32 or col.getNumComponents() < 3 or not n:
+                continue
+            raw = numpy.frombuffer(memoryview(vdata.getArray(fmt.getArrayWith(InternalName.getVertex()))).cast("B"),
+                                   dtype=numpy.uint8).reshape(n, -1)
+            p = raw[:, col.getStart():col.getStart() + 12].copy().view(numpy.float32).reshape(n, 3)
+            out.append(p.astype(numpy.float64) @ m[:3, :3] + m[3, :3])   # row vectors (Panda convention)
+    return numpy.concatenate(out) if out else None
+
+def proxy_box(np, space, bounds=None, min_gain=0.85):
+    """
+    {"center", "axes", "half"} in `space` (rows of axes = the box's unit axes):
+    the PCA oriented box if its volume is under min_gain of the AABB's, else
+    the AABB (axes = identity). bounds: np.getTightBounds(space) if already
+    known. None without bounds.
+    """
+    bounds = bounds or np.getTightBounds(space)
+    if not bounds or not bounds[0] or not bounds[1]:
+        return None
+    minb, maxb = bounds
+    size = max((maxb - minb).length(), 0.001)
+    eps = size * 1e-3                    # flat panels still get some thickness
+    box = {"center": [(minb[a] + maxb[a]) * 0.5 for a in range(3)], "axes": [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+           "half": [max((maxb[a] - minb[a]) * 0.5, eps) for a in range(3)]}
+    pts = _positions(np, space) if numpy is not None else None
+    if pts is None or len(pts) < 4:
+        return box
+    _, vecs = numpy.linalg.eigh(numpy.cov((pts - pts.mean(axis=0)).T))
+    axes = vecs.T[::-1]                  # major axis first
+    if numpy.linalg.det(axes) < 0:
+        axes[2] = -axes[2]               # right-handed (a rotation)
+    proj = pts @ axes.T
+    lo, hi = proj.min(axis=0), proj.max(axis=0)
+    half = numpy.maximum((hi - lo) * 0.5, eps)
+    if numpy.prod(half) >= min_gain * numpy.prod(box["half"]):
+        return box
+    return {"center": [float(v) for v in ((lo + hi) * 0.5) @ axes], "axes": axes.tolist(),
+            "half": [float(v) for v in half]}
+
+if __name__ == "__main__":
+    # Offline report: python levels/scene_opt.py [model] (default: main.py's MODEL_PATH_GLB)
+    import os, sys, time
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    from direct.showbase.Loader import Loader
+    from panda3d.core import Filename
+    src = sys.argv[1] if len(sys.argv) > 1 else main.MODEL_PATH_GLB
+    model = Loader(None).loadModel(Filename.fromOsSpecific(os.path.abspath(src)))
+    t0 = time.perf_counter()
+    res = optimize(model, list(main.OBJ_SUBPARTS_INFO))
+    if res is None:
+        print(f"[OPT] {src}: animated model, left as loaded")
+    else:
+        print(f"[OPT] {src}: {format_stats(*res)} ({time.perf_counter() - t0:.2f}s)")
+        for name in main.OBJ_SUBPARTS_INFO:
+            np = model.find(f"**/{name}")
+            box = None if np.isEmpty() else proxy_box(np, model)
+            print(f"  {name}: {'missing' if np.isEmpty() else box and [round(h, 3) for h in box['half']]}")
@@ -0,0 +1,72 @@
+# scenes.py
+# Warm cache for detached 3D scenes: LRU order + memory cap.
+from collections import OrderedDict
+
+def estimate_scene_bytes(root):
+    """Approximate GPU/RAM footprint: vertex + index arrays and texture images."""
+    total = 0
+    for gnp in root.findAllMatches("**/+GeomNode"):
+        gnode = gnp.node()
+        for i in range(gnode.getNumGeoms()):
+            geom = gnode.getGeom(i)
+            vdata = geom.getVertexData()
+            for a in range(vdata.getNumArrays()):
+                total += vdata.getArray(a).getDataSizeBytes()
+            for p in range(geom.getNumPrimitives()):
+                verts = geom.getPrimitive(p).getVertices()
+                if verts is not None:
+                    total += verts.getDataSizeBytes()
+    for tex in root.findAllTextures():
+        total += tex.getExpectedRamImageSize()
+    return total
+
+class SceneCache:
+    """
+    key -> {"root": NodePath, "bytes": int, "data": dict}.
+    Scenes are kept detached (no rendering cost) and re-attached on demand.
+    on_evict(key, entry) lets the owner release extra objects (UI, colliders).
+    """
+    def __init__(self, max_bytes, on_evict=None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+
+    def __contains__(self, key): return key in self.entries
+    def __len__(self): return len(self.entries)
+
+    def total_bytes(self):
+        return sum(e["bytes"] for e in self.entries.values())
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, root, data=None):
+        """Cache a scene; returns False if it alone is over the cap (caller keeps ownership)."""
+        size = estimate_scene_bytes(root)
+        if size > self.max_bytes:
+            return False
+        if key in self.entries:
+            self.evict(key)
+        self.entries[key] = {"root": root, "bytes": size, "data": data or {}}
+        while self.total_bytes() > self.max_bytes:
+            oldest = next(iter(self.entries))
+            if oldest == key: break
+            self.evict(oldest)
+        return True
+
+    def evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        if self.on_evict:
+            self.on_evict(key, entry)
+        if not entry["root"].isEmpty():
+            entry["root"].removeNode()
+        return True
+
+    def evict_all(self):
+        for key in list(self.entries):
+            self.evict(key)
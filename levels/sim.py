@@ -0,0 +1,239 @@
+# sim.py
+# Headless map2d simulation: movement, energy decay, wall collision and
+# trigger edges. Pure Python (no ShowBase); Game drives it once per frame
+# and mirrors the result into the scene graph.
+import time, math
+from spatial import WallIndex, OccupancyGrid
+from triggers import TriggerRegistry
+from profiling import profiler
+from timers import TimerWheel
+from nav import NavGrid
+
+MAP_BOUNDS = (-1.2, 1.2, -1.0, 1.0)   # x_min, x_max, z_min, z_max
+ENERGY_MAX = 10                       # 10..0
+ENERGY_STEP_SECONDS = 3.0             # walking seconds per energy level
+PLAYER_SCALE, PLAYER_SCALE_JUMP = 0.15, 0.18
+COLLISION_DISCRETE = "discrete"       # snap only if the destination overlaps
+COLLISION_SWEPT    = "swept"          # time of impact along the motion (any dt)
+COLLISION_GRID     = "grid"           # swept over an occupancy bitmap (bake_walls.py)
+OCCUPANCY_CELL     = 0.01             # grid mode without a bake: rasterized from the walls
+
+# Event kinds returned by MapSim.step() as (kind, arg) tuples
+# (plus the trigger edges, kinds defined in triggers.py; arg: trigger name)
+EV_ENERGY        = "energy"           # arg: new energy level
+
+class Zone:
+    """Rectángulo AABB sin nodo (igual interfaz x,z,w,h que TriggerZone)."""
+    def __init__(self, center=(0, 0), size=(0.3, 0.3)):
+        self.x, self.z = center
+        self.w, self.h = size
+
+class MapSim:
+    def __init__(self, walls=(), pos=(0.0, 0.0), speed=1.5, cell=0.25,
+                 collision=COLLISION_DISCRETE, nav_cell=0.025, world=None):
+        """world: another MapSim whose map (walls, nav grid, occupancy) this one shares (multiplayer)."""
+        self.x, self.z = pos
+        self.prev_x, self.prev_z = pos  # previous tick (render interpolation)
+        self.speed, self.facing = speed, 1
+        self.scale = PLAYER_SCALE       # sprite scale == AABB size
+        self.moving = False
+        self.energy_level = ENERGY_MAX
+        # Energy decay runs on a clock that only advances while walking
+        self.walk_clock = TimerWheel()
+        self._energy_timer = self.walk_clock.every(ENERGY_STEP_SECONDS, self._drop_energy)
+        self._events = None             # events list of the current step()
+        self.walls_version = 0          # bumped on any wall edit (for copies, e.g. the crowd)
+        if world is None:
+            self.walls = []             # {"x","z","w","h","id",...}
+            self.wall_index = WallIndex(cell=cell)
+            # Pathfinding grid (click-to-move) + flow fields toward each trigger
+            self.nav = NavGrid(MAP_BOUNDS, cell=nav_cell, half=PLAYER_SCALE * 0.5)
+            # Grid mode: walls as an occupancy bitmap (set_occupancy() or rebuilt after edits)
+            self.occupancy = OccupancyGrid(MAP_BOUNDS, OCCUPANCY_CELL) if collision == COLLISION_GRID else None
+        else:
+            self.walls, self.wall_index, self.nav = world.walls, world.wall_index, world.nav
+            self.occupancy = world.occupancy
+        self.collision = collision
+        self.triggers = TriggerRegistry(cell=cell)   # name -> zone (x,z,w,h), per player
+        self.path = []                  # waypoints left (x, z); WASD cancels
+        self.ticks, self.time = 0, 0.0
+        for (x, z, w, h) in walls:
+            self.add_wall(x, z, w, h)
+
+    # ----- Walls -----
+    def add_wall(self, x, z, w, h):
+        wall = {"x": x, "z": z, "w": w, "h": h}
+        self.walls.append(wall)
+        self.wall_index.add(wall)
+        self.nav.add_wall(wall)
+        self._walls_changed()
+        return wall
+
+    def update_wall(self, wall):
+        self.wall_index.update(wall)
+        self.nav.update_wall(wall)
+        self._walls_changed()
+
+    def remove_wall(self, wall):
+        self.walls.remove(wall)
+        self.wall_index.remove(wall)
+        self.nav.remove_wall(wall)
+        self._walls_changed()
+
+    def _walls_changed(self):
+        self.walls_version += 1
+        if self.occupancy is not None:
+            self.occupancy.stale = True     # re-rasterized before the next lookup
+
+    def set_occupancy(self, grid):
+        """Baked grid (bake_walls.load_level) matching the current walls."""
+        grid.stale = False
+        self.occupancy = grid
+
+    # ----- Triggers -----
+    def add_trigger(self, name, zone, on_enter=None, on_exit=None, on_stay=None):
+        """Handlers are fn(name, zone); edges are also returned by step()."""
+        self.nav.set_goal(name, zone.x, zone.z)
+        return self.triggers.add(name, zone, on_enter, on_exit, on_stay)
+
+    def move_trigger(self, name):
+        self.triggers.moved(name)
+        zone = self.triggers[name]
+        self.nav.set_goal(name, zone.x, zone.z)
+
+    # ----- Click-to-move -----
+    def move_to(self, x, z):
+        """Walk to (x, z) around the walls (to the closest reachable point). False if no path."""
+        self.path = self.nav.find_path((self.x, self.z), (x, z))
+        return bool(self.path)
+
+    def stop(self):
+        self.path = []
+
+    def _follow_path(self, dt):
+        """Velocity toward the next waypoint; the last step lands exactly on it."""
+        while self.path:
+            dx, dz = self.path[0][0] - self.x, self.path[0][1] - self.z
+            d = math.hypot(dx, dz)
+            if d > 1e-9:
+                break
+            self.path.pop(0)
+        else:
+            return 0.0, 0.0
+        k = self.speed / d if d > self.speed * dt else 1.0 / dt
+        if abs(dx) > 1e-6:
+            self.facing = 1 if dx > 0 else -1
+        return dx * k, dz * k
+
+    # ----- Energy -----
+    @property
+    def walk_accum(self):
+        """Walking seconds toward the next energy drop."""
+        return ENERGY_STEP_SECONDS - (self._energy_timer.deadline - self.walk_clock.now)
+
+    def restore_energy(self):
+        self.energy_level = ENERGY_MAX
+        self._energy_timer.cancel()
+        self._energy_timer = self.walk_clock.every(ENERGY_STEP_SECONDS, self._drop_energy)
+
+    def _drop_energy(self):
+        if self.energy_level > 0:
+            self.energy_level -= 1
+            self._events.append((EV_ENERGY, self.energy_level))
+
+    # ----- State (network snapshots / prediction) -----
+    def get_state(self):
+        """(x, z, facing, energy, walk_accum, scale): everything step() carries between ticks."""
+        return (self.x, self.z, self.facing, self.energy_level, self.walk_accum, self.scale)
+
+    def set_state(self, state):
+        self.x, self.z, self.facing, self.energy_level, accum, self.scale = state
+        self.prev_x, self.prev_z = self.x, self.z
+        self._energy_timer.cancel()
+        self._energy_timer = self.walk_clock.every(ENERGY_STEP_SECONDS, self._drop_energy,
+                                                   first=ENERGY_STEP_SECONDS - accum)
+
+    # ----- Tick -----
+    def settle(self):
+        """No tick this frame (UI blocked): stop interpolating from the old position."""
+        self.prev_x, self.prev_z = self.x, self.z
+
+    def step(self, inputs, dt, triggers=True):
+        """
+        Advance one tick. `inputs` maps "w","a","s","d","space" -> bool. Returns [(kind, arg)].
+        triggers=False skips the trigger test (re-simulating already predicted ticks).
+        """
+        events = []
+        self.prev_x, self.prev_z = self.x, self.z
+        moving, vx, vz = False, 0.0, 0.0
+        if inputs.get("w"): vz += self.speed; moving = True
+        if inputs.get("s"): vz -= self.speed; moving = True
+        if inputs.get("a"): vx -= self.speed; moving = True; self.facing = -1
+        if inputs.get("d"): vx += self.speed; moving = True; self.facing = 1
+        if moving:
+            self.path = []
+        elif self.path:
+            vx, vz = self._follow_path(dt)
+            moving = bool(vx or vz)
+        self.moving = moving
+
+        # ENERGY: drop 1 level every 3s of ACCUMULATED walking (even if you stop);
+        # the walk clock's timer fires the drops, nothing is polled per tick
+        if moving and self.energy_level > 0:
+            self._events = events
+            self.walk_clock.advance(dt)
+            self._events = None
+
+        # Collisions vs walls (separable axis); AABB = last tick's scale
+        with profiler.scope("map2d:collision"):
+            pw = ph = self.scale
+            hx, hz = pw * 0.5, ph * 0.5
+            x0, x1, z0, z1 = MAP_BOUNDS
+            tx = max(x0, min(x1, self.x + vx * dt))
+            tz = max(z0, min(z1, self.z + vz * dt))
+            if self.collision == COLLISION_SWEPT:
+                tx = self.wall_index.sweep_x(self.x, tx, self.z, hx, hz)
+                tz = self.wall_index.sweep_z(tx, self.z, tz, hx, hz)
+            elif self.collision == COLLISION_GRID:
+                grid = self.occupancy
+                if grid.stale:
+                    grid.rebuild(self.walls)
+                tx = grid.sweep_x(self.x, tx, self.z, hx, hz)
+                tz = grid.sweep_z(tx, self.z, tz, hx, hz)
+            else:
+                tx = self.wall_index.resolve_x(tx, self.z, hx, hz)
+                tz = self.wall_index.resolve_z(tx, tz, hx, hz)
+            if self.path and (tx, tz) == (self.x, self.z):
+                self.path = []          # blocked (e.g. a wall was dropped on the path)
+            self.x, self.z = tx, tz
+            self.scale = PLAYER_SCALE_JUMP if inputs.get("space") else PLAYER_SCALE
+
+        # Trigger edges (spatial index: only zones near the player are tested)
+        if triggers:
+            with profiler.scope("map2d:triggers"):
+                events.extend(self.triggers.update(tx, tz, pw, ph))
+
+        self.ticks += 1
+        self.time += dt
+        return events
+
+def make_default_sim(cell=0.25, collision=COLLISION_DISCRETE, world=None):
+    """MapSim with the level_map layout (walls + cupola/sleep triggers); world: share its map."""
+    from level_map import (PLAYER_START, TRIGGER_CENTER, TRIGGER_SIZE,
+                           SLEEP_TRIGGER_CENTER, SLEEP_TRIGGER_SIZE, WALLS)
+    sim = MapSim(WALLS if world is None else (), pos=PLAYER_START, cell=cell,
+                 collision=collision, world=world)
+    sim.add_trigger("cupola", Zone(TRIGGER_CENTER, TRIGGER_SIZE))
+    sim.add_trigger("sleep", Zone(SLEEP_TRIGGER_CENTER, SLEEP_TRIGGER_SIZE))
+    return sim
+
+if __name__ == "__main__":
+    # Headless smoke run: walk a square and report throughput.
+    sim = make_default_sim()
+    pattern = ["d", "w", "a", "s"]
+    n, dt, n_events, t0 = 200000, 1.0 / 60.0, 0, time.perf_counter()
+    for i in range(n):
+        n_events += len(sim.step({pattern[(i // 90) % 4]: True}, dt))
+    el = time.perf_counter() - t0
+    print(f"[SIM] {n} ticks in {el:.2f}s ({n / el:,.0f} ticks/s)  events={n_events}  "
+          f"pos=({sim.x:.3f}, {sim.z:.3f}) energy={sim.energy_level}")
@@ -0,0 +1,300 @@
+# spatial.py
+# Broadphase helpers for the 2D map (render2d units).
+import heapq, math, operator
+from itertools import accumulate
+
+def aabb_overlap(ax, az, aw, ah, bx, bz, bw, bh):
+    return (abs(ax - bx) * 2 < (aw + bw)) and (abs(az - bz) * 2 < (ah + bh))
+
+# ============ Uniform grid / spatial hash ============
+class SpatialHash:
+    """Hash de celdas uniformes: key -> AABB (x, z, w, h) centrado."""
+    def __init__(self, cell=0.25):
+        self.cell = float(cell)
+        self.cells = {}    # (cx, cz) -> set(keys)
+        self.rects = {}    # key -> (x, z, w, h)
+        self.spans = {}    # key -> (cx0, cz0, cx1, cz1)
+
+    def _span(self, x0, z0, x1, z1):
+        c = self.cell
+        return (int(math.floor(x0 / c)), int(math.floor(z0 / c)),
+                int(math.floor(x1 / c)), int(math.floor(z1 / c)))
+
+    def insert(self, key, x, z, w, h):
+        if key in self.rects:
+            self.remove(key)
+        span = self._span(x - w * 0.5, z - h * 0.5, x + w * 0.5, z + h * 0.5)
+        self.rects[key], self.spans[key] = (x, z, w, h), span
+        for cx in range(span[0], span[2] + 1):
+            for cz in range(span[1], span[3] + 1):
+                self.cells.setdefault((cx, cz), set()).add(key)
+
+    def remove(self, key):
+        span = self.spans.pop(key, None)
+        self.rects.pop(key, None)
+        if span is None:
+            return
+        for cx in range(span[0], span[2] + 1):
+            for cz in range(span[1], span[3] + 1):
+                bucket = self.cells.get((cx, cz))
+                if bucket is None: continue
+                bucket.discard(key)
+                if not bucket: del self.cells[(cx, cz)]
+
+    def update(self, key, x, z, w, h):
+        span = self._span(x - w * 0.5, z - h * 0.5, x + w * 0.5, z + h * 0.5)
+        if self.spans.get(key) == span:
+            self.rects[key] = (x, z, w, h)   # same cells: nothing to move
+            return
+        self.insert(key, x, z, w, h)
+
+    def query(self, x0, z0, x1, z1):
+        """Keys whose cells touch the box [x0,x1] x [z0,z1] (superset of real hits)."""
+        span = self._span(x0, z0, x1, z1)
+        out = set()
+        for cx in range(span[0], span[2] + 1):
+            for cz in range(span[1], span[3] + 1):
+                bucket = self.cells.get((cx, cz))
+                if bucket: out |= bucket
+        return out
+
+    def clear(self):
+        self.cells.clear(); self.rects.clear(); self.spans.clear()
+
+    def __len__(self): return len(self.rects)
+    def __contains__(self, key): return key in self.rects
+
+# ============ Walls index ============
+class WallIndex:
+    """
+    Broadphase de WALLS. Cada muro es el dict del juego {"x","z","w","h",...};
+    se le asigna "id" creciente para conservar el orden de la lista, así la
+    resolución por ejes da exactamente el mismo resultado que el bucle lineal.
+    """
+    def __init__(self, cell=0.25):
+        self.hash = SpatialHash(cell)
+        self.by_id = {}
+        self._next_id = 0
+
+    def add(self, wall):
+        wall["id"] = self._next_id; self._next_id += 1
+        self.by_id[wall["id"]] = wall
+        self.hash.insert(wall["id"], wall["x"], wall["z"], wall["w"], wall["h"])
+
+    def update(self, wall):
+        self.hash.update(wall["id"], wall["x"], wall["z"], wall["w"], wall["h"])
+
+    def remove(self, wall):
+        self.by_id.pop(wall["id"], None)
+        self.hash.remove(wall["id"])
+
+    def clear(self):
+        self.hash.clear(); self.by_id.clear()
+
+    def __len__(self): return len(self.by_id)
+
+    def _resolve(self, tx, tz, hx, hz, axis, eps=0.0):
+        # Candidates in list order; when a snap moves the box outside the cells
+        # already visited, pull in the new neighbours that come later in the list.
+        seen = self.hash.query(tx - hx, tz - hz, tx + hx, tz + hz)
+        heap = list(seen); heapq.heapify(heap)
+        while heap:
+            wid = heapq.heappop(heap)
+            w = self.by_id[wid]
+            if abs(tx - w["x"]) < (hx + w["w"] * 0.5) - eps and abs(tz - w["z"]) < (hz + w["h"] * 0.5) - eps:
+                if axis == 0:
+                    tx = w["x"] + hx + w["w"] * 0.5 if tx > w["x"] else w["x"] - (hx + w["w"] * 0.5)
+                else:
+                    tz = w["z"] + hz + w["h"] * 0.5 if tz > w["z"] else w["z"] - (hz + w["h"] * 0.5)
+                for k in self.hash.query(tx - hx, tz - hz, tx + hx, tz + hz) - seen:
+                    seen.add(k)
+                    if k > wid: heapq.heappush(heap, k)
+        return tx if axis == 0 else tz
+
+    def resolve_x(self, tx, z, hx, hz):
+        return self._resolve(tx, z, hx, hz, 0)
+
+    def resolve_z(self, x, tz, hx, hz):
+        return self._resolve(x, tz, hx, hz, 1)
+
+    # ----- Swept (continuous) -----
+    # Boxes resting on a face sit there up to float rounding; SWEEP_EPS makes
+    # "touching" count as free so a grazing wall is neither hit nor snapped to.
+    SWEEP_EPS = 1e-9
+
+    def _sweep(self, p, tp, q, hp, hq, axis):
+        # 1D time of impact: the box moves along `axis` from p to tp (q fixed on
+        # the other axis) and stops at the first wall face it would cross.
+        # Walls it already overlaps at p are left to _resolve() (same as discrete).
+        eps = self.SWEEP_EPS
+        if tp == p:
+            return tp
+        lo, hi = (p, tp) if tp > p else (tp, p)
+        if axis == 0:
+            cand = self.hash.query(lo - hp, q - hq, hi + hp, q + hq)
+        else:
+            cand = self.hash.query(q - hq, lo - hp, q + hq, hi + hp)
+        for wid in cand:
+            w = self.by_id[wid]
+            wp, wq = (w["x"], w["z"]) if axis == 0 else (w["z"], w["x"])
+            ep, eq = (w["w"], w["h"]) if axis == 0 else (w["h"], w["w"])
+            if abs(q - wq) >= hq + eq * 0.5 - eps:
+                continue    # no overlap on the other axis: cannot be hit
+            if tp > p:
+                face = wp - (hp + ep * 0.5)
+                if p <= face + eps and face < tp: tp = face
+            else:
+                face = wp + hp + ep * 0.5      # same rounding as _resolve's snap
+                if p >= face - eps and face > tp: tp = face
+        return tp
+
+    def sweep_x(self, x, tx, z, hx, hz):
+        """Move from x to tx at height z without tunnelling; then resolve overlaps."""
+        return self._resolve(self._sweep(x, tx, z, hx, hz, 0), z, hx, hz, 0, self.SWEEP_EPS)
+
+    def sweep_z(self, x, z, tz, hx, hz):
+        return self._resolve(x, self._sweep(z, tz, x, hz, hx, 1), hx, hz, 1, self.SWEEP_EPS)
+
+# ============ Occupancy grid ============
+class OccupancyGrid:
+    """
+    Collision bitmap over `bounds` (x0, x1, z0, z1), `cell` units per cell;
+    bits[j * nx + i] = 1 if cell (i, z row j from z0 up) is wall. A summed-area
+    table makes "any wall in this cell range" one lookup, so a resolve/sweep
+    costs one lookup per cell column/row crossed, whatever the number of walls.
+    Same interface as WallIndex (resolve_*, sweep_*); walls are rasterized by cell
+    centre, so faces land on the cell lines (bake_walls.py bakes it offline).
+    """
+    def __init__(self, bounds, cell, bits=None):
+        self.bounds, self.cell = tuple(bounds), float(cell)
+        x0, x1, z0, z1 = self.bounds
+        self.nx = int(round((x1 - x0) / self.cell))
+        self.nz = int(round((z1 - z0) / self.cell))
+        self.bits = bytearray(bits) if bits is not None else bytearray(self.nx * self.nz)
+        if len(self.bits) != self.nx * self.nz:
+            raise ValueError(f"occupancy bitmap is {len(self.bits)} cells, expected {self.nx}x{self.nz}")
+        self.dirty = True              # summed-area table out of date
+        self.stale = False             # bits out of date with the walls (set by MapSim on edits)
+
+    # ----- Rasterize -----
+    def clear(self):
+        self.bits = bytearray(self.nx * self.nz)
+        self.dirty = True
+
+    def _cells(self, lo, hi, origin, n):
+        # Cells whose centre lies inside [lo, hi], clamped to the grid
+        c = self.cell
+        return (max(0, int(math.ceil((lo - origin) / c - 0.5))),
+                min(n - 1, int(math.floor((hi - origin) / c - 0.5))))
+
+    def paint(self, x, z, w, h, value=1):
+        x0, _, z0, _ = self.bounds
+        i0, i1 = self._cells(x - w * 0.5, x + w * 0.5, x0, self.nx)
+        j0, j1 = self._cells(z - h * 0.5, z + h * 0.5, z0, self.nz)
+        if i0 > i1:
+            return
+        row = bytes([value]) * (i1 - i0 + 1)
+        for j in range(j0, j1 + 1):
+            self.bits[j * self.nx + i0:j * self.nx + i1 + 1] = row
+        self.dirty = True
+
+    def rebuild(self, walls):
+        """Re-rasterize from game walls ({"x","z","w","h"}) after edits."""
+        self.clear()
+        for w in walls:
+            self.paint(w["x"], w["z"], w["w"], w["h"])
+        self._build_table()
+        self.stale = False
+
+    def _build_table(self):
+        # sat[j * (nx + 1) + i] = wall cells in columns < i, rows < j
+        nx = self.nx
+        prev = [0] * (nx + 1)
+        sat = list(prev)
+        for j in range(self.nz):
+            prev = list(map(operator.add, prev, accumulate(self.bits[j * nx:(j + 1) * nx], initial=0)))
+            sat += prev
+        self.sat, self.dirty = sat, False
+
+    # ----- Lookups -----
+    def count(self, i0, i1, j0, j1):
+        """Wall cells in columns i0..i1 x rows j0..j1 (inclusive, clamped; outside = free)."""
+        if self.dirty:
+            self._build_table()
+        i0, i1 = max(i0, 0), min(i1, self.nx - 1)
+        j0, j1 = max(j0, 0), min(j1, self.nz - 1)
+        if i0 > i1 or j0 > j1:
+            return 0
+        s, st = self.sat, self.nx + 1
+        return s[(j1 + 1) * st + i1 + 1] - s[j0 * st + i1 + 1] - s[(j1 + 1) * st + i0] + s[j0 * st + i0]
+
+    # Faces are snapped onto cell lines up to float rounding: within EPS of a
+    # line counts as touching, and touching is free (as for a box on a wall face)
+    EPS = 1e-9
+
+    def _span(self, lo, hi, origin):
+        # Cells overlapping the open interval (lo, hi)
+        c, eps = self.cell, self.EPS
+        return int(math.floor((lo + eps - origin) / c)), int(math.ceil((hi - eps - origin) / c)) - 1
+
+    def _axis(self, q, hq, axis):
+        # (origin along axis, cell count along axis, hit(a, b): walls in cells a..b x the box's span on the other axis)
+        x0, _, z0, _ = self.bounds
+        if axis == 0:
+            j0, j1 = self._span(q - hq, q + hq, z0)
+            return x0, self.nx, lambda a, b: self.count(a, b, j0, j1)
+        i0, i1 = self._span(q - hq, q + hq, x0)
+        return z0, self.nz, lambda a, b: self.count(i0, i1, a, b)
+
+    def blocked(self, x, z, hx, hz):
+        x0, _, z0, _ = self.bounds
+        i0, i1 = self._span(x - hx, x + hx, x0)
+        j0, j1 = self._span(z - hz, z + hz, z0)
+        return self.count(i0, i1, j0, j1) > 0
+
+    def _resolve(self, p, q, hp, hq, axis):
+        # Out of the walls along `axis`, onto the closer free cell line (ties: up/right)
+        po, n, hit = self._axis(q, hq, axis)
+        c = self.cell
+        if not hit(*self._span(p - hp, p + hp, po)):
+            return p
+        k = int(math.ceil((p - hp - po) / c - self.EPS))     # left/bottom face on line k
+        while k < n and hit(*self._span(po + k * c, po + k * c + 2 * hp, po)):
+            k += 1
+        up = po + k * c + hp
+        k = int(math.floor((p + hp - po) / c + self.EPS))    # right/top face on line k
+        while k > 0 and hit(*self._span(po + k * c - 2 * hp, po + k * c, po)):
+            k -= 1
+        down = po + k * c - hp
+        return up if up - p <= p - down else down
+
+    def resolve_x(self, tx, z, hx, hz):
+        return self._resolve(tx, z, hx, hz, 0)
+
+    def resolve_z(self, x, tz, hx, hz):
+        return self._resolve(tz, x, hz, hx, 1)
+
+    # ----- Swept -----
+    def _sweep(self, p, tp, q, hp, hq, axis):
+        # First wall cell the leading face would enter going from p to tp;
+        # walls the box already overlaps at p are left to _resolve()
+        if tp == p:
+            return tp
+        po, _, hit = self._axis(q, hq, axis)
+        c, eps = self.cell, self.EPS
+        if tp > p:
+            for k in range(int(math.ceil((p + hp - eps - po) / c)), int(math.ceil((tp + hp - eps - po) / c))):
+                if hit(k, k):
+                    return po + k * c - hp
+        else:
+            for k in range(int(math.floor((p - hp + eps - po) / c)) - 1, int(math.floor((tp - hp + eps - po) / c)) - 1, -1):
+                if hit(k, k):
+                    return po + (k + 1) * c + hp
+        return tp
+
+    def sweep_x(self, x, tx, z, hx, hz):
+        """Move from x to tx at height z without tunnelling; then resolve overlaps."""
+        return self._resolve(self._sweep(x, tx, z, hx, hz, 0), z, hx, hz, 0)
+
+    def sweep_z(self, x, z, tz, hx, hz):
+        return self._resolve(self._sweep(z, tz, x, hz, hx, 1), x, hz, hx, 1)
@@ -0,0 +1,174 @@
+# textures.py
+# Process-wide texture registry + sprite atlas (one texture per sprite series).
+import os, json, math, hashlib
+from panda3d.core import (
+    Texture, PNMImage, Filename, SamplerState, TextureStage,
+    VirtualFileSystem, getModelPath, PandaSystem, TexturePool
+)
+
+# ============ Registry ============
+_TEXTURES = {}   # path -> Texture
+_ATLASES = {}    # (name, paths) -> Atlas
+
+def load_texture(loader, path):
+    """Load each path once per process (raises like loader.loadTexture)."""
+    tex = _TEXTURES.get(path)
+    if tex is None:
+        tex = loader.loadTexture(path)
+        _TEXTURES[path] = tex
+    return tex
+
+# ============ .txo cache ============
+# Decoded/packed textures stored as raw texels. Key = source paths + mtime +
+# size + options + Panda3D version, so an edited asset is rebuilt.
+def _cache_file(cache_dir, stem, paths, extra=""):
+    if not cache_dir:
+        return None
+    parts = [extra, PandaSystem.getVersionString()]
+    for path in paths:
+        fn = Filename(path)
+        VirtualFileSystem.getGlobalPtr().resolveFilename(fn, getModelPath().getValue())
+        src = fn.toOsSpecific()
+        if not os.path.exists(src):
+            return None
+        st = os.stat(src)
+        parts.append(f"{os.path.abspath(src)}:{st.st_mtime_ns}:{st.st_size}")
+    h = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{stem}.{h}.txo")
+
+def _load_txo(txo):
+    if txo and os.path.exists(txo):
+        return TexturePool.loadTexture(Filename.fromOsSpecific(txo)) or None
+    return None
+
+def _store_txo(tex, txo):
+    if not txo:
+        return
+    try:
+        os.makedirs(os.path.dirname(txo), exist_ok=True)
+        tmp = txo + ".tmp.txo"
+        if tex.write(Filename.fromOsSpecific(tmp)):
+            os.replace(tmp, txo)
+    except OSError as e:
+        print(f"[WARN] Could not write texture cache {txo}: {e}")
+
+def load_texture_scaled(loader, path, max_size, cache_dir=""):
+    """
+    Big images (e.g. the map background) downscaled to fit `max_size` and
+    cached as .txo: later runs skip the PNG decode and the rescale.
+    max_size <= 0 -> plain load_texture().
+    """
+    if max_size <= 0:
+        return load_texture(loader, path)
+    key = (path, max_size)
+    tex = _TEXTURES.get(key)
+    if tex is not None:
+        return tex
+    txo = _cache_file(cache_dir, os.path.splitext(os.path.basename(path))[0], [path], f"max{max_size}")
+    tex = _load_txo(txo)
+    if tex is None:
+        img = _read_image(path)
+        w, h = img.getXSize(), img.getYSize()
+        k = min(1.0, max_size / float(max(w, h)))
+        if k < 1.0:
+            small = PNMImage(max(1, int(w * k)), max(1, int(h * k)), img.getNumChannels())
+            small.quickFilterFrom(img)
+            img = small
+        tex = Texture(os.path.basename(path))
+        tex.considerRescale(img)
+        tex.load(img)
+        tex.setWrapU(SamplerState.WM_clamp); tex.setWrapV(SamplerState.WM_clamp)
+        _store_txo(tex, txo)
+    _TEXTURES[key] = tex
+    return tex
+
+def _read_image(path):
+    fn = Filename(path)
+    VirtualFileSystem.getGlobalPtr().resolveFilename(fn, getModelPath().getValue())
+    img = PNMImage()
+    if not img.read(fn):
+        raise IOError(f"Could not read image: {path}")
+    if not img.hasAlpha():
+        img.addAlpha(); img.alphaFill(1.0)
+    return img
+
+# ============ Atlas ============
+class Atlas:
+    """Texture + per-frame UV rect (u0, v0, su, sv). Frames are addressed by index or path."""
+    def __init__(self, texture, rects, paths):
+        self.texture = texture
+        self.rects = rects
+        self.index = {p: i for i, p in enumerate(paths)}
+
+    def __len__(self): return len(self.rects)
+
+    def frames_for(self, paths):
+        return [self.index[p] for p in paths]
+
+    def apply(self, nodepath, i):
+        """Show frame i on a node already textured with the atlas (UV change only)."""
+        u0, v0, su, sv = self.rects[i]
+        ts = TextureStage.getDefault()
+        nodepath.setTexScale(ts, su, sv)
+        nodepath.setTexOffset(ts, u0, v0)
+
+def _blit_padded(dst, img, x, y, pad):
+    w, h = img.getXSize(), img.getYSize()
+    dst.copySubImage(img, x, y)
+    # Replicate edges into the gutter so filtering never samples a neighbour
+    for k in range(1, pad + 1):
+        dst.copySubImage(img, x, y - k, 0, 0, w, 1)
+        dst.copySubImage(img, x, y + h - 1 + k, 0, h - 1, w, 1)
+        dst.copySubImage(dst, x - k, y - pad, x, y - pad, 1, h + 2 * pad)
+        dst.copySubImage(dst, x + w - 1 + k, y - pad, x + w - 1, y - pad, 1, h + 2 * pad)
+
+def build_atlas(paths, name="atlas", pad=2, cache_dir=""):
+    """
+    Pack a sprite series (duplicates folded) into one texture, near-square grid.
+    With `cache_dir` the packed sheet is kept as .txo (+ .json UV rects).
+    """
+    uniq = list(dict.fromkeys(paths))
+    key = (name, tuple(uniq))
+    if key in _ATLASES:
+        return _ATLASES[key]
+    txo = _cache_file(cache_dir, name, uniq, f"pad{pad}")
+    tex = _load_txo(txo)
+    if tex is not None:
+        try:
+            with open(txo[:-4] + ".json", "r", encoding="utf-8") as f:
+                rects = [tuple(r) for r in json.load(f)]
+            if len(rects) == len(uniq):
+                atlas = _ATLASES[key] = Atlas(tex, rects, uniq)
+                return atlas
+        except (OSError, ValueError):
+            pass
+    images = [_read_image(p) for p in uniq]
+    cw = max(i.getXSize() for i in images) + 2 * pad
+    ch = max(i.getYSize() for i in images) + 2 * pad
+    n = len(images)
+    cols = max(1, min(n, int(round(math.sqrt(n * ch / float(cw))))))
+    rows = int(math.ceil(n / float(cols)))
+    W, H = cols * cw, rows * ch
+    sheet = PNMImage(W, H, 4)
+    sheet.alphaFill(0.0)
+    rects = []
+    for i, img in enumerate(images):
+        x, y = (i % cols) * cw + pad, (i // cols) * ch + pad
+        _blit_padded(sheet, img, x, y, pad)
+        w, h = img.getXSize(), img.getYSize()
+        # PNMImage y grows down, texture v grows up
+        rects.append((x / float(W), 1.0 - (y + h) / float(H), w / float(W), h / float(H)))
+    tex = Texture(name)
+    tex.considerRescale(sheet)   # honour textures-power-2 like file loads do
+    tex.load(sheet)
+    tex.setWrapU(SamplerState.WM_clamp); tex.setWrapV(SamplerState.WM_clamp)
+    if txo:
+        _store_txo(tex, txo)
+        try:
+            with open(txo[:-4] + ".json", "w", encoding="utf-8") as f:
+                json.dump(rects, f)
+        except OSError as e:
+            print(f"[WARN] Could not write texture cache {txo}: {e}")
+    atlas = Atlas(tex, rects, uniq)
+    _ATLASES[key] = atlas
+    return atlas
@@ -0,0 +1,98 @@
+# timers.py
+# Hashed timer wheel: schedule/cancel are O(1) and advance() only visits the
+# slots the clock passed, so idle timers cost nothing per frame. Each wheel
+# has its own clock (e.g. MapSim's walk clock only runs while walking).
+import heapq
+
+class Timer:
+    __slots__ = ("deadline", "interval", "fn", "args", "seq", "cancelled", "wheel", "slot")
+    def __init__(self, deadline, interval, fn, args, seq, wheel=None):
+        self.deadline, self.interval = deadline, interval
+        self.fn, self.args, self.seq = fn, args, seq
+        self.cancelled = False
+        self.wheel, self.slot = wheel, None   # slot index while waiting in the wheel
+
+    def cancel(self):
+        # Out of its slot right away: a wheel whose clock is stopped (walk_clock
+        # while idle) would otherwise keep every cancelled timer forever
+        self.cancelled = True
+        if self.slot is not None:
+            self.wheel.slots[self.slot].remove(self)
+            self.slot = None
+    def __lt__(self, other): return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+class TimerWheel:
+    """
+    after(delay, fn, *args) / every(interval, fn, *args) -> Timer (cancel()).
+    A timer fires on the first advance() where now >= deadline; timers due in
+    the same advance fire in deadline order. Periodic timers keep their phase
+    (deadline += interval), so a long dt fires them once per elapsed period.
+    """
+    def __init__(self, resolution=1.0 / 60.0, slots=256):
+        self.resolution = resolution
+        self.slots = [[] for _ in range(slots)]
+        self.now = 0.0
+        self.cursor = 0          # first slot index not fully processed
+        self._seq = 0
+        self._due = None         # heap while advance() is firing
+        self.fired = 0
+
+    def __len__(self):
+        return sum(1 for b in self.slots for t in b if not t.cancelled)
+
+    def _insert(self, t):
+        if self._due is not None and t.deadline <= self.now:
+            t.slot = None
+            heapq.heappush(self._due, t)     # scheduled from a callback, already due
+        else:
+            k = max(int(t.deadline / self.resolution), self.cursor) % len(self.slots)
+            t.slot = k
+            self.slots[k].append(t)
+
+    def at(self, deadline, fn, *args, interval=None):
+        self._seq += 1
+        t = Timer(deadline, interval, fn, args, self._seq, self)
+        self._insert(t)
+        return t
+
+    def after(self, delay, fn, *args):
+        return self.at(self.now + delay, fn, *args)
+
+    def every(self, interval, fn, *args, first=None):
+        """First call after `first` (default: one interval), then every `interval`."""
+        return self.at(self.now + (interval if first is None else first), fn, *args, interval=interval)
+
+    def advance(self, dt):
+        self.now += dt
+        end = int(self.now / self.resolution)
+        n = len(self.slots)
+        due = []
+        # Visit the slots the clock crossed (all of them at most once)
+        for k in range(self.cursor, min(end, self.cursor + n - 1) + 1):
+            bucket = self.slots[k % n]
+            if not bucket:
+                continue
+            keep = []
+            for t in bucket:
+                if t.cancelled: continue
+                if t.deadline <= self.now: t.slot = None; due.append(t)
+                else: keep.append(t)          # later round of the wheel
+            self.slots[k % n] = keep
+        self.cursor = end
+        if not due:
+            return 0
+        heapq.heapify(due)
+        self._due, fired = due, 0
+        try:
+            while due:
+                t = heapq.heappop(due)
+                if t.cancelled: continue
+                t.fn(*t.args)
+                fired += 1
+                if t.interval and not t.cancelled:
+                    t.deadline += t.interval
+                    self._insert(t)
+        finally:
+            self._due = None
+        self.fired += fired
+        return fired
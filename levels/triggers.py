@@ -0,0 +1,82 @@
+# triggers.py
+# Generic trigger registry: zones in a spatial hash, enter/exit/stay edges
+# per tick, handlers attached per trigger. Pure Python (used by MapSim).
+from spatial import SpatialHash, aabb_overlap
+
+EV_TRIGGER_ENTER = "trigger_enter"    # arg: trigger name
+EV_TRIGGER_EXIT  = "trigger_exit"     # arg: trigger name
+EV_TRIGGER_STAY  = "trigger_stay"     # handlers only (not returned as events)
+
+class TriggerRegistry:
+    """
+    name -> zone (any object with x, z, w, h). Per tick only zones in the
+    cells under the player are tested, so hundreds of zones cost about the
+    same as two. Edges (and stay handlers) run in registration order.
+    """
+    def __init__(self, cell=0.25):
+        self.hash = SpatialHash(cell)
+        self.zones = {}
+        self.order = {}       # name -> registration index
+        self.handlers = {}    # name -> {"enter": [...], "exit": [...], "stay": [...]}
+        self.inside = set()   # names overlapped at the last update
+        self._next = 0
+
+    def __contains__(self, name): return name in self.zones
+    def __len__(self): return len(self.zones)
+    def __getitem__(self, name): return self.zones[name]
+
+    def add(self, name, zone, on_enter=None, on_exit=None, on_stay=None):
+        if name in self.zones:
+            self.remove(name)
+        self.zones[name] = zone
+        self.order[name] = self._next; self._next += 1
+        self.handlers[name] = {"enter": [], "exit": [], "stay": []}
+        self.hash.insert(name, zone.x, zone.z, zone.w, zone.h)
+        self.on(name, on_enter, on_exit, on_stay)
+        return zone
+
+    def remove(self, name):
+        self.zones.pop(name, None)
+        self.order.pop(name, None)
+        self.handlers.pop(name, None)
+        self.inside.discard(name)
+        self.hash.remove(name)
+
+    def moved(self, name):
+        """Call after editing a zone's center/size (e.g. the bed editor)."""
+        z = self.zones[name]
+        self.hash.update(name, z.x, z.z, z.w, z.h)
+
+    def on(self, name, enter=None, exit=None, stay=None):
+        """Attach handlers: fn(name, zone)."""
+        h = self.handlers[name]
+        if enter: h["enter"].append(enter)
+        if exit: h["exit"].append(exit)
+        if stay: h["stay"].append(stay)
+
+    def is_inside(self, name):
+        return name in self.inside
+
+    def update(self, x, z, w, h):
+        """Test the box (x,z,w,h); dispatch handlers and return [(kind, name)] edges."""
+        now = set()
+        for name in self.hash.query(x - w * 0.5, z - h * 0.5, x + w * 0.5, z + h * 0.5):
+            zn = self.zones[name]
+            if aabb_overlap(x, z, w, h, zn.x, zn.z, zn.w, zn.h):
+                now.add(name)
+        events = []
+        if now != self.inside:
+            key = self.order.__getitem__
+            for name in sorted(now - self.inside, key=key):
+                events.append((EV_TRIGGER_ENTER, name))
+            for name in sorted(self.inside - now, key=key):
+                events.append((EV_TRIGGER_EXIT, name))
+        stay = sorted(now & self.inside, key=self.order.__getitem__)
+        self.inside = now
+        for kind, name in events:
+            for fn in self.handlers[name]["enter" if kind == EV_TRIGGER_ENTER else "exit"]:
+                fn(name, self.zones[name])
+        for name in stay:
+            for fn in self.handlers[name]["stay"]:
+                fn(name, self.zones[name])
+        return events
@@ -0,0 +1,138 @@
+# ui_pool.py
+# Prebuilt DirectGui widgets. Dialogs, overlays and editor hints are built
+# once (startup prebuild or first use) and then only shown/hidden; showing
+# one rebinds its commands but never re-creates or re-lays out its text.
+# DirectGui is imported by the first widget built (not at startup).
+from direct.gui.OnscreenImage import OnscreenImage
+from panda3d.core import TextNode, TransparencyAttrib
+
+class ConfirmDialog:
+    """Question + Yes/No. show(on_yes, on_no) rebinds the buttons."""
+    def __init__(self, parent, text):
+        from direct.gui.DirectGui import DirectFrame, DirectButton, DirectLabel
+        self.frame = DirectFrame(parent=parent, frameColor=(0,0,0,0.75),
+                                 frameSize=(-0.7, 0.7, -0.25, 0.25), pos=(0,0,0))
+        self.label = DirectLabel(parent=self.frame, text=text, scale=0.07, pos=(0,0,0.1))
+        self.yes = DirectButton(parent=self.frame, text="Yes", scale=0.06, pos=(-0.2,0,-0.1))
+        self.no  = DirectButton(parent=self.frame, text="No",  scale=0.06, pos=( 0.2,0,-0.1))
+        self.frame.hide()
+
+    def show(self, on_yes, on_no):
+        self.yes["command"], self.no["command"] = on_yes, on_no
+        self.frame.show()
+        return self
+
+    def hide(self):
+        self.frame.hide()
+
+class SleepOverlay:
+    """Fullscreen sleep screen: title, message and either the image bar or a plain bar."""
+    def __init__(self, parent, title, message, light, bar_texture=None,
+                 bar_scale=(1, 0.06), bar_half=(1.2, 0.018), bar_margin=0.02):
+        from direct.gui.DirectGui import DirectFrame, DirectLabel
+        bg, txt = ((0.98, 0.96, 0.92, 0.96), (0, 0, 0, 1)) if light else ((0, 0, 0, 0.92), (1, 1, 1, 1))
+        self.frame = DirectFrame(parent=parent, frameColor=bg,
+                                 frameSize=(-1.5, 1.5, -1.1, 1.1), pos=(0,0,0))
+        # Fuerza a estar arriba por si no ocultas algo
+        self.frame.setBin("fixed", 100)
+        DirectLabel(parent=self.frame, text=title, scale=0.065, pos=(0,0,0.45),
+                    frameColor=(0,0,0,0), text_fg=txt, text_align=TextNode.ACenter)
+        DirectLabel(parent=self.frame, text=message, scale=0.05, pos=(0,0,0.2),
+                    frameColor=(0,0,0,0), text_fg=txt, text_align=TextNode.ACenter)
+        self.img = self.back = self.bar = None
+        self.bar_half, self.bar_margin = bar_half, bar_margin
+        if bar_texture is not None:
+            self.img = OnscreenImage(parent=self.frame, image=bar_texture)
+            self.img.setTransparency(TransparencyAttrib.M_alpha)
+            self.img.setScale(bar_scale[0], 1, bar_scale[1])
+            self.img.setPos(0, 0, -0.25)
+        else:
+            hw, hh = bar_half
+            self.back = DirectFrame(parent=self.frame, frameColor=(0,0,0,0.15 if light else 0.25),
+                                    frameSize=(-hw, hw, -hh, hh), pos=(0,0,-0.25))
+            self.bar = DirectFrame(parent=self.frame, frameColor=(0.2,0.5,1,0.9),
+                                   frameSize=(-hw + bar_margin, -hw + bar_margin, -hh * 0.75, hh * 0.75),
+                                   pos=(0,0,-0.25))
+        self.frame.hide()
+
+    def set_fill(self, t):
+        """Plain bar fill 0..1 (no-op with the image bar)."""
+        if self.bar is None:
+            return
+        hw, hh = self.bar_half
+        left  = -hw + self.bar_margin
+        width = (hw * 2) - (self.bar_margin * 2)
+        self.bar["frameSize"] = (left, left + width * t, -hh * 0.75, hh * 0.75)
+
+    def show(self):
+        self.frame.show()
+        return self
+
+    def hide(self):
+        self.frame.hide()
+
+class ProgressOverlay:
+    """Small box with a label and a 0..1 bar (e.g. "Loading Cupola...")."""
+    def __init__(self, parent, text):
+        from direct.gui.DirectGui import DirectFrame, DirectLabel
+        self.frame = DirectFrame(parent=parent, frameColor=(0,0,0,0.75),
+                                 frameSize=(-0.6, 0.6, -0.12, 0.12), pos=(0,0,0))
+        self.label = DirectLabel(parent=self.frame, text=text, scale=0.06, pos=(0,0,0.02),
+                                 frameColor=(0,0,0,0))
+        self.bar = DirectFrame(parent=self.frame, frameColor=(0.2,0.5,1,0.9),
+                               frameSize=(-0.5, -0.5, -0.012, 0.012), pos=(0,0,-0.06))
+        self.frame.hide()
+
+    def set_progress(self, t, text=None):
+        self.bar["frameSize"] = (-0.5, -0.5 + t, -0.012, 0.012)
+        if text is not None and text != self.label["text"]:
+            self.label["text"] = text
+
+    def show(self):
+        self.set_progress(0.0)
+        self.frame.show()
+        return self
+
+    def hide(self):
+        self.frame.hide()
+
+class WidgetPool:
+    """
+    name -> widget, built by its factory on first get() (or in prebuild()).
+    Widgets stay parented under `parent` and are hidden when not in use.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.factories = {}
+        self.widgets = {}
+
+    def register(self, name, factory):
+        """factory(parent) -> widget with show()/hide() (or a NodePath)."""
+        self.factories[name] = factory
+
+    def get(self, name):
+        w = self.widgets.get(name)
+        if w is None:
+            w = self.widgets[name] = self.factories[name](self.parent)
+        return w
+
+    def prebuild(self, names=None):
+        for name in (self.factories if names is None else names):
+            self.get(name)
+
+    def discard(self, name):
+        """Destroy a built widget; the next get() builds it again."""
+        w = self.widgets.pop(name, None)
+        if w is not None:
+            (w.frame if hasattr(w, "frame") else w).destroy()
+
+    def destroy(self):
+        for name in list(self.widgets):
+            self.discard(name)
+
+def make_hint(parent, pos):
+    """Editor hint label (text is set by the caller)."""
+    from direct.gui.DirectGui import DirectLabel
+    lbl = DirectLabel(parent=parent, text="", scale=0.045, frameColor=(0,0,0,0.6), pos=pos)
+    lbl.hide()
+    return lbl
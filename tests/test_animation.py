@@ -0,0 +1,73 @@
+# AnimationDriver: every playing sprite shows the frame its own start time
+# implies, groups share the work, and nodes are only touched on a change.
+import random
+from animation import AnimationDriver, Flipbook
+
+class Atlas:
+    """Records what each node shows (stand-in for textures.Atlas)."""
+    def __init__(self):
+        self.shown, self.applies = {}, 0
+    def apply(self, nodepath, frame):
+        self.shown[nodepath] = frame
+        self.applies += 1
+
+def test_frames_follow_the_clock():
+    atlas = Atlas()
+    fb = Flipbook(atlas, [10, 11, 12], frame_time=0.125)
+    drv = AnimationDriver()
+    drv.advance(0.3125)
+    track = drv.add("a", fb, playing=True)
+    assert atlas.shown["a"] == 10
+    seen = []
+    for _ in range(8):
+        drv.advance(0.0625)
+        seen.append(atlas.shown["a"])
+    # started at t=0.3125 (slot 2): the next frame at t=0.375, then every 0.125
+    assert seen == [11, 11, 12, 12, 10, 10, 11, 11]
+    track.stop()
+    assert atlas.shown["a"] == 10 and not track.playing and not drv.groups
+
+def test_sprites_started_together_share_a_group():
+    atlas = Atlas()
+    fb = Flipbook(atlas, [0, 1, 2, 3], frame_time=0.1)
+    drv = AnimationDriver()
+    tracks = [drv.add(f"n{i}", fb, playing=True) for i in range(50)]
+    assert len(drv.groups) == 1
+    atlas.applies = 0
+    for _ in range(6):
+        drv.advance(0.02)            # 0.12 s: one frame change
+    assert atlas.applies == 50
+    drv.remove(tracks[0])
+    assert atlas.shown["n0"] == 1    # removed: left as it was, no rest frame
+
+def test_batches_get_the_clock():
+    drv, times = AnimationDriver(), []
+    drv.add_batch(times.append)
+    drv.advance(0.5)
+    drv.remove_batch(times.append)
+    drv.advance(0.5)
+    assert times == [0.0, 0.5]
+
+def test_random_play_stop_matches_start_times():
+    rnd = random.Random(3)
+    atlas = Atlas()
+    books = [Flipbook(atlas, list(range(k * 10, k * 10 + n)), ft)
+             for k, (n, ft) in enumerate([(4, 0.12), (6, 0.05), (1, 0.2)])]
+    drv = AnimationDriver()
+    tracks = [drv.add(f"s{i}", rnd.choice(books)) for i in range(40)]
+    started = {}
+    for _ in range(600):
+        t = rnd.choice(tracks)
+        if rnd.random() < 0.1:
+            if t.playing:
+                t.stop(); started.pop(t.nodepath)
+            else:
+                t.play(); started[t.nodepath] = int(drv.time / t.flipbook.frame_time)
+        drv.advance(rnd.choice((1 / 60, 1 / 30, 0.1)))
+        for t in tracks:
+            fb = t.flipbook
+            if t.playing:
+                k = int(drv.time / fb.frame_time) - started[t.nodepath]
+                assert atlas.shown[t.nodepath] == fb.frames[k % len(fb)]
+            else:
+                assert atlas.shown[t.nodepath] == fb.frames[0]
@@ -0,0 +1,48 @@
+# Wall bake: bitmap packing round trip, merged rects covering exactly the
+# wall cells, and the committed bake still matching level_map.WALLS.
+import os, random
+import pytest
+import bake_walls
+from bake_walls import from_rects, merge_rects, _pack, _unpack
+from spatial import OccupancyGrid
+from level_map import WALLS, WALLS_BAKED, WALLS_BAKED_CELL
+from sim import MAP_BOUNDS
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+@pytest.mark.parametrize("n", [1, 7, 8, 9, 1000, 240 * 200])
+def test_pack_round_trip(n):
+    rnd = random.Random(n)
+    bits = bytearray(rnd.random() < 0.3 for _ in range(n))
+    assert _unpack(_pack(bits), n) == bits
+
+def random_grid(seed, bounds=(-1.2, 1.2, -1.0, 1.0), cell=0.02):
+    rnd = random.Random(seed)
+    grid = OccupancyGrid(bounds, cell)
+    for _ in range(rnd.randint(0, 40)):
+        grid.paint(rnd.uniform(-1.2, 1.2), rnd.uniform(-1.0, 1.0), rnd.uniform(0.0, 0.6), rnd.uniform(0.0, 0.6))
+    return grid
+
+@pytest.mark.parametrize("seed", range(6))
+def test_merged_rects_cover_exactly(seed):
+    grid = random_grid(seed)
+    rects = merge_rects(grid)
+    # Same cells, and as many cells as the rects' total area: no two overlap
+    assert from_rects(rects, grid.bounds, grid.cell).bits == grid.bits
+    assert sum(round(w * h / grid.cell ** 2) for _, _, w, h in rects) == sum(grid.bits)
+
+def test_save_load_round_trip(tmp_path):
+    grid = random_grid(99)
+    rects = merge_rects(grid)
+    path = str(tmp_path / "level.walls.json")
+    bake_walls.save(path, grid, rects, "test", "k")
+    loaded, loaded_rects, meta = bake_walls.load(path)
+    assert loaded.bits == grid.bits and (loaded.nx, loaded.nz) == (grid.nx, grid.nz)
+    assert loaded_rects == rects
+    assert meta == {"source": "test", "key": "k"}
+
+def test_committed_bake_matches_walls():
+    res = bake_walls.load_level(os.path.join(ROOT, WALLS_BAKED), WALLS, MAP_BOUNDS, WALLS_BAKED_CELL)
+    assert res is not None, "re-run python levels/bake_walls.py"
+    grid, _ = res
+    assert grid.bits == from_rects(WALLS, MAP_BOUNDS, WALLS_BAKED_CELL).bits
@@ -0,0 +1,48 @@
+# QuadBatch slots: stable ids, freed slots reused in place (the vertex data
+# never grows past the peak), hidden/free quads drawn as nothing.
+import pytest
+
+pytest.importorskip("panda3d")
+from panda3d.core import NodePath, GeomVertexReader
+from batch2d import QuadBatch
+
+def corners(batch, slot):
+    r = GeomVertexReader(batch.vdata, "vertex")
+    r.setRow(slot * 4)
+    return [tuple(round(c, 6) for c in r.getData3()) for _ in range(4)]
+
+def color(batch, slot):
+    r = GeomVertexReader(batch.vdata, "color")
+    r.setRow(slot * 4)
+    return tuple(round(c * 255) for c in r.getData4())   # v3c4: 8-bit colour
+
+def test_add_writes_the_rect():
+    b = QuadBatch(NodePath("root"))
+    s = b.add(0.5, -0.25, 0.2, 0.1, color=(1, 0, 0, 0.5))
+    assert corners(b, s) == [(0.4, 0, -0.3), (0.6, 0, -0.3), (0.6, 0, -0.2), (0.4, 0, -0.2)]
+    assert color(b, s) == (255, 0, 0, 127)
+    b.set_rect(s, 0.0, 0.0, 0.5, 0.5)
+    assert corners(b, s)[0] == (-0.25, 0, -0.25)
+    assert color(b, s) == (255, 0, 0, 127)    # geometry edits keep the colour
+
+def test_free_slots_are_reused():
+    b = QuadBatch(NodePath("root"))
+    slots = [b.add(i * 0.1, 0, 0.05, 0.05) for i in range(10)]
+    rows, tris = b.vdata.getNumRows(), b.geom.getPrimitive(0).getNumPrimitives()
+    b.remove(slots[3]); b.remove(slots[7])
+    assert len(b) == 8
+    assert corners(b, slots[3]) == [(0, 0, 0)] * 4   # degenerate: draws nothing
+    again = {b.add(1.0, 1.0, 0.1, 0.1, color=(0, 1, 0, 1)), b.add(1.0, 1.0, 0.1, 0.1)}
+    assert again == {3, 7} and len(b) == 10
+    assert (b.vdata.getNumRows(), b.geom.getPrimitive(0).getNumPrimitives()) == (rows, tris)
+    assert b.add(0, 0, 0.1, 0.1) == 10 and b.vdata.getNumRows() == rows + 4
+
+def test_hidden_quads_keep_their_rect():
+    b = QuadBatch(NodePath("root"))
+    s = b.add(0.2, 0.2, 0.1, 0.1)
+    shown = corners(b, s)
+    b.set_visible(s, False)
+    assert corners(b, s) == [(0, 0, 0)] * 4
+    b.set_color(s, (0, 0, 1, 1))
+    b.set_visible(s, True)
+    assert corners(b, s) == shown and color(b, s) == (0, 0, 255, 255)
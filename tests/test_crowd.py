@@ -0,0 +1,47 @@
+# Crowd wall buckets, kept up to date across edits, must block exactly like
+# a test against every wall; a packed map spawns fewer agents, never raises.
+import random
+import pytest
+
+numpy = pytest.importorskip("numpy")
+pytest.importorskip("panda3d")
+from crowd import CrowdSim
+
+BOUNDS = (-1.2, 1.2, -1.0, 1.0)
+
+def blocked_all(half, walls, x, z):
+    w = numpy.array([(d["x"], d["z"], d["w"], d["h"]) for d in walls]).reshape(-1, 4)
+    return ((numpy.abs(x[:, None] - w[None, :, 0]) < w[None, :, 2] * 0.5 + half)
+            & (numpy.abs(z[:, None] - w[None, :, 1]) < w[None, :, 3] * 0.5 + half)).any(axis=1)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_buckets_follow_edits(seed):
+    rnd, rng = random.Random(seed), numpy.random.default_rng(seed)
+    crowd = CrowdSim(10, BOUNDS)
+    walls, next_id = [], 0
+    for version in range(150):
+        op = rnd.random()
+        if op < 0.4 or not walls:
+            walls.append({"x": rnd.uniform(-1.4, 1.4), "z": rnd.uniform(-1.2, 1.2),
+                          "w": rnd.uniform(0.01, 0.6), "h": rnd.uniform(0.01, 0.6), "id": next_id})
+            next_id += 1
+        elif op < 0.6:
+            walls.pop(rnd.randrange(len(walls)))
+        else:
+            w = rnd.choice(walls)
+            w["x"] += rnd.uniform(-0.2, 0.2)
+            w["h"] = rnd.uniform(0.01, 0.6)
+        crowd.set_walls(walls, version)
+        x, z = rng.uniform(-1.2, 1.2, 300), rng.uniform(-1.0, 1.0, 300)
+        expected = blocked_all(crowd.half, walls, x, z) if walls else numpy.zeros(300, dtype=bool)
+        assert (crowd._blocked(x, z) == expected).all()
+
+def test_packed_map_spawns_what_fits():
+    rnd = random.Random(7)
+    crowd = CrowdSim(400, BOUNDS, seed=3)
+    crowd.set_walls([(rnd.uniform(-1.2, 1.2), rnd.uniform(-1.0, 1.0), 0.15, 0.15) for _ in range(516)])
+    crowd.spawn()
+    assert 0 < crowd.n < 400 and len(crowd.pos) == crowd.n
+    for _ in range(120):
+        crowd.step(1.0 / 60.0)
+    assert not crowd._blocked(crowd.pos[:, 0], crowd.pos[:, 1]).any()
@@ -0,0 +1,62 @@
+# Flow fields repaired after wall edits must match a field built from scratch.
+import random
+import pytest
+from nav import NavGrid, INF
+from level_map import WALLS, TRIGGER_CENTER, SLEEP_TRIGGER_CENTER
+from sim import MAP_BOUNDS
+
+GOALS = {"cupola": TRIGGER_CENTER, "sleep": SLEEP_TRIGGER_CENTER}
+
+def rebuilt(walls):
+    grid = NavGrid(MAP_BOUNDS)
+    for w in walls:
+        grid.add_wall(w)
+    for name, goal in GOALS.items():
+        grid.set_goal(name, *goal)
+    return grid
+
+def same_field(a, b):
+    return all(x == y or abs(x - y) <= 1e-9 for x, y in zip(a.dist, b.dist))
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_repair_matches_rebuild(seed):
+    rnd = random.Random(seed)
+    walls = [{"x": x, "z": z, "w": w, "h": h, "id": i} for i, (x, z, w, h) in enumerate(WALLS)]
+    grid = rebuilt(walls)
+    for name in GOALS:
+        grid.flow(name)
+    next_id = len(walls)
+    for _ in range(25):
+        op = rnd.random()
+        if op < 0.35 or not walls:
+            w = {"x": rnd.uniform(-1, 1), "z": rnd.uniform(-0.9, 0.9),
+                 "w": rnd.uniform(0.02, 0.3), "h": rnd.uniform(0.02, 0.3), "id": next_id}
+            next_id += 1
+            walls.append(w)
+            grid.add_wall(w)
+        elif op < 0.6:
+            grid.remove_wall(walls.pop(rnd.randrange(len(walls))))
+        else:
+            w = rnd.choice(walls)
+            w["x"] += rnd.choice((-0.04, 0.04))
+            w["w"] = max(0.02, w["w"] + rnd.choice((0.0, 0.04, -0.04)))
+            grid.update_wall(w)
+        ref = rebuilt(walls)
+        assert grid.cover == ref.cover
+        for name in GOALS:
+            assert same_field(grid.flow(name), ref.flow(name)), name
+
+def test_unreachable_stays_unreachable():
+    # A wall boxing the goal in: nothing but the enclosed pocket reaches it
+    grid = rebuilt([])
+    field = grid.flow("cupola")
+    gx, gz = TRIGGER_CENTER
+    ring = [{"x": gx, "z": gz + 0.3, "w": 0.8, "h": 0.05, "id": 0},
+            {"x": gx, "z": gz - 0.3, "w": 0.8, "h": 0.05, "id": 1},
+            {"x": gx - 0.4, "z": gz, "w": 0.05, "h": 0.65, "id": 2},
+            {"x": gx + 0.4, "z": gz, "w": 0.05, "h": 0.65, "id": 3}]
+    for w in ring:
+        grid.add_wall(w)
+    assert field.distance(-1.1, -0.9) == INF
+    assert field.distance(gx, gz) < INF
+    assert same_field(field, rebuilt(ring).flow("cupola"))
@@ -0,0 +1,116 @@
+# Delta snapshots and client prediction, without sockets: frames go through
+# in-memory writers, the server ticks by hand.
+import random
+from collections import deque
+import net
+from net import (GameServer, GameClient, encode_delta, decode_delta, _Peer,
+                 C_INPUT, S_SNAP, _FRAME, _INPUT)
+from sim import make_default_sim
+
+def random_entity(rnd):
+    return (rnd.uniform(-1, 1), rnd.uniform(-1, 1), rnd.choice((-1, 1)), rnd.randrange(11),
+            net._FIELD[4].unpack(net._FIELD[4].pack(rnd.uniform(0, 3)))[0], rnd.randrange(16))
+
+def test_delta_round_trip():
+    rnd = random.Random(4)
+    base = {}
+    for _ in range(300):
+        cur = dict(base)
+        for pid in list(cur):
+            r = rnd.random()
+            if r < 0.1:
+                del cur[pid]
+            elif r < 0.5:
+                ent, i = list(cur[pid]), rnd.randrange(6)
+                ent[i] = random_entity(rnd)[i]
+                cur[pid] = tuple(ent)
+        for _ in range(rnd.randint(0, 3)):
+            cur[rnd.randrange(1, 500)] = random_entity(rnd)
+        assert decode_delta(base, encode_delta(base, cur)) == cur
+        assert decode_delta({}, encode_delta({}, cur)) == cur
+        base = cur
+
+def test_delta_sends_only_changes():
+    ent = (0.5, -0.25, 1, 10, 0.0, 0)
+    assert encode_delta({7: ent}, {7: ent}) == b"\x00\x00\x00\x00"
+    moved = (0.75,) + ent[1:]
+    body = encode_delta({7: ent}, {7: moved})
+    assert len(body) == 2 + net._EHEAD.size + 8 + 2      # one f64 field
+    assert decode_delta({7: ent}, body) == {7: moved}
+
+class Pipe:
+    """Writer stand-in: collects frames, never backs up."""
+    def __init__(self):
+        self.frames, self.transport = deque(), self
+    def get_write_buffer_size(self):
+        return 0
+    def write(self, data):
+        while data:
+            size, kind = _FRAME.unpack_from(data)
+            self.frames.append((kind, data[_FRAME.size:_FRAME.size + size]))
+            data = data[_FRAME.size + size:]
+    def close(self):
+        pass
+
+def session():
+    server = GameServer(tick_rate=60.0, snapshot_rate=20.0)
+    to_server = Pipe()
+    client = GameClient(make_default_sim())
+    client.writer, client.connected, client.dt, client.id = to_server, True, 1.0 / 60.0, 1
+    peer = _Peer(1, make_default_sim(world=server.world), Pipe(), 120)
+    server.peers[1] = peer
+    return server, client, peer, to_server
+
+def run(server, client, peer, to_server, keys, latency=3):
+    """
+    Client ticks with `keys`, then only the server runs until everything has
+    landed; inputs and snapshots arrive `latency` ticks late.
+    """
+    in_flight, snaps_in_flight = deque(), deque()
+    for tick in range(len(keys) + 4 * latency + 6):
+        if tick < len(keys):
+            client.step(keys[tick])
+        while to_server.frames:
+            in_flight.append((tick + latency, to_server.frames.popleft()))
+        while in_flight and in_flight[0][0] <= tick:
+            _, (kind, payload) = in_flight.popleft()
+            assert kind == C_INPUT
+            seq, ack, mask, actions = _INPUT.unpack(payload)
+            peer.inputs.append((seq, mask, actions)); peer.queued = seq
+            if ack in server.snaps: peer.acked = max(peer.acked, ack)
+        server.tick()
+        if server.ticks % 3 == 0:
+            server.broadcast()
+        while peer.writer.frames:
+            snaps_in_flight.append((tick + latency, peer.writer.frames.popleft()))
+        while snaps_in_flight and snaps_in_flight[0][0] <= tick:
+            _, (kind, payload) = snaps_in_flight.popleft()
+            assert kind == S_SNAP
+            client._on_snapshot(payload)
+
+def walk(n, seed):
+    rnd = random.Random(seed)
+    keys, cur = [], {}
+    for i in range(n):
+        if i % 20 == 0:
+            cur = {k: rnd.random() < 0.35 for k in ("w", "a", "s", "d")}
+        keys.append(cur)
+    return keys
+
+def test_prediction_matches_server():
+    server, client, peer, pipe = session()
+    run(server, client, peer, pipe, walk(400, 1))
+    assert client.corrections == 0
+    assert (client.sim.x, client.sim.z) == (peer.sim.x, peer.sim.z)
+    assert not client.pending and peer.last_seq == client.seq
+
+def test_reconcile_corrects_a_misprediction():
+    # The server has a wall the client doesn't know about: the client walks
+    # through it locally, then snaps back to where the server stopped it
+    server, client, peer, pipe = session()
+    s = client.sim
+    server.world.add_wall(s.x + 0.25, s.z, 0.05, 0.6)
+    run(server, client, peer, pipe, [{"d": True}] * 90)
+    assert client.corrections > 0
+    assert (s.x, s.z) == (peer.sim.x, peer.sim.z)
+    assert s.x < server.world.walls[-1]["x"]
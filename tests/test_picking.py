@@ -0,0 +1,97 @@
+# Picking without a traverser: the BVH must find the same nearest part as
+# testing every part, the oriented-box test must agree with the slab test
+# in the box's own frame, and the sphere picker's two paths must agree.
+import math, random
+import pytest
+import picking
+from picking import INF, build_bvh, bvh_raycast, ray_aabb, ray_obb, SpherePicker
+
+def rotation(rnd):
+    """Random orthonormal rows (a rotation) from a random unit quaternion."""
+    w, x, y, z = (rnd.gauss(0, 1) for _ in range(4))
+    n = math.sqrt(w * w + x * x + y * y + z * z)
+    w, x, y, z = w / n, x / n, y / n, z / n
+    return [[1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+            [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+            [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)]]
+
+def random_ray(rnd):
+    o = tuple(rnd.uniform(-6, 6) for _ in range(3))
+    target = tuple(rnd.uniform(-3, 3) for _ in range(3))
+    d = tuple(t - a for t, a in zip(target, o))
+    n = math.sqrt(sum(c * c for c in d))
+    return o, tuple(c / n for c in d)
+
+def random_part(rnd, k):
+    c = [rnd.uniform(-3, 3) for _ in range(3)]
+    half = [rnd.uniform(0.05, 0.6) for _ in range(3)]
+    axes = rotation(rnd)
+    obb = {"center": c, "axes": axes, "half": half} if rnd.random() < 0.7 else None
+    # AABB of the (oriented) box, as proxy_box/getTightBounds give it
+    ext = [sum(abs(axes[i][a]) * half[i] for i in range(3)) if obb else half[a] for a in range(3)]
+    return (tuple(c[a] - ext[a] for a in range(3)), tuple(c[a] + ext[a] for a in range(3)), k, obb)
+
+def hit(item, o, d):
+    bmin, bmax, _, obb = item
+    inv = tuple((1.0 / c) if c != 0 else INF for c in d)
+    t = ray_obb(o, d, obb) if obb is not None else ray_aabb(o, inv, bmin, bmax)
+    return INF if t is None else t
+
+def brute(items, o, d):
+    t, payload = min(((hit(it, o, d), it[2]) for it in items), default=(INF, None))
+    return (t, payload) if t < INF else (INF, None)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bvh_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    items = [random_part(rnd, k) for k in range(rnd.randint(1, 120))]
+    root = build_bvh(items, leaf_size=rnd.choice((1, 4, 8)))
+    hits = 0
+    for _ in range(400):
+        o, d = random_ray(rnd)
+        t, p = bvh_raycast(root, o, d)
+        bt, bp = brute(items, o, d)
+        assert t == pytest.approx(bt, abs=1e-9)
+        if p != bp:                        # a tie (e.g. origin inside two parts)
+            assert hit(items[p], o, d) == pytest.approx(bt, abs=1e-9)
+        hits += p is not None
+    assert hits > 50
+
+def test_obb_is_the_slab_test_in_box_frame():
+    rnd = random.Random(9)
+    for _ in range(500):
+        axes = rotation(rnd)
+        half = [rnd.uniform(0.1, 1.0) for _ in range(3)]
+        box = {"center": [0.0, 0.0, 0.0], "axes": axes, "half": half}
+        lo, ld = random_ray(rnd)           # ray in the box frame...
+        # ...and the same ray in world space (rows of axes are the box axes)
+        o = tuple(sum(lo[i] * axes[i][a] for i in range(3)) for a in range(3))
+        d = tuple(sum(ld[i] * axes[i][a] for i in range(3)) for a in range(3))
+        inv = tuple((1.0 / c) if c != 0 else INF for c in ld)
+        want = ray_aabb(lo, inv, tuple(-h for h in half), half)
+        got = ray_obb(o, d, box)
+        assert (got is None) == (want is None)
+        if got is not None:
+            assert got == pytest.approx(want, abs=1e-9)
+
+def test_obb_is_tighter_than_its_aabb():
+    # A thin slab at 45 degrees: the AABB corner is empty space
+    s = math.sqrt(0.5)
+    box = {"center": [0, 0, 0], "axes": [[s, s, 0], [-s, s, 0], [0, 0, 1]], "half": [1.0, 0.05, 1.0]}
+    inv = (INF, INF, -1.0)
+    assert ray_aabb((0.6, -0.6, 5), inv, (-0.75, -0.75, -1), (0.75, 0.75, 1)) is not None
+    assert ray_obb((0.6, -0.6, 5), (0, 0, -1), box) is None
+    assert ray_obb((0.6, 0.6, 5), (0, 0, -1), box) == pytest.approx(4.0)
+
+@pytest.mark.skipif(picking.numpy is None, reason="needs NumPy for the vectorized path")
+def test_sphere_picker_paths_agree(monkeypatch):
+    rnd = random.Random(2)
+    sp = SpherePicker()
+    for k in range(200):
+        sp.add([rnd.uniform(-3, 3) for _ in range(3)], rnd.uniform(0.05, 0.4), k)
+    rays = [random_ray(rnd) for _ in range(300)]
+    vec = [sp.raycast(o, d) for o, d in rays]
+    monkeypatch.setattr(picking, "numpy", None)
+    loop = [sp.raycast(o, d) for o, d in rays]
+    assert [p for _, p in vec] == [p for _, p in loop]
+    assert all(a == pytest.approx(b) for (a, _), (b, _) in zip(vec, loop) if a < INF)
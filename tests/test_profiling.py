@@ -0,0 +1,103 @@
+# Profiler: re-entered scopes are timed once, and the CSV/JSONL export
+# writes one row per scope, rotating at the row cap across sessions.
+import csv, json
+import profiling
+from profiling import Profiler
+
+class Clock:
+    """Stands in for the time module: perf_counter steps by hand."""
+    def __init__(self):
+        self.t = 0.0
+    def perf_counter(self):
+        return self.t
+    def time(self):
+        return 1000.0 + self.t
+
+def make(monkeypatch, **cfg):
+    clock = Clock()
+    monkeypatch.setattr(profiling, "time", clock)
+    prof = Profiler()
+    prof.configure(enabled=True, **cfg)
+    return prof, clock
+
+def frame(prof, clock, names=("a", "b")):
+    for name in names:
+        with prof.scope(name):
+            clock.t += 0.002
+    prof.end_frame()
+
+def test_nested_same_scope_counts_outer_span(monkeypatch):
+    prof, clock = make(monkeypatch)
+    with prof.scope("walk"):
+        clock.t += 1.0
+        with prof.scope("walk"):
+            clock.t += 2.0
+            with prof.scope("walk"):
+                clock.t += 3.0
+        clock.t += 4.0
+    with prof.scope("walk"):             # the stack is empty again
+        clock.t += 0.5
+    prof.end_frame()
+    assert prof.totals()["walk"] == (10.5, 4)
+    assert prof.stats()["walk"] == (10500.0, 10500.0)
+
+def test_scope_unwinds_on_exception(monkeypatch):
+    prof, clock = make(monkeypatch)
+    try:
+        with prof.scope("x"):
+            clock.t += 1.0
+            raise KeyError
+    except KeyError:
+        pass
+    with prof.scope("x"):
+        clock.t += 1.0
+    prof.end_frame()
+    assert prof.totals()["x"] == (2.0, 2)
+
+def test_csv_export(monkeypatch, tmp_path):
+    path = tmp_path / "prof.csv"
+    prof, clock = make(monkeypatch, export_path=str(path), export_every=2)
+    for _ in range(4):
+        frame(prof, clock)
+    prof.close()
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == Profiler.FIELDS
+    assert [(r[1], r[2], r[5]) for r in rows[1:]] == [
+        ("2", "a", "2"), ("2", "b", "2"), ("4", "a", "4"), ("4", "b", "4")]
+    assert all(float(r[3]) == 2.0 and float(r[4]) == 2.0 for r in rows[1:])
+
+def test_jsonl_export(monkeypatch, tmp_path):
+    path = tmp_path / "prof.jsonl"
+    prof, clock = make(monkeypatch, export_path=str(path), export_every=1)
+    frame(prof, clock, names=("collision",))
+    frame(prof, clock, names=("collision",))
+    prof.close()
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [tuple(r) for r in rows] == [Profiler.FIELDS] * 2
+    assert [(r["frame"], r["scope"], r["calls"]) for r in rows] == [
+        (1, "collision", 1), (2, "collision", 2)]
+
+def test_rotation_counts_rows_from_earlier_sessions(monkeypatch, tmp_path):
+    path = tmp_path / "prof.csv"
+    prof, clock = make(monkeypatch, export_path=str(path), export_every=1, export_max_rows=4)
+    frame(prof, clock); frame(prof, clock)          # 4 rows: at the cap
+    prof.close()
+    assert not (tmp_path / "prof.csv.1").exists()
+    # A later session appends to the same file: the cap is per file
+    prof, clock = make(monkeypatch, export_path=str(path), export_every=1, export_max_rows=4)
+    frame(prof, clock)
+    prof.close()
+    old = (tmp_path / "prof.csv.1").read_text().splitlines()
+    new = path.read_text().splitlines()
+    assert old[0] == new[0] == ",".join(Profiler.FIELDS)
+    assert len(old) == 1 + 4 and len(new) == 1 + 2
+
+def test_disabled_profiler_does_nothing(tmp_path):
+    path = tmp_path / "prof.csv"
+    prof = Profiler()
+    prof.configure(export_path=str(path), export_every=1)
+    with prof.scope("a"):
+        pass
+    prof.end_frame()
+    assert prof.scopes == {} and prof.frames == 0 and not path.exists()
@@ -0,0 +1,85 @@
+# Session files: what InputRecorder writes, InputReplay reads back bit for
+# bit; damaged files fail with ValueError only.
+import random
+import pytest
+from replay import (InputRecorder, InputReplay, R_KEYS, R_ACTION, R_POSE, R_CLICK,
+                    keys_mask, ACTIONS)
+
+def record(path):
+    rec = InputRecorder(path, 60, (0.2, -0.5), 10)
+    rec.keys(0, {"d": True})
+    rec.keys(1, {"d": True})                 # unchanged: not written
+    rec.keys(5, {"w": True, "space": True})
+    rec.action(7, "_on_cupola_no")
+    pose = (8.123456789012345, 30.1, 20.000000000000004, 0.1, -0.2, 0.3)
+    rec.camera(9, pose)
+    rec.camera(10, pose)                     # unchanged: not written
+    rec.click(11, 0.25, -0.5)
+    rec.events(12, [("trigger_enter", "cupola"), ("energy", 9)])
+    rec.check(12, 0.30000000000000004, -0.485, 9)
+    rec.close(20, 0.4, -0.4, 9)
+    return pose
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "s.issr")
+    pose = record(path)
+    r = InputReplay(path)
+    assert (r.tick_rate, r.start_pos, r.start_energy, r.end_tick) == (60, (0.2, -0.5), 10, 20)
+    assert r.inputs_at(0) == [(R_KEYS, (keys_mask({"d": True}),))]
+    assert r.inputs_at(1) == ()
+    assert r.inputs_at(5) == [(R_KEYS, (keys_mask({"w": True, "space": True}),))]
+    assert r.inputs_at(7) == [(R_ACTION, (ACTIONS.index("_on_cupola_no"),))]
+    assert r.inputs_at(9) == [(R_POSE, pose)]        # doubles: exact
+    assert r.inputs_at(10) == ()
+    assert r.inputs_at(11) == [(R_CLICK, (0.25, -0.5))]
+    assert r.expect_events[12] == [("trigger_enter", "cupola"), ("energy", "9")]
+    assert r.done(20) and not r.done(19)
+
+def test_verify_reports_desyncs(tmp_path):
+    path = str(tmp_path / "s.issr")
+    record(path)
+    r = InputReplay(path)
+    r.verify_events(12, [("trigger_enter", "cupola"), ("energy", 9)])
+    r.verify_check(12, 0.30000000000000004, -0.485, 9)
+    r.verify_check(20, 0.4, -0.4, 9)
+    assert r.mismatches == [] and r.checks_passed == 2 and r.events_checked == 2
+    r.verify_check(12, 0.3, -0.485, 9)               # one ulp off is a desync
+    r.verify_events(13, [("energy", 8)])
+    assert [m[:2] for m in r.mismatches] == [(12, "state"), (13, "events")]
+    assert "2 mismatches" in r.summary()
+
+def test_truncated_files_raise_value_error(tmp_path):
+    path = str(tmp_path / "s.issr")
+    record(path)
+    data = open(path, "rb").read()
+    bad = str(tmp_path / "bad.issr")
+    for n in range(len(data)):
+        with open(bad, "wb") as f:
+            f.write(data[:n])
+        try:
+            InputReplay(bad)
+        except ValueError:
+            pass
+
+def test_corrupt_bytes_raise_value_error(tmp_path):
+    path = str(tmp_path / "s.issr")
+    record(path)
+    data = bytearray(open(path, "rb").read())
+    rnd = random.Random(1)
+    bad = str(tmp_path / "bad.issr")
+    for _ in range(300):
+        d = bytearray(data)
+        for _ in range(rnd.randint(1, 4)):
+            d[rnd.randrange(len(d))] = rnd.randrange(256)
+        with open(bad, "wb") as f:
+            f.write(d)
+        try:
+            InputReplay(bad)
+        except ValueError:
+            pass
+
+def test_not_a_session(tmp_path):
+    path = tmp_path / "x.issr"
+    path.write_bytes(b"PNG\x00" + bytes(40))
+    with pytest.raises(ValueError):
+        InputReplay(str(path))
@@ -0,0 +1,36 @@
+# MapSim state hand-off (network snapshots, prediction): set_state() must
+# reschedule the energy timer without piling timers up in the walk clock.
+import pytest
+from sim import MapSim, ENERGY_STEP_SECONDS, ENERGY_MAX
+
+def wheel_size(wheel):
+    return sum(len(b) for b in wheel.slots)
+
+def test_set_state_keeps_wheel_bounded():
+    sim = MapSim(pos=(0.0, 0.0))
+    for k in range(12000):
+        sim.set_state((0.0, 0.0, 1, ENERGY_MAX, (k % 100) * 0.01, sim.scale))
+    assert wheel_size(sim.walk_clock) == 1
+    assert len(sim.walk_clock) == 1
+
+def test_set_state_round_trip():
+    a = MapSim(pos=(0.1, -0.2))
+    for _ in range(90):
+        a.step({"d": True}, 1.0 / 60.0)
+    b = MapSim()
+    b.set_state(a.get_state())
+    assert b.get_state() == a.get_state()
+    # Same inputs from here on: same ticks, including the next energy drop
+    drops = 0
+    for _ in range(int(ENERGY_STEP_SECONDS * 60) + 30):
+        ea = a.step({"w": True}, 1.0 / 60.0)
+        eb = b.step({"w": True}, 1.0 / 60.0)
+        assert eb == ea and b.get_state() == pytest.approx(a.get_state(), abs=1e-9)
+        drops += len(ea)
+    assert drops >= 1
+
+def test_restore_energy_keeps_one_timer():
+    sim = MapSim()
+    for _ in range(500):
+        sim.restore_energy()
+    assert wheel_size(sim.walk_clock) == 1
@@ -0,0 +1,64 @@
+# WallIndex (broadphase) must resolve exactly like the original linear loop
+# over the walls in list order, including chains of snaps into new cells.
+import random
+import pytest
+from spatial import WallIndex, aabb_overlap
+
+def linear_x(walls, tx, z, hx, hz):
+    for w in walls:
+        if abs(tx - w["x"]) < (hx + w["w"] * 0.5) and abs(z - w["z"]) < (hz + w["h"] * 0.5):
+            tx = w["x"] + hx + w["w"] * 0.5 if tx > w["x"] else w["x"] - (hx + w["w"] * 0.5)
+    return tx
+
+def linear_z(walls, x, tz, hx, hz):
+    for w in walls:
+        if abs(x - w["x"]) < (hx + w["w"] * 0.5) and abs(tz - w["z"]) < (hz + w["h"] * 0.5):
+            tz = w["z"] + hz + w["h"] * 0.5 if tz > w["z"] else w["z"] - (hz + w["h"] * 0.5)
+    return tz
+
+def random_walls(rnd, n):
+    return [{"x": rnd.uniform(-1.2, 1.2), "z": rnd.uniform(-1.0, 1.0),
+             "w": rnd.uniform(0.01, 0.5), "h": rnd.uniform(0.01, 0.5)} for _ in range(n)]
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("cell", [0.05, 0.25])
+def test_resolve_matches_linear(seed, cell):
+    rnd = random.Random(seed)
+    walls = random_walls(rnd, rnd.randint(1, 80))
+    index = WallIndex(cell)
+    for w in walls:
+        index.add(w)
+    for _ in range(400):
+        x, z = rnd.uniform(-1.2, 1.2), rnd.uniform(-1.0, 1.0)
+        hx, hz = rnd.uniform(0.02, 0.15), rnd.uniform(0.02, 0.15)
+        assert index.resolve_x(x, z, hx, hz) == linear_x(walls, x, z, hx, hz)
+        assert index.resolve_z(x, z, hx, hz) == linear_z(walls, x, z, hx, hz)
+
+def test_resolve_after_edits():
+    rnd = random.Random(42)
+    walls = random_walls(rnd, 40)
+    index = WallIndex()
+    for w in walls:
+        index.add(w)
+    for _ in range(100):
+        w = rnd.choice(walls)
+        if rnd.random() < 0.2:
+            walls.remove(w)
+            index.remove(w)
+        else:
+            w["x"] += rnd.uniform(-0.3, 0.3)
+            w["w"] = rnd.uniform(0.01, 0.5)
+            index.update(w)
+        x, z = rnd.uniform(-1.2, 1.2), rnd.uniform(-1.0, 1.0)
+        assert index.resolve_x(x, z, 0.05, 0.08) == linear_x(walls, x, z, 0.05, 0.08)
+        assert index.resolve_z(x, z, 0.05, 0.08) == linear_z(walls, x, z, 0.05, 0.08)
+
+def test_swept_never_tunnels():
+    # A fast move across a thin wall stops at its face instead of jumping it
+    index = WallIndex()
+    wall = {"x": 0.0, "z": 0.0, "w": 0.01, "h": 0.4}
+    index.add(wall)
+    hx = hz = 0.05
+    x = index.sweep_x(-0.5, 0.5, 0.0, hx, hz)
+    assert x == pytest.approx(-(hx + 0.005))
+    assert not aabb_overlap(x, 0.0, 2 * hx, 2 * hz, 0.0, 0.0, 0.01, 0.4)
@@ -0,0 +1,79 @@
+# TimerWheel must fire like a plain sorted list of deadlines: every due
+# timer once per advance, in (deadline, scheduling order), whatever the
+# number of times the clock wrapped the wheel.
+import random
+import pytest
+from timers import TimerWheel
+
+class Reference:
+    """Unbucketed model of the wheel's contract."""
+    def __init__(self):
+        self.now, self.seq, self.live = 0.0, 0, []
+
+    def at(self, deadline, name, interval=None):
+        self.seq += 1
+        self.live.append([deadline, self.seq, name, interval])
+
+    def cancel(self, name):
+        self.live = [t for t in self.live if t[2] != name]
+
+    def advance(self, dt):
+        self.now += dt
+        out = []
+        while True:
+            due = [t for t in self.live if t[0] <= self.now]
+            if not due:
+                return out
+            t = min(due, key=lambda t: (t[0], t[1]))
+            out.append(t[2])
+            if t[3]:
+                t[0] += t[3]
+            else:
+                self.live.remove(t)
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("slots", [4, 16, 256])
+def test_firing_order_across_wraps(seed, slots):
+    rnd = random.Random(seed)
+    wheel, ref = TimerWheel(resolution=0.1, slots=slots), Reference()
+    fired, handles = [], {}
+    for step in range(300):
+        op = rnd.random()
+        name = f"t{step}"
+        if op < 0.35:
+            # Up to several turns of the wheel ahead
+            deadline = wheel.now + rnd.choice((0.0, rnd.uniform(0, 0.1 * slots * 3)))
+            handles[name] = wheel.at(deadline, fired.append, name)
+            ref.at(deadline, name)
+        elif op < 0.45:
+            interval = rnd.uniform(0.05, 0.1 * slots)
+            handles[name] = wheel.every(interval, fired.append, name)
+            ref.at(wheel.now + interval, name, interval)
+        elif op < 0.55 and handles:
+            victim = rnd.choice(sorted(handles))
+            handles.pop(victim).cancel()
+            ref.cancel(victim)
+        dt = rnd.choice((0.0, 0.016, rnd.uniform(0, 0.1 * slots * 2.5)))
+        fired.clear()
+        wheel.advance(dt)
+        assert fired == ref.advance(dt), f"step {step}, now {wheel.now}"
+
+def test_scheduled_from_callback_same_advance():
+    wheel, fired = TimerWheel(resolution=0.1, slots=4), []
+    def first():
+        fired.append("first")
+        wheel.after(0.0, fired.append, "chained")
+        wheel.after(0.05, fired.append, "next tick")
+    wheel.at(1.0, first)
+    wheel.at(1.0, fired.append, "second")
+    wheel.advance(1.0)
+    assert fired == ["first", "second", "chained"]
+    wheel.advance(0.1)
+    assert fired[-1] == "next tick"
+
+def test_long_dt_fires_each_period():
+    wheel, fired = TimerWheel(resolution=0.1, slots=4), []
+    wheel.every(0.25, fired.append, "tick")
+    wheel.advance(10.0)          # 25 wheel turns in one advance
+    assert len(fired) == 40
+    assert len(wheel) == 1
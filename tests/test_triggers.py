@@ -0,0 +1,70 @@
+# TriggerRegistry edges: enter/exit once per crossing, in registration
+# order, stay handlers only while already inside; and the hashed lookup
+# agrees with testing every zone.
+import random
+from triggers import TriggerRegistry, EV_TRIGGER_ENTER, EV_TRIGGER_EXIT
+from spatial import aabb_overlap
+from sim import Zone
+
+def logging_registry(names_zones):
+    reg, log = TriggerRegistry(), []
+    for name, zone in names_zones:
+        reg.add(name, zone,
+                on_enter=lambda n, z: log.append(("enter", n)),
+                on_exit=lambda n, z: log.append(("exit", n)),
+                on_stay=lambda n, z: log.append(("stay", n)))
+    return reg, log
+
+def test_enter_stay_exit_order():
+    # "b" is registered first, so it leads every edge and stay list
+    reg, log = logging_registry([("b", Zone((0.1, 0.0), (0.4, 0.4))),
+                                 ("a", Zone((0.0, 0.0), (0.4, 0.4)))])
+    assert reg.update(-1.0, 0.0, 0.1, 0.1) == []
+    assert reg.update(0.05, 0.0, 0.1, 0.1) == [(EV_TRIGGER_ENTER, "b"), (EV_TRIGGER_ENTER, "a")]
+    assert log == [("enter", "b"), ("enter", "a")]
+    log.clear()
+    assert reg.update(0.06, 0.0, 0.1, 0.1) == []
+    assert log == [("stay", "b"), ("stay", "a")]
+    log.clear()
+    # Leave "a" only, then both
+    assert reg.update(0.27, 0.0, 0.1, 0.1) == [(EV_TRIGGER_EXIT, "a")]
+    assert log == [("exit", "a"), ("stay", "b")]
+    assert reg.is_inside("b") and not reg.is_inside("a")
+    log.clear()
+    assert reg.update(1.0, 0.0, 0.1, 0.1) == [(EV_TRIGGER_EXIT, "b")]
+    assert log == [("exit", "b")]
+
+def test_enter_and_exit_same_tick():
+    reg, log = logging_registry([("left", Zone((-0.3, 0.0), (0.2, 0.2))),
+                                 ("right", Zone((0.3, 0.0), (0.2, 0.2)))])
+    reg.update(-0.3, 0.0, 0.05, 0.05)
+    log.clear()
+    assert reg.update(0.3, 0.0, 0.05, 0.05) == [(EV_TRIGGER_ENTER, "right"), (EV_TRIGGER_EXIT, "left")]
+    assert log == [("enter", "right"), ("exit", "left")]
+
+def test_moved_and_removed_zones():
+    zone = Zone((0.0, 0.0), (0.2, 0.2))
+    reg, _ = logging_registry([("bed", zone)])
+    assert reg.update(0.0, 0.0, 0.05, 0.05) == [(EV_TRIGGER_ENTER, "bed")]
+    zone.x = 0.8                     # editor drag: the zone leaves the player
+    reg.moved("bed")
+    assert reg.update(0.0, 0.0, 0.05, 0.05) == [(EV_TRIGGER_EXIT, "bed")]
+    assert reg.update(0.8, 0.0, 0.05, 0.05) == [(EV_TRIGGER_ENTER, "bed")]
+    reg.remove("bed")
+    assert reg.update(0.8, 0.0, 0.05, 0.05) == [] and len(reg) == 0
+
+def test_hash_matches_every_zone():
+    rnd = random.Random(5)
+    zones = [(f"z{i}", Zone((rnd.uniform(-1, 1), rnd.uniform(-1, 1)), (rnd.uniform(0.02, 0.6), rnd.uniform(0.02, 0.6))))
+             for i in range(120)]
+    reg = TriggerRegistry(cell=0.1)
+    for name, zone in zones:
+        reg.add(name, zone)
+    inside = set()
+    for _ in range(500):
+        x, z = rnd.uniform(-1.2, 1.2), rnd.uniform(-1.0, 1.0)
+        now = {n for n, zn in zones if aabb_overlap(x, z, 0.15, 0.15, zn.x, zn.z, zn.w, zn.h)}
+        expected = ([(EV_TRIGGER_ENTER, n) for n, _ in zones if n in now - inside]
+                    + [(EV_TRIGGER_EXIT, n) for n, _ in zones if n in inside - now])
+        assert reg.update(x, z, 0.15, 0.15) == expected
+        inside = now